@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.signals import user_logged_in
 from stanhjr_project import settings
-from .models import CinemaHall, PurchasedTicket, MovieShow
+from .models import CinemaHall, PurchasedTicket, MovieShow, ShowSales, HallSales, DaySales
 
 
 def login_hook(sender, **kwargs):
@@ -11,4 +11,36 @@ def login_hook(sender, **kwargs):
 admin.site.register(CinemaHall)
 admin.site.register(PurchasedTicket)
 admin.site.register(MovieShow)
+
+
+class SalesSummaryAdmin(admin.ModelAdmin):
+    # Written by purchases and the rebuild_sales command only.
+    date_hierarchy = 'date'
+    list_select_related = True
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ShowSales)
+class ShowSalesAdmin(SalesSummaryAdmin):
+    list_display = ['date', 'movie_show', 'tickets_sold', 'revenue', 'number_of_seats', 'occupancy']
+
+
+@admin.register(HallSales)
+class HallSalesAdmin(SalesSummaryAdmin):
+    list_display = ['date', 'cinema_hall', 'tickets_sold', 'revenue', 'number_of_seats', 'occupancy']
+
+
+@admin.register(DaySales)
+class DaySalesAdmin(SalesSummaryAdmin):
+    list_display = ['date', 'tickets_sold', 'revenue', 'number_of_seats', 'occupancy']
+
+
 user_logged_in.connect(login_hook)
@@ -0,0 +1,48 @@
+from django.http import JsonResponse
+from rest_framework import exceptions, serializers
+from cinema.api.authentication import TokenExpiredAuth
+from cinema.api.pagination import SessionPagination, PurchasePagination
+from cinema.api.resources import get_session_queryset, get_purchase_queryset
+from cinema.api.serializers import movie_show_list_values, purchase_values
+
+# DRF views are synchronous, these are plain Django async views for the read endpoints,
+# so under ASGI a request waiting on the database does not hold a worker thread.
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, safe=False, json_dumps_params={'ensure_ascii': False})
+
+
+async def session_list(request):
+    try:
+        queryset = get_session_queryset(request.GET)
+    except serializers.ValidationError as error:
+        return json_response(error.detail, status=400)
+    paginator = SessionPagination()
+    try:
+        rows = await paginator.apaginate_queryset(
+            movie_show_list_values.values(queryset, *paginator.get_fields()), request)
+    except exceptions.NotFound as error:
+        return json_response({'detail': error.detail}, status=404)
+    return json_response(paginator.get_paginated_data(movie_show_list_values.serialize(rows)))
+
+
+async def purchase_list(request):
+    try:
+        auth = await TokenExpiredAuth().aauthenticate(request)
+    except exceptions.AuthenticationFailed as error:
+        auth, detail = None, error.detail
+    else:
+        detail = exceptions.NotAuthenticated.default_detail
+    if auth is None:
+        response = json_response({'detail': detail}, status=401)
+        response['WWW-Authenticate'] = TokenExpiredAuth.keyword
+        return response
+    user = auth[0]
+    paginator = PurchasePagination()
+    try:
+        rows = await paginator.apaginate_queryset(
+            purchase_values.values(get_purchase_queryset(user.id), *paginator.get_fields()), request)
+    except exceptions.NotFound as error:
+        return json_response({'detail': error.detail}, status=404)
+    return json_response(paginator.get_paginated_data(purchase_values.serialize(rows)))
@@ -1,8 +1,110 @@
-from stanhjr_project.settings import SESSION_COOKIE_AGE_ADMIN, SESSION_COOKIE_AGE
+import copy
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from stanhjr_project.settings import SESSION_COOKIE_AGE_ADMIN, SESSION_COOKIE_AGE, TOKEN_TOUCH_GRANULARITY, \
+    TOKEN_TOUCH_BUFFER, TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL
 from cinema.models import TokenExpired
 from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
 from rest_framework import exceptions
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+
+
+class TokenTouchBuffer:
+    """
+    Process-local buffer of token touches, written in one bulk UPDATE at most once per granularity.
+
+    The stored `last_action` lags behind by less than the granularity plus the gap to the next request of this
+    process, so a session can only expire that much earlier, never later. Within the process the buffered touch
+    is seen right away.
+    """
+
+    def __init__(self):
+        self._touches = {}
+        self._lock = threading.Lock()
+        self._flushed_at = None
+
+    def get(self, key):
+        return self._touches.get(key)
+
+    def touch(self, key, moment):
+        """
+        Buffer a touch, return the touches to flush once the granularity has passed since the last flush.
+        """
+        with self._lock:
+            self._touches[key] = moment
+            if self._flushed_at is None:
+                self._flushed_at = moment
+            # A clock set back flushes right away rather than holding the touches.
+            if timedelta(0) <= moment - self._flushed_at < timedelta(seconds=TOKEN_TOUCH_GRANULARITY):
+                return []
+            touches, self._touches, self._flushed_at = self._touches, {}, moment
+        # Greatest keeps a later login or a flush from another process.
+        return [TokenExpired(token_ptr_id=key, last_action=Greatest(F('last_action'), Value(moment)))
+                for key, moment in touches.items()]
+
+
+touch_buffer = TokenTouchBuffer()
+
+
+class TokenCache:
+    """
+    Process-local LRU cache of token key -> (user, token), so most requests authenticate without a query.
+
+    Entries live TOKEN_CACHE_TTL seconds, signals drop them when this process deletes a token or saves its user,
+    so a logout or a deactivation in another process is seen within the TTL. The cached `last_action` is never
+    later than the stored one, so it can only make a session look expired, and that is checked in the database.
+    """
+
+    def __init__(self, maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = timedelta(seconds=ttl)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, user, token = entry
+            if timezone.now() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        # A copy per request, so a view changing request.user leaves the cached user alone.
+        return copy.copy(user), token
+
+    def set(self, key, user, token):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (timezone.now() + self.ttl, user, token)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_user(self, user_id):
+        with self._lock:
+            for key in [key for key, (expires_at, user, token) in self._entries.items() if user.pk == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_cache = TokenCache()
 
 
 class TokenExpiredAuth(TokenAuthentication):
@@ -12,18 +114,83 @@ class TokenExpiredAuth(TokenAuthentication):
         auth = super().authenticate(request=request)
         if auth:
             user, token = auth
-            if user.is_superuser and (timezone.now() - token.last_action).seconds > SESSION_COOKIE_AGE_ADMIN:
-                msg = 'Admin session time to dead!'
-                raise exceptions.AuthenticationFailed(msg)
-
-            elif user.is_superuser:
-                token.last_action = timezone.now()
-                token.save()
-                return user, token
-
-            if (timezone.now() - token.last_action).seconds > SESSION_COOKIE_AGE:
-                msg = 'User session time to dead!'
-                raise exceptions.AuthenticationFailed(msg)
-            token.last_action = timezone.now()
-            token.save()
+            self.check_session(user, token)
+            self.touch(token)
             return user, token
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached and not self.is_expired(*cached):
+            return cached
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+        return user, token
+
+    async def aauthenticate(self, request):
+        """
+        `authenticate` for async views, which take a plain Django request and use the async ORM.
+        """
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. No credentials provided.'))
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        user, token = await self.aauthenticate_credentials(key)
+        self.check_session(user, token)
+        await self.atouch(token)
+        return user, token
+
+    async def aauthenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached and not self.is_expired(*cached):
+            return cached
+        try:
+            token = await self.model.objects.select_related('user').aget(key=key)
+        except self.model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        token_cache.set(key, token.user, token)
+        return token.user, token
+
+    @staticmethod
+    def get_last_action(token):
+        buffered = touch_buffer.get(token.key) if TOKEN_TOUCH_BUFFER else None
+        return max(token.last_action, buffered) if buffered else token.last_action
+
+    def is_expired(self, user, token):
+        idle = (timezone.now() - self.get_last_action(token)).total_seconds()
+        return idle > (SESSION_COOKIE_AGE_ADMIN if user.is_superuser else SESSION_COOKIE_AGE)
+
+    def check_session(self, user, token):
+        if self.is_expired(user, token):
+            msg = 'Admin session time to dead!' if user.is_superuser else 'User session time to dead!'
+            raise exceptions.AuthenticationFailed(msg)
+
+    def get_touches(self, token):
+        """
+        Record the request as the token's last action and return the tokens to write. `last_action` is only
+        written once it is older than TOKEN_TOUCH_GRANULARITY, so it lags behind by less than that.
+        """
+        now = timezone.now()
+        if TOKEN_TOUCH_BUFFER:
+            return touch_buffer.touch(token.key, now)
+        if now - token.last_action < timedelta(seconds=TOKEN_TOUCH_GRANULARITY):
+            return []
+        token.last_action = now
+        return [token]
+
+    def touch(self, token):
+        touches = self.get_touches(token)
+        if touches:
+            # One UPDATE of cinema_tokenexpired, the authtoken row is left alone.
+            self.model.objects.bulk_update(touches, ['last_action'])
+
+    async def atouch(self, token):
+        touches = self.get_touches(token)
+        if touches:
+            await self.model.objects.abulk_update(touches, ['last_action'])
@@ -0,0 +1,43 @@
+import hashlib
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from cinema.cache import get_session_list_key, get_version, get_purchases_version_name, version_to_datetime, \
+    is_api_cache_shared
+
+# Validators come from version counters bumped on commit of every write, so a conditional GET is answered
+# with 304 from the cache alone, before any query or serializer runs. Without a cache shared by the workers
+# a write is missed by all but one of them, so there are no validators and every GET gets the full list.
+
+
+def make_etag(*parts):
+    return hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def session_list_etag(request, *args, **kwargs):
+    if not is_api_cache_shared():
+        return None
+    return make_etag(get_session_list_key(request.query_params), request.accepted_renderer.format)
+
+
+def session_list_last_modified(request, *args, **kwargs):
+    if not is_api_cache_shared():
+        return None
+    return version_to_datetime(get_version('session_list'))
+
+
+def purchases_etag(request, *args, **kwargs):
+    if not is_api_cache_shared():
+        return None
+    version_name = get_purchases_version_name(request.user.id)
+    return make_etag(version_name, get_version(version_name), request.get_full_path(),
+                     request.accepted_renderer.format)
+
+
+def purchases_last_modified(request, *args, **kwargs):
+    if not is_api_cache_shared():
+        return None
+    return version_to_datetime(get_version(get_purchases_version_name(request.user.id)))
+
+
+session_list_condition = method_decorator(condition(session_list_etag, session_list_last_modified))
+purchases_condition = method_decorator(condition(purchases_etag, purchases_last_modified))
@@ -0,0 +1,56 @@
+import datetime
+import functools
+import hashlib
+import json
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from cinema.models import IdempotencyKey
+from stanhjr_project.settings import IDEMPOTENCY_KEY_TTL
+
+
+def get_request_hash(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.path} {body}'.encode()).hexdigest()
+
+
+def idempotent(method):
+    """
+    Replay the stored response when a POST is retried with the same `Idempotency-Key` header.
+
+    The key row is inserted in the same transaction as the purchase, so a concurrent retry
+    waits on the unique index and then reads the committed response instead of buying twice.
+    """
+    @functools.wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({'Idempotency-Key': 'Ключ не может быть длиннее 255 символов'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        request_hash = get_request_hash(request)
+        with transaction.atomic():
+            IdempotencyKey.objects.expired().filter(user=request.user, key=key).delete()
+            record, created = IdempotencyKey.objects.get_or_create(user=request.user, key=key, defaults={
+                'request_hash': request_hash,
+                'expires_at': timezone.now() + datetime.timedelta(seconds=IDEMPOTENCY_KEY_TTL)})
+            if not created:
+                if record.request_hash != request_hash:
+                    return Response({'Idempotency-Key': 'Этот ключ уже использован для другого запроса'},
+                                    status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+                return Response(record.response_data, status=record.response_status,
+                                headers={'Idempotent-Replayed': 'true'})
+
+            response = method(self, request, *args, **kwargs)
+            if response.status_code >= 400:
+                # Nothing was bought, let the client retry the same key once the request is fixed.
+                transaction.set_rollback(True)
+                return response
+            record.response_status = response.status_code
+            record.response_data = response.data
+            record.save(update_fields=['response_status', 'response_data'])
+        return response
+    return wrapper
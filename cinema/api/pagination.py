@@ -0,0 +1,112 @@
+import base64
+import binascii
+import json
+from django.core.exceptions import ValidationError
+from django.db import models
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from cinema.models import MovieShow, PurchasedTicket
+
+
+class Row(models.Func):
+    # A row value, Postgres compares those field by field, so (a, b) > (x, y) seeks right in an (a, b) index.
+    template = '(%(expressions)s)'
+    output_field = models.Field()
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on a unique (field, id) ordering.
+
+    The cursor holds the ordering values of the last row seen and the next page is the rows after it, so any
+    page costs one index seek, and rows inserted meanwhile never shift the pages that follow.
+    """
+    model = None
+    ordering = ('id', )
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.prepare(request)
+        return self.get_page(list(self.get_page_queryset(queryset)))
+
+    async def apaginate_queryset(self, queryset, request):
+        self.prepare(request)
+        return self.get_page([row async for row in self.get_page_queryset(queryset)])
+
+    def prepare(self, request):
+        self.url = request.get_full_path()
+        page_size = request.GET.get(self.page_size_query_param, '')
+        if page_size.isdigit() and int(page_size) > 0:
+            self.page_size = min(int(page_size), self.max_page_size)
+        self.position, self.reverse = None, False
+        encoded = request.GET.get(self.cursor_query_param)
+        if encoded:
+            self.position, self.reverse = self.decode_cursor(encoded)
+
+    def get_fields(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def get_page_queryset(self, queryset):
+        descending = self.ordering[0].startswith('-') != self.reverse
+        fields = self.get_fields()
+        if self.position:
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.alias(keyset=Row(*fields)).filter(**{
+                f'keyset__{lookup}': Row(*(models.Value(value) for value in self.position))})
+        ordering = [f'-{field}' if descending else field for field in fields]
+        return queryset.order_by(*ordering)[:self.page_size + 1]
+
+    def get_page(self, rows):
+        has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if self.reverse:
+            self.page.reverse()
+            has_following, has_preceding = bool(self.page), has_more
+        else:
+            has_following, has_preceding = has_more, bool(self.position) and bool(self.page)
+        self.next_cursor = self.encode_cursor(self.page[-1], False) if has_following else None
+        self.previous_cursor = self.encode_cursor(self.page[0], True) if has_preceding else None
+        return self.page
+
+    def encode_cursor(self, row, reverse):
+        position = [row[field] if isinstance(row, dict) else getattr(row, field) for field in self.get_fields()]
+        value = json.dumps([[str(value) for value in position], reverse])
+        return base64.urlsafe_b64encode(value.encode()).decode()
+
+    def decode_cursor(self, encoded):
+        model_fields = [self.model._meta.get_field(field) for field in self.get_fields()]
+        try:
+            position, reverse = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            return [field.to_python(value) for field, value in zip(model_fields, position, strict=True)], \
+                bool(reverse)
+        except (binascii.Error, UnicodeError, ValueError, TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        # Relative links, the same for every host, so a cached page stays right for all of them.
+        return replace_query_param(self.url, self.cursor_query_param, cursor)
+
+    def get_paginated_data(self, data):
+        return {'next': self.get_link(self.next_cursor), 'previous': self.get_link(self.previous_cursor),
+                'results': data}
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+
+class SessionPagination(KeysetPagination):
+    model = MovieShow
+    ordering = ('start_time', 'id')
+
+
+class PurchasePagination(KeysetPagination):
+    model = PurchasedTicket
+    ordering = ('-date', '-id')
@@ -1,7 +1,9 @@
 import datetime
 from datetime import date
-from django.db import transaction
+from django.core.exceptions import ValidationError
 from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from rest_framework import permissions, status, serializers
 from rest_framework.authtoken.views import ObtainAuthToken
 from django.utils import timezone
@@ -10,9 +12,21 @@ from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.response import Response
-from cinema.api.serializers import RegisterSerializer, CinemaHallSerializer, PurchaseSerializer, MovieShowSerializer, \
-    PurchaseSerializerCreate, MovieShowSerializerPost, MovieShowSerializerUpdate
-from cinema.models import MyUser, TokenExpired, CinemaHall, MovieShow, PurchasedTicket
+from cinema.api.conditional import session_list_condition, purchases_condition
+from cinema.api.idempotency import idempotent
+from cinema.api.pagination import SessionPagination, PurchasePagination
+from cinema.api.serializers import RegisterSerializer, CinemaHallSerializer, \
+    MovieShowListSerializer, PurchaseSerializerCreate, MovieShowSerializerPost, MovieShowSerializerUpdate, \
+    SeatMapSerializer, HoldSerializerCreate, PurchaseBulkSerializerCreate, movie_show_list_values, purchase_values, \
+    SalesReportParamsSerializer, ShowSalesSerializer, HallSalesSerializer, DaySalesSerializer, \
+    PurchaseExportParamsSerializer
+from cinema.cache import get_api_cache, get_session_list_key, count_session_list_lookup, \
+    get_session_list_stats, reset_session_list_stats
+from cinema.export import get_purchase_export_queryset, iter_purchase_csv
+from cinema.models import MyUser, TokenExpired, CinemaHall, MovieShow, PurchasedTicket, SeatInventory, ShowSales, \
+    HallSales, DaySales
+from cinema.services import confirm_hold, release_hold
+from stanhjr_project.settings import SESSION_LIST_CACHE_TTL
 
 
 class GetToken(ObtainAuthToken):
@@ -82,27 +96,104 @@ class CinemaHallList(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def get_purchase_queryset(user_id):
+    return PurchasedTicket.objects.confirmed().filter(user=user_id).select_related('movie_show__cinema_hall')
+
+
 class PurchaseList(APIView):
     permission_classes = [IsAuthenticated]
 
+    @purchases_condition
     def get(self, request):
-        purchase_list = PurchasedTicket.objects.filter(user=request.user.id)
-        serializer = PurchaseSerializer(purchase_list, many=True)
-        return Response(serializer.data)
+        paginator = PurchasePagination()
+        rows = purchase_values.values(get_purchase_queryset(request.user.id), *paginator.get_fields())
+        return paginator.get_paginated_response(
+            purchase_values.serialize(paginator.paginate_queryset(rows, request, view=self)))
 
+    @idempotent
     def post(self, request):
         serializer = PurchaseSerializerCreate(data=request.data, user_id=request.user.id)
         if serializer.is_valid():
-            user = MyUser.objects.get(id=request.user.id)
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class PurchaseExport(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        params = PurchaseExportParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        date_from, date_to = params.validated_data['date_from'], params.validated_data['date_to']
+        tickets = get_purchase_export_queryset(date_from, date_to, params.validated_data.get('hall_id'))
+        response = StreamingHttpResponse(iter_purchase_csv(tickets), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="purchases_{date_from}_{date_to}.csv"'
+        return response
+
+
+class PurchaseBulk(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @idempotent
+    def post(self, request):
+        serializer = PurchaseBulkSerializerCreate(data=request.data, user_id=request.user.id)
+        if serializer.is_valid():
+            tickets = serializer.save()
+            return Response(PurchaseSerializerCreate(tickets, many=True).data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class SeatMap(APIView):
+    permission_classes = [AllowAny]
 
-            with transaction.atomic():
-                obj = serializer.save()
-                user.money_spent += obj.get_purchase_amount()
-                user.save()
+    def get(self, request, pk):
+        movie_show = get_object_or_404(MovieShow.objects.select_related('cinema_hall'), id=pk)
+        date_show = serializers.DateField().run_validation(request.query_params.get('date') or date.today())
+        inventory = SeatInventory.objects.filter(movie_show=movie_show, date=date_show).first() or \
+            SeatInventory(movie_show=movie_show, date=date_show)
+        serializer = SeatMapSerializer(inventory)
+        return Response(serializer.data)
+
+
+class HoldList(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = HoldSerializerCreate(data=request.data, user_id=request.user.id)
+        if serializer.is_valid():
+            serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def get_hold(request, pk):
+    return get_object_or_404(PurchasedTicket.objects.held(), pk=pk, user=request.user.id)
+
+
+class HoldConfirm(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        try:
+            ticket = confirm_hold(get_hold(request, pk))
+        except ValidationError as error:
+            return Response({'hold': error.messages}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = PurchaseSerializerCreate(ticket)
+        return Response(serializer.data)
+
+
+class HoldRelease(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def delete(self, request, pk):
+        try:
+            release_hold(get_hold(request, pk))
+        except ValidationError as error:
+            return Response({'hold': error.messages}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class MovieShowPost(APIView):
     permission_classes = [IsAdminUser]
 
@@ -127,36 +218,99 @@ class MovieShowUpdate(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def get_session_queryset(query_params):
+    start_time = query_params.get('start_time') or '00:00:00'
+    finish_time = query_params.get('finish_time') or '23:59:59'
+
+    hall_id = query_params.get('hall_id')
+    show_day = query_params.get('show_day')
+    enter_time_range = Q(start_time__range=(start_time, finish_time))
+
+    if start_time >= finish_time:
+        raise serializers.ValidationError(
+            {'Error query params': 'Время начала не может быть больше или равно времени окончания поиска'})
+
+    if show_day == 'tomorrow':
+        show_date = date.today() + datetime.timedelta(days=1)
+    else:
+        show_date = date.today()
+    queryset = MovieShow.objects.filter(screenings__date=show_date).with_free_seats(show_date)
+
+    if show_day in ('today', 'tomorrow'):
+        return queryset
+
+    if hall_id:
+        return queryset.filter(enter_time_range, cinema_hall=hall_id)
+
+    return queryset.filter(enter_time_range)
+
+
 class MovieShowViewSet(ModelViewSet):
-    queryset = MovieShow.objects.filter(finish_date__gt=timezone.now())
-    serializer_class = MovieShowSerializer
+    queryset = MovieShow.objects.all()
+    serializer_class = MovieShowListSerializer
     permission_classes = [AllowAny]
+    pagination_class = SessionPagination
 
     def get_queryset(self):
-        start_time = self.request.query_params.get('start_time') or '00:00:00'
-        finish_time = self.request.query_params.get('finish_time') or '23:59:59'
+        return get_session_queryset(self.request.query_params)
+
+    @session_list_condition
+    def list(self, request, *args, **kwargs):
+        key = get_session_list_key(request.query_params)
+        data = get_api_cache().get(key)
+        count_session_list_lookup(hit=data is not None)
+        if data is not None:
+            return Response(data)
+        rows = movie_show_list_values.values(self.get_queryset(), *self.paginator.get_fields())
+        response = self.get_paginated_response(
+            movie_show_list_values.serialize(self.paginate_queryset(rows)))
+        get_api_cache().set(key, response.data, SESSION_LIST_CACHE_TTL)
+        return response
+
+
+class SessionCacheStats(APIView):
+    """
+    Session list cache hits and misses counted by the worker process that answers.
+    """
+    permission_classes = [IsAdminUser]
 
-        hall_id = self.request.query_params.get('hall_id')
-        show_day = self.request.query_params.get('show_day')
-        enter_time_range = Q(start_time__range=(start_time, finish_time))
+    def get(self, request):
+        return Response(get_session_list_stats())
+
+    def delete(self, request):
+        reset_session_list_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class SalesReport(APIView):
+    """
+    Sales of a date range, read from a summary table only.
+    """
+    permission_classes = [IsAdminUser]
+    model = None
+    serializer_class = None
+    ordering = ('date', )
+
+    def get(self, request):
+        params = SalesReportParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        sales = self.model.objects.filter(date__range=(params.validated_data['date_from'],
+                                                       params.validated_data['date_to'])).order_by(*self.ordering)
+        return Response(self.serializer_class(sales, many=True).data)
 
-        if start_time >= finish_time:
-            raise serializers.ValidationError(
-                {'Error query params': 'Время начала не может быть больше или равно времени окончания поиска'})
 
-        if show_day == 'today':
-            return super().get_queryset().filter(start_date__lte=date.today(),
-                                                 finish_date__gt=date.today())
+class ShowSalesReport(SalesReport):
+    model = ShowSales
+    serializer_class = ShowSalesSerializer
+    ordering = ('date', 'movie_show')
 
-        elif show_day == 'tomorrow':
-            return super().get_queryset().filter(start_date__lte=date.today() + datetime.timedelta(days=1),
-                                                 finish_date__gt=date.today())
 
-        if hall_id:
-            return super().get_queryset().filter(enter_time_range, start_date__lte=date.today(),
-                                                 finish_date__gte=date.today(),
-                                                 cinema_hall=hall_id)
+class HallSalesReport(SalesReport):
+    model = HallSales
+    serializer_class = HallSalesSerializer
+    ordering = ('date', 'cinema_hall')
 
-        return super().get_queryset().filter(enter_time_range, start_date__lte=date.today(),
-                                             finish_date__gte=date.today())
 
+class DaySalesReport(SalesReport):
+    model = DaySales
+    serializer_class = DaySalesSerializer
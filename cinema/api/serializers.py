@@ -1,8 +1,12 @@
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from django.contrib.auth.hashers import make_password
-from django.db.models import Q
+from django.core.exceptions import ValidationError
 from rest_framework import serializers
-from cinema.models import MyUser, CinemaHall, PurchasedTicket, MovieShow
+from cinema.models import MyUser, CinemaHall, PurchasedTicket, MovieShow, SeatInventory, ShowSales, HallSales, \
+    DaySales
+from cinema.schedule import get_conflicts, schedule_conflict_as_validation_error
+from cinema.services import purchase_tickets, purchase_tickets_bulk, hold_tickets
+from stanhjr_project.settings import BULK_PURCHASE_MAX_ITEMS, SALES_REPORT_DAYS
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -19,10 +23,11 @@ class RegisterSerializer(serializers.ModelSerializer):
 class CinemaHallSerializer(serializers.ModelSerializer):
     hall_name = serializers.CharField(max_length=200)
     number_of_seats = serializers.IntegerField(required=True)
+    number_of_rows = serializers.IntegerField(min_value=1, required=False)
 
     class Meta:
         model = CinemaHall
-        fields = ['id', 'hall_name', 'number_of_seats']
+        fields = ['id', 'hall_name', 'number_of_seats', 'number_of_rows']
 
     def create(self, validated_data):
         """
@@ -41,6 +46,7 @@ class CinemaHallSerializer(serializers.ModelSerializer):
         """
         instance.hall_name = validated_data.get('hall_name', instance.hall_name)
         instance.number_of_seats = validated_data.get('number_of_seats', instance.number_of_seats)
+        instance.number_of_rows = validated_data.get('number_of_rows', instance.number_of_rows)
         instance.save()
         return instance
 
@@ -50,6 +56,10 @@ class CinemaHallSerializer(serializers.ModelSerializer):
             if cinema_hall_obj.get_tickets():
                 raise serializers.ValidationError(
                     {'cinema_hall': 'В этом зале куплены билеты, изменить нельзя'})
+        number_of_rows = data.get('number_of_rows') or getattr(self.instance, 'number_of_rows', 1)
+        error = CinemaHall.get_layout_error(data['number_of_seats'], number_of_rows)
+        if error:
+            raise serializers.ValidationError({'number_of_rows': error})
         return data
 
 
@@ -59,17 +69,31 @@ class MovieShowSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = MovieShow
-        fields = '__all__'
+        fields = ['id', 'movie_name', 'ticket_price', 'start_time', 'finish_time', 'start_date', 'finish_date',
+                  'cinema_hall']
+
+
+class MovieShowListSerializer(MovieShowSerializer):
+
+    free_seats = serializers.IntegerField(read_only=True)
+
+    class Meta(MovieShowSerializer.Meta):
+        fields = MovieShowSerializer.Meta.fields + ['free_seats']
 
 
 class MovieShowSerializerPost(serializers.ModelSerializer):
 
     class Meta:
         model = MovieShow
-        fields = '__all__'
+        fields = ['id', 'movie_name', 'ticket_price', 'start_time', 'finish_time', 'start_date', 'finish_date',
+                  'cinema_hall']
 
     def create(self, validated_data):
-        return MovieShow.objects.create(**validated_data)
+        try:
+            with schedule_conflict_as_validation_error():
+                return MovieShow.objects.create(**validated_data)
+        except ValidationError as error:
+            raise serializers.ValidationError({'start_date, finish_date': error.messages})
 
     def validate(self, data):
         start_time = data.get('start_time')
@@ -96,32 +120,7 @@ class MovieShowSerializerPost(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 {'start_date, finish_date': 'Нельзя создавать сеанcы от вчера!'})
 
-        cinema_hall_obj = CinemaHall.objects.get(id=data.get('cinema_hall').id)
-        enter_start_date = Q(start_date__range=(start_date, finish_date))
-        enter_finish_date = Q(finish_date__range=(start_date, finish_date))
-        middle_date_start = Q(start_date__lte=start_date, finish_date__gte=finish_date)
-        enter_start_time = Q(start_time__range=(start_time, finish_time))
-        enter_finish_time = Q(finish_time__range=(start_time, finish_time))
-
-        movie_obj = MovieShow.objects.filter(cinema_hall=cinema_hall_obj.pk).filter(
-            enter_start_date | enter_finish_date | middle_date_start).filter(enter_start_time | enter_finish_time)
-
-        if movie_obj:
-            raise serializers.ValidationError(
-                {'start_date, finish_date': 'Сеансы в одном зале не могут накладываться друг на друга'})
-
-        if start_time > finish_time:
-            enter_start_time_until_midnight = Q(start_time__range=(start_time, '23:59:59'))
-            enter_start_time_after_midnight = Q(start_time__range=('00:00:00', finish_time))
-            enter_finish_time_until_midnight = Q(finish_time__range=(start_time, '23:59:59'))
-            enter_finish_time_after_midnight = Q(finish_time__range=('00:00:00', finish_time))
-
-            movie_obj = MovieShow.objects.filter(cinema_hall=cinema_hall_obj.pk).filter(
-                enter_start_date | enter_finish_date | middle_date_start).\
-                filter(enter_start_time_until_midnight | enter_start_time_after_midnight |
-                       enter_finish_time_until_midnight | enter_finish_time_after_midnight).all()
-
-        if movie_obj:
+        if get_conflicts(data.get('cinema_hall'), start_date, finish_date, start_time, finish_time):
             raise serializers.ValidationError(
                 {'start_date, finish_date': 'Сеансы в одном зале не могут накладываться друг на друга'})
         return data
@@ -131,7 +130,8 @@ class MovieShowSerializerUpdate(serializers.ModelSerializer):
 
     class Meta:
         model = MovieShow
-        fields = '__all__'
+        fields = ['id', 'movie_name', 'ticket_price', 'start_time', 'finish_time', 'start_date', 'finish_date',
+                  'cinema_hall']
 
     def update(self, instance, validated_data):
         instance.movie_name = validated_data.get('movie_name', instance.movie_name)
@@ -141,7 +141,11 @@ class MovieShowSerializerUpdate(serializers.ModelSerializer):
         instance.start_date = validated_data.get('start_date', instance.start_date)
         instance.finish_date = validated_data.get('finish_date', instance.finish_date)
         instance.ticket_price = validated_data.get('ticket_price', instance.ticket_price)
-        instance.save()
+        try:
+            with schedule_conflict_as_validation_error():
+                instance.save()
+        except ValidationError as error:
+            raise serializers.ValidationError({'start_date, finish_date': error.messages})
         return instance
 
     def validate(self, data):
@@ -170,60 +174,47 @@ class MovieShowSerializerUpdate(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 {'start_date, finish_date': 'Нельзя создавать сеанcы от вчера!'})
 
-        enter_start_date = Q(start_date__range=(start_date, finish_date))
-        enter_finish_date = Q(finish_date__range=(start_date, finish_date))
-        middle_date_start = Q(start_date__lte=start_date, finish_date__gte=finish_date)
-        enter_start_time = Q(start_time__range=(start_time, finish_time))
-        enter_finish_time = Q(finish_time__range=(start_time, finish_time))
-
         if MovieShow.objects.get(id=self.instance.id).get_purchased():
             raise serializers.ValidationError(
                 {'movie_show': 'На этот сеанс уже куплены билеты, изменить нелья'})
 
-        elif MovieShow.objects.filter(cinema_hall=self.instance.cinema_hall).exclude(id=self.instance.id).filter(
-                enter_start_date | enter_finish_date).filter(enter_start_time | enter_finish_time):
-            raise serializers.ValidationError(
-                {'start_date, finish_date': 'Сеансы в одном зале не могут накладываться друг на друга'})
-
-        movie_obj = MovieShow.objects.filter(cinema_hall=cinema_hall_obj.pk).exclude(id=self.instance.id).filter(
-            enter_start_date | enter_finish_date | middle_date_start).filter(enter_start_time | enter_finish_time)
-
-        if movie_obj:
+        if get_conflicts(cinema_hall_obj, start_date, finish_date, start_time, finish_time, exclude=self.instance.id):
             raise serializers.ValidationError(
                 {'start_date, finish_date': 'Сеансы в одном зале не могут накладываться друг на друга'})
+        return data
 
-        if start_time > finish_time:
-            enter_start_time_until_midnight = Q(start_time__range=(start_time, '23:59:59'))
-            enter_start_time_after_midnight = Q(start_time__range=('00:00:00', finish_time))
-            enter_finish_time_until_midnight = Q(finish_time__range=(start_time, '23:59:59'))
-            enter_finish_time_after_midnight = Q(finish_time__range=('00:00:00', finish_time))
-
-            movie_obj = MovieShow.objects.filter(cinema_hall=cinema_hall_obj.pk).exclude(id=self.instance.id).filter(
-                enter_start_date | enter_finish_date | middle_date_start).\
-                filter(enter_start_time_until_midnight | enter_start_time_after_midnight |
-                       enter_finish_time_until_midnight | enter_finish_time_after_midnight).all()
 
-        if movie_obj:
-            raise serializers.ValidationError(
-                {'start_date, finish_date': 'Сеансы в одном зале не могут накладываться друг на друга'})
-        return data
+def validate_sale_date(movie, date_purchase):
+    if movie.start_time < datetime.now().time() and date_purchase == date.today():
+        raise serializers.ValidationError({'start_time': 'Онлайн продажи для этого сеанса закрыты'})
+    if date_purchase < date.today():
+        raise serializers.ValidationError({'date': 'Вчера уже прошло, надо смотрет в будущее'})
 
 
 class PurchaseSerializerCreate(serializers.ModelSerializer):
 
+    seats = serializers.ListField(child=serializers.ListField(child=serializers.IntegerField(min_value=1),
+                                                              min_length=2, max_length=2), required=False)
+
     def __init__(self, *args, **kwargs):
         self.user_id = kwargs.pop('user_id', None)
         super(PurchaseSerializerCreate, self).__init__(*args, **kwargs)
 
     class Meta:
         model = PurchasedTicket
-        fields = ['date', 'movie_show', 'number_of_ticket']
+        fields = ['date', 'movie_show', 'number_of_ticket', 'seats']
 
     def create(self, validated_data):
         """
-        Create and return a new `PurchasedTicket` instance, given the validated data.
+        Buy tickets through the purchase service, which re-checks free seats under a row lock.
         """
-        return PurchasedTicket.objects.create(**validated_data)
+        try:
+            return purchase_tickets(validated_data['user'], validated_data['movie_show'], validated_data['date'],
+                                    validated_data['number_of_ticket'], validated_data.get('seats'))
+        except ValidationError as error:
+            if hasattr(error, 'error_dict'):
+                raise serializers.ValidationError(error.message_dict)
+            raise serializers.ValidationError({'number_of_ticket': error.messages})
 
     def validate(self, data):
         movie = data['movie_show']
@@ -234,10 +225,63 @@ class PurchaseSerializerCreate(serializers.ModelSerializer):
             raise serializers.ValidationError({'number_of_ticket': 'Вы не выбрали нужного количества билетов'})
         if movie.get_tickets_count(data['date']) - int(number_of_ticket) < 0:
             raise serializers.ValidationError({'number_of_ticket': 'Такого количества свободных мест нет'})
-        if movie.start_time < datetime.now().time() and date_purchase == date.today():
-            raise serializers.ValidationError({'start_time': 'Онлайн продажи для этого сеанса закрыты'})
-        if date_purchase < date.today():
-            raise serializers.ValidationError({'date': 'Вчера уже прошло, надо смотрет в будущее'})
+        validate_sale_date(movie, date_purchase)
+        return data
+
+
+class HoldSerializerCreate(PurchaseSerializerCreate):
+
+    class Meta:
+        model = PurchasedTicket
+        fields = ['id', 'date', 'movie_show', 'number_of_ticket', 'seats', 'hold_expires_at']
+        read_only_fields = ['hold_expires_at']
+
+    def create(self, validated_data):
+        """
+        Put seats on hold until `hold_expires_at`; the hold is paid for by confirming it.
+        """
+        try:
+            return hold_tickets(validated_data['user'], validated_data['movie_show'], validated_data['date'],
+                                validated_data['number_of_ticket'], validated_data.get('seats'))
+        except ValidationError as error:
+            if hasattr(error, 'error_dict'):
+                raise serializers.ValidationError(error.message_dict)
+            raise serializers.ValidationError({'number_of_ticket': error.messages})
+
+
+class PurchaseBulkItemSerializer(serializers.Serializer):
+    movie_show = serializers.IntegerField()
+    date = serializers.DateField()
+    number_of_ticket = serializers.IntegerField(
+        min_value=1, error_messages={'min_value': 'Вы не выбрали нужного количества билетов'})
+
+
+class PurchaseBulkSerializerCreate(serializers.Serializer):
+    items = PurchaseBulkItemSerializer(many=True, allow_empty=False, max_length=BULK_PURCHASE_MAX_ITEMS)
+
+    def __init__(self, *args, **kwargs):
+        self.user_id = kwargs.pop('user_id', None)
+        super(PurchaseBulkSerializerCreate, self).__init__(*args, **kwargs)
+
+    def create(self, validated_data):
+        """
+        Buy every item in one transaction, free seats of all sessions are checked under their row locks.
+        """
+        items = [(item['movie_show'], item['date'], item['number_of_ticket']) for item in validated_data['items']]
+        try:
+            return purchase_tickets_bulk(MyUser.objects.get(id=self.user_id), items)
+        except ValidationError as error:
+            raise serializers.ValidationError(error.message_dict)
+
+    def validate(self, data):
+        items = data['items']
+        movie_shows = MovieShow.objects.select_related('cinema_hall').in_bulk({item['movie_show'] for item in items})
+        for item in items:
+            movie = movie_shows.get(item['movie_show'])
+            if movie is None:
+                raise serializers.ValidationError({'movie_show': f'Сеанс {item["movie_show"]} не найден'})
+            validate_sale_date(movie, item['date'])
+            item['movie_show'] = movie
         return data
 
 
@@ -247,4 +291,132 @@ class PurchaseSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = PurchasedTicket
-        fields = ['date', 'movie_show', 'number_of_ticket']
+        fields = ['date', 'movie_show', 'number_of_ticket', 'seats']
+
+
+class SeatMapSerializer(serializers.ModelSerializer):
+
+    number_of_rows = serializers.IntegerField(source='movie_show.cinema_hall.number_of_rows')
+    seats_in_row = serializers.IntegerField(source='movie_show.cinema_hall.seats_in_row')
+    free_seats = serializers.SerializerMethodField()
+    seat_map = serializers.SerializerMethodField()
+
+    class Meta:
+        model = SeatInventory
+        fields = ['movie_show', 'date', 'number_of_rows', 'seats_in_row', 'free_seats', 'seat_map']
+
+    def get_free_seats(self, obj):
+        return obj.movie_show.cinema_hall.number_of_seats - obj.tickets_sold - obj.tickets_held
+
+    def get_seat_map(self, obj):
+        cinema_hall = obj.movie_show.cinema_hall
+        taken = obj.get_taken_seats()
+        seats = [taken >> index & 1 for index in range(cinema_hall.number_of_seats)]
+        return [seats[index:index + cinema_hall.seats_in_row]
+                for index in range(0, cinema_hall.number_of_seats, cinema_hall.seats_in_row)]
+
+
+class SalesReportParamsSerializer(serializers.Serializer):
+
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, data):
+        data.setdefault('date_to', date.today())
+        data.setdefault('date_from', data['date_to'] - timedelta(days=SALES_REPORT_DAYS - 1))
+        if data['date_from'] > data['date_to']:
+            raise serializers.ValidationError('Дата начала отчета не может быть позже даты окончания')
+        return data
+
+
+class PurchaseExportParamsSerializer(SalesReportParamsSerializer):
+
+    hall_id = serializers.IntegerField(required=False)
+
+
+class ShowSalesSerializer(serializers.ModelSerializer):
+
+    occupancy = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ShowSales
+        fields = ['date', 'movie_show', 'tickets_sold', 'revenue', 'number_of_seats', 'occupancy']
+
+
+class HallSalesSerializer(serializers.ModelSerializer):
+
+    occupancy = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = HallSales
+        fields = ['date', 'cinema_hall', 'tickets_sold', 'revenue', 'number_of_seats', 'occupancy']
+
+
+class DaySalesSerializer(serializers.ModelSerializer):
+
+    occupancy = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = DaySales
+        fields = ['date', 'tickets_sold', 'revenue', 'number_of_seats', 'occupancy']
+
+
+class ValuesSerializer:
+    """
+    Read-only fast path of a ModelSerializer over `.values()` rows.
+
+    The nested serializers become joins of one flat query and every value goes through the `to_representation`
+    of the serializer's own field, so the output is the same as the serializer's without building model
+    instances or running the per object field machinery.
+    """
+
+    def __init__(self, serializer_class):
+        self.plan = self.get_plan(serializer_class(), '')
+        self.lookups = list(self.get_lookups(self.plan))
+
+    def get_plan(self, serializer, prefix):
+        plan = []
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            source = prefix + field.source.replace('.', '__')
+            if isinstance(field, serializers.BaseSerializer):
+                plan.append((field.field_name, None, self.get_plan(field, source + '__')))
+            elif isinstance(field, serializers.PrimaryKeyRelatedField):
+                plan.append((field.field_name, source, None))
+            elif isinstance(field, (serializers.SerializerMethodField, serializers.RelatedField)) \
+                    or field.source == '*':
+                raise TypeError(f'{serializer.__class__.__name__}.{field.field_name} has no plain column')
+            else:
+                plan.append((field.field_name, source, field.to_representation))
+        return plan
+
+    def get_lookups(self, plan):
+        for name, lookup, field in plan:
+            if lookup is None:
+                yield from self.get_lookups(field)
+            else:
+                yield lookup
+
+    def values(self, queryset, *extra):
+        """
+        The rows to serialize, `extra` adds columns the caller needs, such as the fields a page is ordered by.
+        """
+        return queryset.values(*self.lookups, *(lookup for lookup in extra if lookup not in self.lookups))
+
+    def to_representation(self, row, plan=None):
+        data = {}
+        for name, lookup, field in plan or self.plan:
+            if lookup is None:
+                data[name] = self.to_representation(row, field)
+            else:
+                value = row[lookup]
+                data[name] = value if value is None or field is None else field(value)
+        return data
+
+    def serialize(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+
+movie_show_list_values = ValuesSerializer(MovieShowListSerializer)
+purchase_values = ValuesSerializer(PurchaseSerializer)
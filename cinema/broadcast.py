@@ -0,0 +1,50 @@
+import asyncio
+import threading
+
+
+class Broadcaster:
+    """
+    In-process fan-out of seat availability changes to the open event streams.
+
+    Every stream owns a bounded asyncio queue. `publish` may be called from any thread: sync views run in
+    a thread pool under ASGI, so delivery is handed over to the loop that owns each queue. A message carries
+    the current free seat count of a session, so a slow client that loses the oldest messages catches up
+    with the next one.
+    """
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        queue = asyncio.Queue(self.maxsize)
+        with self._lock:
+            self._subscribers[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    def publish(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, message)
+            except RuntimeError:
+                # The loop is closed, its stream is gone.
+                self.unsubscribe(queue)
+
+    @staticmethod
+    def _deliver(queue, message):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+
+broadcaster = Broadcaster()
@@ -0,0 +1,85 @@
+import datetime
+import threading
+import time
+from collections import Counter
+from datetime import date
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+# Session list cache hits and misses of this process. Counted in the shared cache, every hit would be a write.
+session_list_lookups = Counter()
+session_list_lookups_lock = threading.Lock()
+
+
+def get_api_cache():
+    return caches['api']
+
+
+def is_api_cache_shared():
+    # A locmem version is bumped in the process of the write only, the others never see it change.
+    return not isinstance(get_api_cache(), LocMemCache)
+
+
+def get_version(name):
+    """
+    Return the version of a cached resource, the time in nanoseconds it last changed, which doubles as its
+    Last-Modified. A version lost to eviction restarts from the clock, so it never repeats an older one.
+    """
+    return get_api_cache().get_or_set(f'{name}:version', time.time_ns, None)
+
+
+def bump_version(name):
+    # Past the current version even if the clock has not moved since.
+    key = f'{name}:version'
+    get_api_cache().set(key, max(time.time_ns(), (get_api_cache().get(key) or 0) + 1), None)
+
+
+def version_to_datetime(version):
+    return datetime.datetime.fromtimestamp(version / 10 ** 9, tz=datetime.timezone.utc)
+
+
+def invalidate_session_list():
+    bump_version('session_list')
+
+
+def get_purchases_version_name(user_id):
+    return f'purchases:{user_id}'
+
+
+def invalidate_purchases(user_id):
+    bump_version(get_purchases_version_name(user_id))
+
+
+def get_session_list_key(query_params):
+    """
+    Cache key of a session list request: the params `get_session_queryset` reads, with its defaults filled in
+    and the ones it ignores dropped, under the current list version.
+    """
+    show_day = query_params.get('show_day')
+    if show_day == 'tomorrow':
+        show_date = date.today() + datetime.timedelta(days=1)
+    else:
+        show_date = date.today()
+    if show_day in ('today', 'tomorrow'):
+        params = [show_day]
+    else:
+        params = ['', query_params.get('hall_id') or '', query_params.get('start_time') or '00:00:00',
+                  query_params.get('finish_time') or '23:59:59']
+    params += [query_params.get('cursor') or '', query_params.get('page_size') or '']
+    return ':'.join(['session_list', str(get_version('session_list')), str(show_date)] + params)
+
+
+def count_session_list_lookup(hit):
+    with session_list_lookups_lock:
+        session_list_lookups['hits' if hit else 'misses'] += 1
+
+
+def get_session_list_stats():
+    return {'hits': session_list_lookups['hits'],
+            'misses': session_list_lookups['misses'],
+            'version': get_api_cache().get('session_list:version')}
+
+
+def reset_session_list_stats():
+    with session_list_lookups_lock:
+        session_list_lookups.clear()
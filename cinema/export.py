@@ -0,0 +1,48 @@
+import csv
+from cinema.models import PurchasedTicket
+from stanhjr_project.settings import EXPORT_CHUNK_SIZE
+
+EXPORT_FIELDS = [
+    ('id', 'id'),
+    ('date', 'date'),
+    ('movie_show', 'movie_show'),
+    ('movie_name', 'movie_show__movie_name'),
+    ('cinema_hall', 'movie_show__cinema_hall'),
+    ('hall_name', 'movie_show__cinema_hall__hall_name'),
+    ('user', 'user'),
+    ('username', 'user__username'),
+    ('number_of_ticket', 'number_of_ticket'),
+    ('ticket_price', 'ticket_price'),
+    ('purchase_amount', 'purchase_amount'),
+    ('seats', 'seats'),
+]
+
+
+class Echo:
+    # The file csv.writer writes to, it hands each row back instead of keeping it.
+    def write(self, value):
+        return value
+
+
+def get_purchase_export_queryset(date_from, date_to, cinema_hall=None):
+    tickets = PurchasedTicket.objects.confirmed().filter(date__range=(date_from, date_to))
+    if cinema_hall:
+        tickets = tickets.filter(movie_show__cinema_hall=cinema_hall)
+    return tickets.order_by('date', 'id').values_list(*[lookup for name, lookup in EXPORT_FIELDS])
+
+
+def iter_purchase_csv(tickets, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the CSV of `tickets` a chunk of rows at a time. The rows come as tuples from a server-side cursor,
+    so memory stays the same whatever the number of rows.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, lookup in EXPORT_FIELDS])
+    lines = []
+    for *values, seats in tickets.iterator(chunk_size=chunk_size):
+        lines.append(writer.writerow([*values, ' '.join(f'{row}-{seat}' for row, seat in seats)]))
+        if len(lines) == chunk_size:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
@@ -5,8 +5,8 @@ from django.contrib import messages
 from django.contrib.auth.forms import UserCreationForm
 from django.core.exceptions import ValidationError
 from django.forms import ModelForm
-from django.db.models import Q
 from cinema.models import MyUser, PurchasedTicket, MovieShow, CinemaHall
+from cinema.schedule import get_conflicts
 
 
 class NumberInput(TextInput):
@@ -22,9 +22,14 @@ class TimeInput(forms.TimeInput):
 
 
 class CinemaHallCreateForm(ModelForm):
+    number_of_rows = forms.IntegerField(min_value=1, required=False)
+
     class Meta:
         model = CinemaHall
-        fields = ["hall_name", "number_of_seats"]
+        fields = ["hall_name", "number_of_seats", "number_of_rows"]
+
+    def clean_number_of_rows(self):
+        return self.cleaned_data.get('number_of_rows') or self.instance.number_of_rows
 
 
 class MovieShowCreateForm(ModelForm):
@@ -66,27 +71,7 @@ class MovieShowCreateForm(ModelForm):
             messages.warning(self.request, 'Нельзя создавать сеансы "от вчера"!')
             raise ValidationError('Нельзя создавать сеанcы "от вчера"!')
 
-        enter_start_date = Q(start_date__range=(start_date, finish_date))
-        enter_finish_date = Q(finish_date__range=(start_date, finish_date))
-        middle_date_start = Q(start_date__lte=start_date, finish_date__gte=finish_date)
-        enter_start_time = Q(start_time__range=(start_time, finish_time))
-        enter_finish_time = Q(finish_time__range=(start_time, finish_time))
-
-        movie_obj = MovieShow.objects.filter(cinema_hall=cinema_hall_obj.pk).filter(
-            enter_start_date | enter_finish_date | middle_date_start).filter(enter_start_time | enter_finish_time).all()
-
-        if start_time > finish_time:
-            enter_start_time_until_midnight = Q(start_time__range=(start_time, '23:59:59'))
-            enter_start_time_after_midnight = Q(start_time__range=('00:00:00', finish_time))
-            enter_finish_time_until_midnight = Q(finish_time__range=(start_time, '23:59:59'))
-            enter_finish_time_after_midnight = Q(finish_time__range=('00:00:00', finish_time))
-
-            movie_obj = MovieShow.objects.filter(cinema_hall=cinema_hall_obj.pk).filter(
-                enter_start_date | enter_finish_date | middle_date_start).\
-                filter(enter_start_time_until_midnight | enter_start_time_after_midnight |
-                       enter_finish_time_until_midnight | enter_finish_time_after_midnight).all()
-
-        if movie_obj:
+        if get_conflicts(cinema_hall_obj, start_date, finish_date, start_time, finish_time):
             messages.warning(self.request, 'Сеансы в одном зале не могут накладываться друг на друга')
             raise ValidationError('Сеансы в одном зале не могут накладываться друг на друга')
 
@@ -158,9 +143,9 @@ class ProductBuyForm(ModelForm):
     def clean(self):
         cleaned_data = super().clean()
         movie_show_id = self.request.POST.get('movie-id')
-        movie_show_obj = MovieShow.objects.get(id=movie_show_id)
+        movie_show_obj = MovieShow.objects.select_related('cinema_hall').get(id=movie_show_id)
         count_of_buy = int(cleaned_data.get('number_of_ticket'))
-        tickets_left = int(self.request.POST.get('tickets_left'))
+        tickets_left = movie_show_obj.get_tickets_count(self.request.POST.get('date-buy') or date.today())
 
         if count_of_buy == 0:
             messages.warning(self.request, 'Вы не выбрали нужного количества билетов')
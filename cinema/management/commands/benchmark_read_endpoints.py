@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+
+ENDPOINTS = [
+    ('sessions', '/api/session/', '/api/async/session/'),
+    ('purchases', '/api/purchased/', '/api/async/purchased/'),
+    ('realtime', '/realtime/', '/realtime/async/'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent throughput of the sync read endpoints served through the WSGI handler ' \
+           'with their async variants served through the ASGI handler'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=20,
+                            help='Worker threads for WSGI, requests in flight for ASGI')
+        parser.add_argument('--token', help='API token, the purchase history is skipped without one')
+
+    def handle(self, *args, **options):
+        headers = {'authorization': f'Token {options["token"]}'} if options['token'] else {}
+        for name, sync_path, async_path in ENDPOINTS:
+            if name == 'purchases' and not headers:
+                continue
+            # The test clients send requests for the 'testserver' host.
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                wsgi = self.run_wsgi(sync_path, headers, options['requests'], options['concurrency'])
+                asgi = asyncio.run(self.run_asgi(async_path, headers, options['requests'], options['concurrency']))
+            self.stdout.write(f'{name}: WSGI {wsgi:.0f} req/s, ASGI {asgi:.0f} req/s')
+
+    @staticmethod
+    def check_statuses(path, statuses):
+        failed = [status for status in statuses if status != 200]
+        if failed:
+            raise CommandError(f'{path}: {len(failed)} request(s) failed with status {failed[0]}')
+
+    def run_wsgi(self, path, headers, number_of_requests, concurrency):
+        local = threading.local()
+
+        def get(_):
+            if not hasattr(local, 'client'):
+                local.client = Client(headers=headers)
+            return local.client.get(path).status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            statuses = list(executor.map(get, range(number_of_requests)))
+        elapsed = time.perf_counter() - started
+        self.check_statuses(path, statuses)
+        return number_of_requests / elapsed
+
+    async def run_asgi(self, path, headers, number_of_requests, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def get():
+            async with semaphore:
+                return (await client.get(path, headers=headers)).status_code
+
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*(get() for _ in range(number_of_requests)))
+        elapsed = time.perf_counter() - started
+        self.check_statuses(path, statuses)
+        return number_of_requests / elapsed
@@ -0,0 +1,61 @@
+import time
+from datetime import date, time as show_time
+from django.db import connection, transaction
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from cinema.api.serializers import PurchaseSerializer, purchase_values
+from cinema.models import CinemaHall, MovieShow, MyUser, PurchasedTicket
+
+
+class Command(BaseCommand):
+    help = 'Time serializing a purchase history through PurchaseSerializer and through the values fast path, ' \
+           'on rows created in a transaction that is rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--shows', type=int, default=100)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = MyUser.objects.create(username='benchmark-serializers')
+            cinema_halls = CinemaHall.objects.bulk_create(
+                CinemaHall(hall_name=f'benchmark-serializers-{number}', number_of_seats=100)
+                for number in range(options['shows']))
+            movie_shows = [MovieShow.objects.create(movie_name=f'Movie{number}', start_time=show_time(10),
+                                                    finish_time=show_time(12), start_date=date(2000, 1, 1),
+                                                    finish_date=date(2000, 1, 1), cinema_hall=cinema_hall)
+                           for number, cinema_hall in enumerate(cinema_halls)]
+            PurchasedTicket.objects.bulk_create(
+                PurchasedTicket(user=user, movie_show=movie_shows[number % len(movie_shows)], date=date(2000, 1, 1),
+                                seats=[[1, number % 100 + 1]], ticket_price=100, purchase_amount=100)
+                for number in range(options['rows']))
+            tickets = PurchasedTicket.objects.filter(user=user).order_by('id')
+
+            results = [
+                ('serializer', self.measure(lambda: PurchaseSerializer(tickets, many=True).data)),
+                ('serializer + select_related', self.measure(
+                    lambda: PurchaseSerializer(tickets.select_related('movie_show__cinema_hall'), many=True).data)),
+                ('values', self.measure(lambda: purchase_values.serialize(purchase_values.values(tickets)))),
+            ]
+            transaction.set_rollback(True)
+
+        baseline = results[0][1][0]
+        for name, (elapsed, queries, content) in results:
+            self.stdout.write(f'{name}: {elapsed * 1000:.0f} ms, {queries} quer(ies), '
+                              f'x{baseline / elapsed:.1f}')
+        if len({content for name, (elapsed, queries, content) in results}) != 1:
+            self.stderr.write('Outputs differ')
+
+    @staticmethod
+    def measure(serialize):
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            started = time.perf_counter()
+            content = JSONRenderer().render(serialize())
+            elapsed = time.perf_counter() - started
+        return elapsed, len(queries), content
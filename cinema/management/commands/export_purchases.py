@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from cinema.api.serializers import PurchaseExportParamsSerializer
+from cinema.export import get_purchase_export_queryset, iter_purchase_csv
+from stanhjr_project.settings import EXPORT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Stream confirmed purchases of a date range as CSV, for accounting'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', help='YYYY-MM-DD, SALES_REPORT_DAYS days before --date-to by default')
+        parser.add_argument('--date-to', help='YYYY-MM-DD, today by default')
+        parser.add_argument('--hall', type=int, help='Cinema hall id')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+        parser.add_argument('--output', help='File to write, stdout by default')
+
+    def handle(self, *args, **options):
+        params = PurchaseExportParamsSerializer(data={
+            name: value for name, value in (('date_from', options['date_from']), ('date_to', options['date_to']),
+                                            ('hall_id', options['hall'])) if value is not None})
+        if not params.is_valid():
+            raise CommandError(params.errors)
+        tickets = get_purchase_export_queryset(params.validated_data['date_from'], params.validated_data['date_to'],
+                                               params.validated_data.get('hall_id'))
+        chunks = iter_purchase_csv(tickets, options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
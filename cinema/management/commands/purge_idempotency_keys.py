@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from cinema.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete expired idempotency keys'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = 0
+        while True:
+            batch = list(IdempotencyKey.objects.expired().values_list('pk', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            deleted += IdempotencyKey.objects.filter(pk__in=batch).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f'{deleted} expired idempotency key(s) deleted'))
@@ -0,0 +1,85 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F, Max, Min, Sum
+from cinema.models import DaySales, HallSales, PurchasedTicket, ShowSales
+
+SUMMARIES = [(ShowSales, ('movie_show', 'date')), (HallSales, ('cinema_hall', 'date')), (DaySales, ('date', ))]
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the sales summaries from purchased tickets, a chunk of days at a time, and report drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report drift, exit with an error if any is found')
+        parser.add_argument('--chunk-days', type=int, default=31)
+
+    def handle(self, *args, **options):
+        first, last = self.get_date_range()
+        drift = 0
+        while first and first <= last:
+            chunk_last = min(first + timedelta(days=options['chunk_days'] - 1), last)
+            drift += self.rebuild_chunk(first, chunk_last, options['check'])
+            first = chunk_last + timedelta(days=1)
+
+        if options['check']:
+            if drift:
+                raise CommandError(f'Sales summary drift in {drift} row(s)')
+            self.stdout.write(self.style.SUCCESS('Sales summaries are consistent'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Sales summaries rebuilt, {drift} row(s) fixed'))
+
+    @staticmethod
+    def get_date_range():
+        tickets = PurchasedTicket.objects.confirmed().aggregate(first=Min('date'), last=Max('date'))
+        summaries = DaySales.objects.aggregate(first=Min('date'), last=Max('date'))
+        first = min(filter(None, (tickets['first'], summaries['first'])), default=None)
+        last = max(filter(None, (tickets['last'], summaries['last'])), default=None)
+        return first, last
+
+    @staticmethod
+    def get_expected(date_from, date_to):
+        shows = PurchasedTicket.objects.confirmed().filter(date__range=(date_from, date_to))\
+            .values('movie_show', 'date')\
+            .annotate(cinema_hall=F('movie_show__cinema_hall'),
+                      number_of_seats=F('movie_show__cinema_hall__number_of_seats'),
+                      tickets_sold=Sum('number_of_ticket'),
+                      revenue=Sum('purchase_amount'))\
+            .order_by()
+        expected = {ShowSales: {}, HallSales: {}, DaySales: {}}
+        for row in shows:
+            values = (row['tickets_sold'], row['revenue'], row['number_of_seats'])
+            expected[ShowSales][(row['movie_show'], row['date'])] = values
+            for model, key in ((HallSales, (row['cinema_hall'], row['date'])), (DaySales, (row['date'], ))):
+                expected[model][key] = tuple(map(sum, zip(expected[model].get(key, (0, 0, 0)), values)))
+        return expected
+
+    def rebuild_chunk(self, date_from, date_to, check):
+        with transaction.atomic():
+            if not check:
+                # Purchases that have not written the summaries yet wait, and add to the rebuilt rows.
+                tables = ', '.join(connection.ops.quote_name(model._meta.db_table) for model, fields in SUMMARIES)
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LOCK TABLE {tables} IN SHARE ROW EXCLUSIVE MODE')
+            expected = self.get_expected(date_from, date_to)
+            drift = 0
+            for model, key_fields in SUMMARIES:
+                summaries = model.objects.filter(date__range=(date_from, date_to))
+                actual = {row[:-3]: row[-3:] for row in summaries.values_list(
+                    *key_fields, 'tickets_sold', 'revenue', 'number_of_seats')}
+                wrong = [key for key in sorted(actual.keys() | expected[model].keys(), key=str)
+                         if actual.get(key) != expected[model].get(key)]
+                for key in wrong:
+                    self.stdout.write(f'{model.__name__} {", ".join(map(str, key))}: '
+                                      f'summary {actual.get(key, (0, 0, 0))}, '
+                                      f'purchased {expected[model].get(key, (0, 0, 0))}')
+                drift += len(wrong)
+                if wrong and not check:
+                    attnames = [model._meta.get_field(field).attname for field in key_fields]
+                    summaries.delete()
+                    model.objects.bulk_create(
+                        model(**dict(zip(attnames, key)), tickets_sold=tickets_sold, revenue=revenue,
+                              number_of_seats=number_of_seats)
+                        for key, (tickets_sold, revenue, number_of_seats) in expected[model].items())
+        return drift
@@ -0,0 +1,99 @@
+from itertools import groupby
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from cinema.models import CinemaHall, PurchasedTicket, SeatInventory
+
+TICKET_FIELDS = ('movie_show', 'date', 'number_of_ticket', 'seats', 'hold_expires_at',
+                 'movie_show__cinema_hall__number_of_seats', 'movie_show__cinema_hall__number_of_rows')
+
+
+def get_ledger(tickets):
+    """
+    Yield ((movie_show, date), (tickets_sold, tickets_held, taken), number_of_seats) from `tickets` rows of
+    TICKET_FIELDS ordered by (movie_show, date), one (show, date) at a time.
+    """
+    for key, rows in groupby(tickets, key=lambda row: row[:2]):
+        tickets_sold = tickets_held = taken = number_of_seats = 0
+        for movie_show_id, date_sale, number_of_ticket, seats, hold_expires_at, number_of_seats, number_of_rows \
+                in rows:
+            cinema_hall = CinemaHall(number_of_seats=number_of_seats, number_of_rows=number_of_rows)
+            if hold_expires_at:
+                tickets_held += number_of_ticket
+            else:
+                tickets_sold += number_of_ticket
+            for row, seat in seats:
+                taken |= 1 << cinema_hall.get_seat_index(row, seat)
+        yield key, (tickets_sold, tickets_held, taken), number_of_seats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the seat inventory ledger from purchased tickets and report drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report drift, exit with an error if any is found')
+
+    def handle(self, *args, **options):
+        drift = self.find_drift()
+        if options['check']:
+            if drift:
+                raise CommandError(f'Seat inventory drift in {len(drift)} row(s)')
+            self.stdout.write(self.style.SUCCESS('Seat inventory is consistent'))
+            return
+
+        fixed = sum(self.rebuild(movie_show_id, date_sale) for movie_show_id, date_sale in drift)
+        self.stdout.write(self.style.SUCCESS(f'Seat inventory rebuilt, {fixed} row(s) fixed'))
+
+    def find_drift(self):
+        """
+        Compare the ledger with the tickets on one snapshot, without locking anything, both read in
+        (movie_show, date) order and merged a (show, date) at a time. Return the keys that differ.
+        """
+        drift = []
+        outermost = not connection.in_atomic_block
+        with transaction.atomic():
+            if outermost:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+            inventory = SeatInventory.objects.order_by('movie_show', 'date')\
+                .values_list('movie_show', 'date', 'tickets_sold', 'tickets_held', 'seat_map').iterator()
+            tickets = PurchasedTicket.objects.order_by('movie_show', 'date').values_list(*TICKET_FIELDS).iterator()
+            sold_rows = get_ledger(tickets)
+            ledger, sold = next(inventory, None), next(sold_rows, None)
+            while ledger or sold:
+                ledger_key = tuple(ledger[:2]) if ledger else None
+                sold_key = sold[0] if sold else None
+                key = min(filter(None, (ledger_key, sold_key)))
+                actual = (ledger[2], ledger[3], int.from_bytes(ledger[4], 'little')) \
+                    if key == ledger_key else (0, 0, 0)
+                expected = sold[1] if key == sold_key else (0, 0, 0)
+                if expected != actual:
+                    drift.append(key)
+                    self.stdout.write(f'movie_show={key[0]} date={key[1]}: '
+                                      f'ledger {actual[0]} sold {actual[1]} held, '
+                                      f'purchased {expected[0]} sold {expected[1]} held'
+                                      f'{"" if expected[2] == actual[2] else ", seat map differs"}')
+                if key == ledger_key:
+                    ledger = next(inventory, None)
+                if key == sold_key:
+                    sold = next(sold_rows, None)
+        return drift
+
+    @staticmethod
+    def rebuild(movie_show_id, date_sale):
+        # Buyers write tickets of a (show, date) under the lock of its inventory row only, so it is
+        # enough to hold that one lock while the row is recounted.
+        with transaction.atomic():
+            inventory, created = SeatInventory.objects.select_for_update()\
+                .get_or_create(movie_show_id=movie_show_id, date=date_sale)
+            tickets = PurchasedTicket.objects.filter(movie_show=movie_show_id, date=date_sale)\
+                .order_by().values_list(*TICKET_FIELDS)
+            key, (tickets_sold, tickets_held, taken), number_of_seats = \
+                next(get_ledger(tickets.iterator()), (None, (0, 0, 0), 0))
+            if (inventory.tickets_sold, inventory.tickets_held, inventory.get_taken_seats()) == \
+                    (tickets_sold, tickets_held, taken):
+                return False
+            inventory.tickets_sold, inventory.tickets_held = tickets_sold, tickets_held
+            inventory.seat_map = taken.to_bytes((number_of_seats + 7) // 8, 'little')
+            inventory.save(update_fields=['tickets_sold', 'tickets_held', 'seat_map'])
+        return True
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from cinema.models import MyUser, PurchasedTicket
+
+
+class Command(BaseCommand):
+    help = 'Recompute MyUser.money_spent from purchased tickets and report mismatches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--fix', action='store_true', help='Overwrite mismatched totals with the recomputed ones')
+
+    def handle(self, *args, **options):
+        last_id = 0
+        mismatches = 0
+        while True:
+            with transaction.atomic():
+                users = MyUser.objects.filter(pk__gt=last_id).order_by('pk')[:options['batch_size']]
+                if options['fix']:
+                    users = users.select_for_update()
+                users = list(users.values_list('pk', 'money_spent'))
+                if not users:
+                    break
+                last_id = users[-1][0]
+
+                spent = dict(PurchasedTicket.objects.confirmed().filter(user__in=[pk for pk, money_spent in users])
+                             .values('user').annotate(total=Sum('purchase_amount'))
+                             .order_by().values_list('user', 'total'))
+                for pk, money_spent in users:
+                    expected = spent.get(pk, 0)
+                    if money_spent == expected:
+                        continue
+                    mismatches += 1
+                    self.stdout.write(f'user={pk}: money_spent {money_spent}, purchased {expected}')
+                    if options['fix']:
+                        MyUser.objects.filter(pk=pk).update(money_spent=expected)
+
+        action = 'fixed' if options['fix'] else 'found'
+        self.stdout.write(self.style.SUCCESS(f'{mismatches} mismatch(es) {action}'))
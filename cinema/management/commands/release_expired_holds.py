@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from cinema.services import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = 'Release seats whose checkout hold has expired'
+
+    def handle(self, *args, **options):
+        released = release_expired_holds()
+        self.stdout.write(self.style.SUCCESS(f'{released} held ticket(s) released'))
@@ -0,0 +1,59 @@
+import asyncio
+import time
+import tracemalloc
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncRequestFactory
+from django.utils import timezone
+from cinema.broadcast import broadcaster
+from cinema.views import seat_availability_stream
+
+
+class Command(BaseCommand):
+    help = 'Open idle seat availability streams in-process, report memory per connection and fan-out time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        memory, fan_out = asyncio.run(self.run(options['connections']))
+        self.stdout.write(f'{options["connections"]} connection(s): {memory / 1024:.1f} KiB per idle connection, '
+                          f'fan-out to all in {fan_out * 1000:.1f} ms')
+
+    async def run(self, number_of_connections):
+        factory = AsyncRequestFactory()
+        received = asyncio.Event()
+        delivered = [0]
+
+        async def consume(stream, marker):
+            async for chunk in stream:
+                if marker in chunk:
+                    delivered[0] += 1
+                    if delivered[0] == number_of_connections:
+                        received.set()
+
+        marker = b'"movie_show": -1'
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        tasks = []
+        for _ in range(number_of_connections):
+            response = await seat_availability_stream(factory.get('/realtime/seats/'))
+            tasks.append(asyncio.create_task(consume(response.streaming_content, marker)))
+        # Let every stream send its snapshot and go idle, a stream only ends early on an error.
+        done, _ = await asyncio.wait(tasks, timeout=1, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            task.result()
+        memory = (tracemalloc.get_traced_memory()[0] - before) / max(number_of_connections, 1)
+        tracemalloc.stop()
+
+        started = time.perf_counter()
+        broadcaster.publish({'movie_show': -1, 'date': str(timezone.localdate()), 'free_seats': 0})
+        await received.wait()
+        fan_out = time.perf_counter() - started
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await sync_to_async(connections.close_all)()
+        return memory, fan_out
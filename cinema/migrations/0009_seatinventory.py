@@ -0,0 +1,39 @@
+# Generated by Django 4.2.13 on 2026-10-18 16:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def fill_seat_inventory(apps, schema_editor):
+    PurchasedTicket = apps.get_model('cinema', 'PurchasedTicket')
+    SeatInventory = apps.get_model('cinema', 'SeatInventory')
+    SeatInventory.objects.bulk_create(
+        SeatInventory(movie_show_id=row['movie_show'], date=row['date'], tickets_sold=row['tickets_sold'])
+        for row in PurchasedTicket.objects.values('movie_show', 'date')
+        .annotate(tickets_sold=Sum('number_of_ticket')).order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0008_remove_purchasedticket_purchase_amount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatInventory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('tickets_sold', models.PositiveIntegerField(default=0)),
+                ('movie_show', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_inventory', to='cinema.movieshow')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='seatinventory',
+            constraint=models.UniqueConstraint(fields=('movie_show', 'date'), name='unique_seat_inventory_show_date'),
+        ),
+        migrations.RunPython(fill_seat_inventory, migrations.RunPython.noop),
+    ]
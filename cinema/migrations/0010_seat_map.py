@@ -0,0 +1,46 @@
+# Generated by Django 4.2.13 on 2026-10-18 16:56
+
+import django.core.validators
+from django.db import migrations, models
+
+
+def assign_legacy_seats(apps, schema_editor):
+    # Every hall has a single row at this point, so seat N of the row is bit N - 1 of the map.
+    PurchasedTicket = apps.get_model('cinema', 'PurchasedTicket')
+    SeatInventory = apps.get_model('cinema', 'SeatInventory')
+    for inventory in SeatInventory.objects.select_related('movie_show__cinema_hall'):
+        number_of_seats = inventory.movie_show.cinema_hall.number_of_seats
+        taken = 0
+        tickets = PurchasedTicket.objects.filter(movie_show=inventory.movie_show, date=inventory.date).order_by('id')
+        for ticket in tickets:
+            ticket.seats = [[1, taken + number + 1] for number in range(ticket.number_of_ticket)]
+            ticket.save(update_fields=['seats'])
+            taken += ticket.number_of_ticket
+        inventory.seat_map = ((1 << taken) - 1).to_bytes((number_of_seats + 7) // 8, 'little')
+        inventory.save(update_fields=['seat_map'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0009_seatinventory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cinemahall',
+            name='number_of_rows',
+            field=models.PositiveIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='purchasedticket',
+            name='seats',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='seatinventory',
+            name='seat_map',
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.RunPython(assign_legacy_seats, migrations.RunPython.noop),
+    ]
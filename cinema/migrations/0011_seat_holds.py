@@ -0,0 +1,27 @@
+# Generated by Django 4.2.13 on 2026-10-18 16:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0010_seat_map'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchasedticket',
+            name='hold_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='seatinventory',
+            name='tickets_held',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='purchasedticket',
+            index=models.Index(condition=models.Q(('hold_expires_at__isnull', False)), fields=['hold_expires_at'], name='purchased_hold_expires_idx'),
+        ),
+    ]
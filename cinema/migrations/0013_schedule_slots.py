@@ -0,0 +1,55 @@
+# Generated by Django 4.2.13 on 2026-10-18 17:08
+
+from datetime import date
+import cinema.models
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+from django.db import migrations, models
+from django.db.backends.postgresql.psycopg_any import DateRange, NumericRange
+import django.db.models.deletion
+
+
+def create_schedule_slots(apps, schema_editor):
+    # Same slots as cinema.signals.sync_schedule_slots; overlapping shows already in the table make the
+    # constraint below fail, they have to be moved apart before migrating.
+    MovieShow = apps.get_model('cinema', 'MovieShow')
+    ScheduleSlot = apps.get_model('cinema', 'ScheduleSlot')
+    slots = []
+    for movie_show in MovieShow.objects.all():
+        first_day, last_day = movie_show.start_date.toordinal(), movie_show.finish_date.toordinal()
+        start_minute = movie_show.start_time.hour * 60 + movie_show.start_time.minute
+        finish_minute = movie_show.finish_time.hour * 60 + movie_show.finish_time.minute
+        intervals = [(first_day, last_day, start_minute, finish_minute)]
+        if start_minute > finish_minute:
+            intervals = [(first_day, last_day, start_minute, 24 * 60 - 1),
+                         (first_day + 1, last_day + 1, 0, finish_minute)]
+        slots.extend(ScheduleSlot(movie_show=movie_show, cinema_hall_id=movie_show.cinema_hall_id,
+                                  dates=DateRange(date.fromordinal(first), date.fromordinal(last), '[]'),
+                                  minutes=NumericRange(first_minute, last_minute, '[]'))
+                     for first, last, first_minute, last_minute in intervals)
+    ScheduleSlot.objects.bulk_create(slots)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0012_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dates', django.contrib.postgres.fields.ranges.DateRangeField()),
+                ('minutes', django.contrib.postgres.fields.ranges.IntegerRangeField()),
+                ('cinema_hall', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='schedule_slots', to='cinema.cinemahall')),
+                ('movie_show', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedule_slots', to='cinema.movieshow')),
+            ],
+        ),
+        migrations.RunPython(create_schedule_slots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='scheduleslot',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(expressions=[(cinema.models.SingleValueRange('cinema_hall'), '&&'), ('dates', '&&'), ('minutes', '&&')], name='exclude_overlapping_movie_shows'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.13 on 2026-10-18 17:18
+
+from datetime import datetime, timedelta
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def create_screenings(apps, schema_editor):
+    MovieShow = apps.get_model('cinema', 'MovieShow')
+    Screening = apps.get_model('cinema', 'Screening')
+    for movie_show in MovieShow.objects.all():
+        finish_day_offset = timedelta(days=movie_show.start_time > movie_show.finish_time)
+        screenings = []
+        for day in range((movie_show.finish_date - movie_show.start_date).days + 1):
+            date_show = movie_show.start_date + timedelta(days=day)
+            screenings.append(Screening(
+                movie_show=movie_show, date=date_show,
+                starts_at=timezone.make_aware(datetime.combine(date_show, movie_show.start_time)),
+                ends_at=timezone.make_aware(datetime.combine(date_show + finish_day_offset, movie_show.finish_time))))
+        Screening.objects.bulk_create(screenings)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0013_schedule_slots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Screening',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('starts_at', models.DateTimeField()),
+                ('ends_at', models.DateTimeField()),
+                ('movie_show', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='screenings', to='cinema.movieshow')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='screening',
+            constraint=models.UniqueConstraint(fields=('date', 'movie_show'), name='unique_screening_date_show'),
+        ),
+        migrations.RunPython(create_screenings, migrations.RunPython.noop),
+    ]
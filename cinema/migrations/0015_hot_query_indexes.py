@@ -0,0 +1,38 @@
+# Generated by Django 4.2.13 on 2026-10-18 17:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0014_screening'),
+    ]
+
+    operations = [
+        # The composite indexes lead with the foreign key, so the single column indexes on it go.
+        migrations.AddIndex(
+            model_name='movieshow',
+            index=models.Index(fields=['cinema_hall', 'finish_date'], name='movieshow_hall_finish_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchasedticket',
+            index=models.Index(fields=['movie_show', 'date'], name='purchased_show_date_idx'),
+        ),
+        migrations.AlterField(
+            model_name='movieshow',
+            name='cinema_hall',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='movie_show', to='cinema.cinemahall'),
+        ),
+        migrations.AlterField(
+            model_name='purchasedticket',
+            name='movie_show',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='purchased_tickets', to='cinema.movieshow'),
+        ),
+        migrations.AlterField(
+            model_name='seatinventory',
+            name='movie_show',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='seat_inventory', to='cinema.movieshow'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.13 on 2026-10-18 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0015_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchasedticket',
+            index=models.Index(condition=models.Q(('hold_expires_at__isnull', True)), fields=['user', '-date', '-id'], name='purchased_user_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 4.2.13 on 2026-10-18 18:03
+
+from datetime import timedelta
+from django.db import migrations, models
+from django.db.models import F, Max, Min, Sum
+import django.db.models.deletion
+
+CHUNK_DAYS = 31
+
+
+def backfill_sales(apps, schema_editor):
+    # The grouped queries of rebuild_sales, a chunk of days at a time. Tickets keep no price of their own
+    # before 0018, a ticket is worth the price of its show, as get_purchase_amount counted it then.
+    PurchasedTicket = apps.get_model('cinema', 'PurchasedTicket')
+    ShowSales = apps.get_model('cinema', 'ShowSales')
+    HallSales = apps.get_model('cinema', 'HallSales')
+    DaySales = apps.get_model('cinema', 'DaySales')
+    tickets = PurchasedTicket.objects.filter(hold_expires_at__isnull=True)
+    dates = tickets.aggregate(first=Min('date'), last=Max('date'))
+    first, last = dates['first'], dates['last']
+    while first and first <= last:
+        chunk_last = min(first + timedelta(days=CHUNK_DAYS - 1), last)
+        shows = tickets.filter(date__range=(first, chunk_last))\
+            .values('movie_show', 'date')\
+            .annotate(cinema_hall=F('movie_show__cinema_hall'),
+                      number_of_seats=F('movie_show__cinema_hall__number_of_seats'),
+                      tickets_sold=Sum('number_of_ticket'),
+                      revenue=Sum(F('number_of_ticket') * F('movie_show__ticket_price')))\
+            .order_by()
+        show_sales, halls, days = [], {}, {}
+        for row in shows:
+            values = (row['tickets_sold'], row['revenue'], row['number_of_seats'])
+            show_sales.append(ShowSales(movie_show_id=row['movie_show'], date=row['date'], tickets_sold=values[0],
+                                        revenue=values[1], number_of_seats=values[2]))
+            for totals, key in ((halls, (row['cinema_hall'], row['date'])), (days, row['date'])):
+                totals[key] = tuple(map(sum, zip(totals.get(key, (0, 0, 0)), values)))
+        ShowSales.objects.bulk_create(show_sales)
+        HallSales.objects.bulk_create(
+            HallSales(cinema_hall_id=cinema_hall_id, date=date_sale, tickets_sold=tickets_sold, revenue=revenue,
+                      number_of_seats=number_of_seats)
+            for (cinema_hall_id, date_sale), (tickets_sold, revenue, number_of_seats) in halls.items())
+        DaySales.objects.bulk_create(
+            DaySales(date=date_sale, tickets_sold=tickets_sold, revenue=revenue, number_of_seats=number_of_seats)
+            for date_sale, (tickets_sold, revenue, number_of_seats) in days.items())
+        first = chunk_last + timedelta(days=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0016_purchased_user_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DaySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tickets_sold', models.PositiveIntegerField(default=0)),
+                ('revenue', models.PositiveBigIntegerField(default=0)),
+                ('number_of_seats', models.PositiveIntegerField(default=0)),
+                ('date', models.DateField(unique=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ShowSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tickets_sold', models.PositiveIntegerField(default=0)),
+                ('revenue', models.PositiveBigIntegerField(default=0)),
+                ('number_of_seats', models.PositiveIntegerField(default=0)),
+                ('date', models.DateField()),
+                ('movie_show', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales', to='cinema.movieshow')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HallSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tickets_sold', models.PositiveIntegerField(default=0)),
+                ('revenue', models.PositiveBigIntegerField(default=0)),
+                ('number_of_seats', models.PositiveIntegerField(default=0)),
+                ('date', models.DateField()),
+                ('cinema_hall', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales', to='cinema.cinemahall')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='showsales',
+            constraint=models.UniqueConstraint(fields=('date', 'movie_show'), name='unique_show_sales_date_show'),
+        ),
+        migrations.AddConstraint(
+            model_name='hallsales',
+            constraint=models.UniqueConstraint(fields=('date', 'cinema_hall'), name='unique_hall_sales_date_hall'),
+        ),
+        migrations.RunPython(backfill_sales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+from django.db import migrations, models, transaction
+from django.db.models import F, OuterRef, Subquery
+
+BATCH_SIZE = 1000
+
+
+def backfill_prices(apps, schema_editor):
+    # A batch per transaction, so the rows of a batch are locked only while it is written.
+    PurchasedTicket = apps.get_model('cinema', 'PurchasedTicket')
+    MovieShow = apps.get_model('cinema', 'MovieShow')
+    price = Subquery(MovieShow.objects.filter(pk=OuterRef('movie_show')).values('ticket_price')[:1])
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            ids = list(PurchasedTicket.objects.filter(pk__gt=last_id, ticket_price__isnull=True)
+                       .order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE])
+            if not ids:
+                break
+            PurchasedTicket.objects.filter(pk__in=ids).update(ticket_price=price,
+                                                              purchase_amount=F('number_of_ticket') * price)
+            last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+    # Every statement commits on its own, no lock outlives its statement.
+    atomic = False
+
+    dependencies = [
+        ('cinema', '0017_sales_summaries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchasedticket',
+            name='ticket_price',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='purchasedticket',
+            name='purchase_amount',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.RunPython(backfill_prices, migrations.RunPython.noop),
+        # SET NOT NULL skips its full scan under an exclusive lock when a validated CHECK already proves it,
+        # and VALIDATE scans under a lock that lets reads and writes through. The UPDATE catches up with the
+        # tickets sold meanwhile by code that does not set the price yet.
+        migrations.RunSQL(
+            sql=[
+                'UPDATE cinema_purchasedticket AS ticket '
+                'SET ticket_price = movie_show.ticket_price, '
+                'purchase_amount = ticket.number_of_ticket * movie_show.ticket_price '
+                'FROM cinema_movieshow AS movie_show '
+                'WHERE movie_show.id = ticket.movie_show_id AND ticket.ticket_price IS NULL',
+                'ALTER TABLE cinema_purchasedticket ADD CONSTRAINT purchasedticket_price_not_null '
+                'CHECK (ticket_price IS NOT NULL AND purchase_amount IS NOT NULL) NOT VALID',
+                'ALTER TABLE cinema_purchasedticket VALIDATE CONSTRAINT purchasedticket_price_not_null',
+                'ALTER TABLE cinema_purchasedticket ALTER COLUMN ticket_price SET NOT NULL, '
+                'ALTER COLUMN purchase_amount SET NOT NULL',
+                'ALTER TABLE cinema_purchasedticket DROP CONSTRAINT purchasedticket_price_not_null',
+            ],
+            reverse_sql=[
+                'ALTER TABLE cinema_purchasedticket ALTER COLUMN ticket_price DROP NOT NULL, '
+                'ALTER COLUMN purchase_amount DROP NOT NULL',
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='purchasedticket',
+                    name='ticket_price',
+                    field=models.PositiveIntegerField(),
+                ),
+                migrations.AlterField(
+                    model_name='purchasedticket',
+                    name='purchase_amount',
+                    field=models.PositiveIntegerField(),
+                ),
+            ],
+        ),
+    ]
@@ -1,8 +1,15 @@
-from datetime import date
+from datetime import date, datetime, timedelta
 from django.contrib.auth.models import AbstractUser
-from django.db import models
-from django.db.models import Sum
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateRangeField, IntegerRangeField, RangeOperators
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
+from django.db import models, transaction
+from django.db.models import F, Q, OuterRef, Subquery, ExpressionWrapper
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from rest_framework.authtoken.models import Token
+from cinema.broadcast import broadcaster
 
 
 class MyUser(AbstractUser):
@@ -12,15 +19,58 @@ class MyUser(AbstractUser):
 class CinemaHall(models.Model):
     hall_name = models.CharField(max_length=200, unique=True)
     number_of_seats = models.PositiveIntegerField(default=1)
+    number_of_rows = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)])
 
     def __str__(self):
         return self.hall_name
 
+    def clean(self):
+        error = self.get_layout_error(self.number_of_seats, self.number_of_rows)
+        if error:
+            raise ValidationError(error)
+
+    @staticmethod
+    def get_layout_error(number_of_seats, number_of_rows):
+        # Rows are filled one after another, every row has to keep at least one seat for the seat map.
+        if number_of_rows > number_of_seats:
+            return 'Рядов в зале не может быть больше чем мест'
+        if (number_of_rows - 1) * -(-number_of_seats // number_of_rows) >= number_of_seats:
+            return f'{number_of_seats} мест нельзя рассадить в {number_of_rows} рядов без пустых рядов'
+        return None
+
+    @property
+    def seats_in_row(self):
+        return -(-self.number_of_seats // self.number_of_rows)
+
+    def get_seat_index(self, row, seat):
+        index = (row - 1) * self.seats_in_row + seat - 1
+        if not 1 <= row <= self.number_of_rows or not 1 <= seat <= self.seats_in_row or index >= self.number_of_seats:
+            raise ValidationError({'seats': f'В зале нет места {row}-{seat}'})
+        return index
+
+    def get_seat(self, index):
+        return [index // self.seats_in_row + 1, index % self.seats_in_row + 1]
+
     def get_tickets(self):
         movie_shows_id = MovieShow.objects.filter(cinema_hall=self).values_list('id', flat=True)
         return PurchasedTicket.objects.filter(movie_show__in=movie_shows_id).first()
 
 
+class MovieShowQuerySet(models.QuerySet):
+
+    def with_free_seats(self, date_show):
+        tickets_taken = SeatInventory.objects.filter(movie_show=OuterRef('pk'), date=date_show)\
+            .values(taken=F('tickets_sold') + F('tickets_held'))
+        return self.select_related('cinema_hall').annotate(free_seats=ExpressionWrapper(
+            F('cinema_hall__number_of_seats') - Coalesce(Subquery(tickets_taken[:1]), 0),
+            output_field=models.IntegerField()))
+
+
+class SingleValueRange(models.Func):
+    # `=` has no GiST operator class without the btree_gist extension, `&&` of [value, value] works the same.
+    template = "int8range(%(expressions)s, %(expressions)s, '[]')"
+
+
 class MovieShow(models.Model):
     movie_name = models.CharField(max_length=120)
     ticket_price = models.PositiveIntegerField(default=100)
@@ -28,28 +78,273 @@ class MovieShow(models.Model):
     finish_time = models.TimeField()
     start_date = models.DateField()
     finish_date = models.DateField()
-    cinema_hall = models.ForeignKey(CinemaHall, on_delete=models.CASCADE, related_name='movie_show')
+    cinema_hall = models.ForeignKey(CinemaHall, on_delete=models.CASCADE, related_name='movie_show', db_index=False)
+
+    objects = MovieShowQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['cinema_hall', 'finish_date'], name='movieshow_hall_finish_idx'),
+        ]
 
     def get_purchased(self):
         return self.purchased_tickets.filter().first()
 
-    def get_tickets_count(self, date_today=date.today()):
-        if self.purchased_tickets.filter(date=date_today).aggregate(Sum('number_of_ticket')).get('number_of_ticket__sum'):
-            return self.cinema_hall.number_of_seats - self.purchased_tickets.filter(date=date_today)\
-                .aggregate(Sum('number_of_ticket')).get('number_of_ticket__sum')
-        return self.cinema_hall.number_of_seats
+    def get_screenings(self):
+        start_time, finish_time, start_date, finish_date = (
+            self._meta.get_field(name).to_python(getattr(self, name))
+            for name in ('start_time', 'finish_time', 'start_date', 'finish_date'))
+        finish_day_offset = timedelta(days=start_time > finish_time)
+        screenings = []
+        for day in range((finish_date - start_date).days + 1):
+            date_show = start_date + timedelta(days=day)
+            screenings.append(Screening(
+                movie_show=self, date=date_show,
+                starts_at=timezone.make_aware(datetime.combine(date_show, start_time)),
+                ends_at=timezone.make_aware(datetime.combine(date_show + finish_day_offset, finish_time))))
+        return screenings
+
+    def sync_screenings(self):
+        screenings = self.get_screenings()
+        self.screenings.exclude(date__in=[screening.date for screening in screenings]).delete()
+        Screening.objects.bulk_create(screenings, update_conflicts=True, unique_fields=['date', 'movie_show'],
+                                      update_fields=['starts_at', 'ends_at'])
+
+    def get_tickets_count(self, date_today=None):
+        date_show = date_today or date.today()
+        tickets_sold, tickets_held = self.seat_inventory.filter(date=date_show)\
+            .values_list('tickets_sold', 'tickets_held').first() or (0, 0)
+        if tickets_held:
+            tickets_held -= SeatInventory.release_expired_holds(self, date_show)
+        return self.cinema_hall.number_of_seats - tickets_sold - tickets_held
+
+
+class ScheduleSlot(models.Model):
+    """
+    The days and minutes a show occupies in its hall, one row for a show within a day, two for an overnight
+    show: the part before midnight on the show's days and the part after midnight on the days after them.
+    """
+    movie_show = models.ForeignKey(MovieShow, on_delete=models.CASCADE, related_name='schedule_slots')
+    cinema_hall = models.ForeignKey(CinemaHall, on_delete=models.CASCADE, related_name='schedule_slots',
+                                    db_index=False)
+    dates = DateRangeField()
+    minutes = IntegerRangeField()
+
+    class Meta:
+        constraints = [
+            ExclusionConstraint(name='exclude_overlapping_movie_shows', expressions=[
+                (SingleValueRange('cinema_hall'), RangeOperators.OVERLAPS),
+                ('dates', RangeOperators.OVERLAPS),
+                ('minutes', RangeOperators.OVERLAPS),
+            ]),
+        ]
+
+
+class ScreeningQuerySet(models.QuerySet):
+
+    def active(self, moment):
+        # A screening is shorter than a day, so only yesterday's overnight ones can still be running.
+        date_show = timezone.localtime(moment).date()
+        return self.filter(date__in=[date_show - timedelta(days=1), date_show],
+                           starts_at__lte=moment, ends_at__gte=moment)
+
+
+class Screening(models.Model):
+    movie_show = models.ForeignKey(MovieShow, on_delete=models.CASCADE, related_name='screenings')
+    date = models.DateField()
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField()
+
+    objects = ScreeningQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'movie_show'], name='unique_screening_date_show'),
+        ]
+
+
+class PurchasedTicketQuerySet(models.QuerySet):
+
+    def confirmed(self):
+        return self.filter(hold_expires_at__isnull=True)
+
+    def held(self):
+        return self.filter(hold_expires_at__isnull=False)
+
+    def expired(self):
+        return self.filter(hold_expires_at__lte=timezone.now())
 
 
 class PurchasedTicket(models.Model):
     date = models.DateField(auto_now=False)
     number_of_ticket = models.PositiveIntegerField(default=1)
-    movie_show = models.ForeignKey(MovieShow, on_delete=models.DO_NOTHING, related_name='purchased_tickets')
+    movie_show = models.ForeignKey(MovieShow, on_delete=models.DO_NOTHING, related_name='purchased_tickets',
+                                   db_index=False)
     user = models.ForeignKey(MyUser, on_delete=models.DO_NOTHING, related_name='user')
+    seats = models.JSONField(default=list, blank=True)
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
+    ticket_price = models.PositiveIntegerField()
+    purchase_amount = models.PositiveIntegerField()
+
+    objects = PurchasedTicketQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['movie_show', 'date'], name='purchased_show_date_idx'),
+            models.Index(fields=['hold_expires_at'], name='purchased_hold_expires_idx',
+                         condition=Q(hold_expires_at__isnull=False)),
+            models.Index(fields=['user', '-date', '-id'], name='purchased_user_date_id_idx',
+                         condition=Q(hold_expires_at__isnull=True)),
+        ]
+
+    def set_price(self):
+        # The price at purchase time, a later change of the show's price leaves sold tickets alone.
+        self.ticket_price = self.movie_show.ticket_price
+        self.purchase_amount = self.number_of_ticket * self.ticket_price
 
     def get_purchase_amount(self):
-        return self.number_of_ticket * self.movie_show.ticket_price
+        return self.purchase_amount
+
+
+class SeatInventory(models.Model):
+    movie_show = models.ForeignKey(MovieShow, on_delete=models.CASCADE, related_name='seat_inventory',
+                                   db_index=False)
+    date = models.DateField()
+    tickets_sold = models.PositiveIntegerField(default=0)
+    tickets_held = models.PositiveIntegerField(default=0)
+    seat_map = models.BinaryField(default=bytes)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['movie_show', 'date'], name='unique_seat_inventory_show_date'),
+        ]
+
+    def get_taken_seats(self):
+        return int.from_bytes(self.seat_map, 'little')
+
+    def is_seat_taken(self, index):
+        return bool(self.get_taken_seats() >> index & 1)
+
+    def find_free_seats(self, number_of_ticket, number_of_seats):
+        free = ~self.get_taken_seats() & ((1 << number_of_seats) - 1)
+        indexes = []
+        while free and len(indexes) < number_of_ticket:
+            lowest = free & -free
+            indexes.append(lowest.bit_length() - 1)
+            free ^= lowest
+        return indexes
+
+    def take_seats(self, indexes, number_of_seats):
+        taken = self.get_taken_seats()
+        selected = 0
+        for index in indexes:
+            selected |= 1 << index
+        if taken & selected:
+            raise ValidationError({'seats': 'Выбранные места уже заняты'})
+        self.seat_map = (taken | selected).to_bytes((number_of_seats + 7) // 8, 'little')
+
+    def release_seats(self, indexes, number_of_seats):
+        taken = self.get_taken_seats()
+        for index in indexes:
+            taken &= ~(1 << index)
+        self.seat_map = taken.to_bytes((number_of_seats + 7) // 8, 'little')
+
+    def release_holds(self, tickets, cinema_hall):
+        # The caller must hold the row lock on this inventory.
+        released = 0
+        released_ids = []
+        for ticket in tickets:
+            self.release_seats([cinema_hall.get_seat_index(row, seat) for row, seat in ticket.seats],
+                               cinema_hall.number_of_seats)
+            released += ticket.number_of_ticket
+            released_ids.append(ticket.id)
+        if released:
+            PurchasedTicket.objects.filter(id__in=released_ids).delete()
+            self.tickets_held -= released
+            self.save(update_fields=['tickets_held', 'seat_map'])
+            self.publish_availability(cinema_hall.number_of_seats)
+        return released
+
+    def publish_availability(self, number_of_seats):
+        message = {'movie_show': self.movie_show_id, 'date': str(self.date),
+                   'free_seats': number_of_seats - self.tickets_sold - self.tickets_held}
+        transaction.on_commit(lambda: broadcaster.publish(message))
+
+    @classmethod
+    def release_expired_holds(cls, movie_show, date_show):
+        with transaction.atomic():
+            inventory = cls.objects.select_for_update().filter(movie_show=movie_show, date=date_show).first()
+            if inventory is None or not inventory.tickets_held:
+                return 0
+            expired = PurchasedTicket.objects.held().expired().filter(movie_show=movie_show, date=date_show)
+            return inventory.release_holds(expired, CinemaHall.objects.get(movie_show=movie_show))
+
+
+class IdempotencyKeyQuerySet(models.QuerySet):
+
+    def expired(self):
+        return self.filter(expires_at__lte=timezone.now())
+
+
+class IdempotencyKey(models.Model):
+    key = models.CharField(max_length=255)
+    user = models.ForeignKey(MyUser, on_delete=models.CASCADE, related_name='idempotency_keys')
+    request_hash = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True)
+    response_data = models.JSONField(null=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    objects = IdempotencyKeyQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_user_key'),
+        ]
 
 
 class TokenExpired(Token):
     last_action = models.DateTimeField(null=True)
 
+
+
+class SalesSummary(models.Model):
+    """
+    Tickets sold, revenue and seats of a slice of screenings, kept up to date in the purchase transaction by
+    `cinema.sales.record_sales`. `number_of_seats` counts the screenings that have sold tickets.
+    """
+    tickets_sold = models.PositiveIntegerField(default=0)
+    revenue = models.PositiveBigIntegerField(default=0)
+    number_of_seats = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def occupancy(self):
+        if not self.number_of_seats:
+            return 0
+        return round(self.tickets_sold * 100 / self.number_of_seats, 1)
+
+
+class ShowSales(SalesSummary):
+    movie_show = models.ForeignKey(MovieShow, on_delete=models.CASCADE, related_name='sales')
+    date = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'movie_show'], name='unique_show_sales_date_show'),
+        ]
+
+
+class HallSales(SalesSummary):
+    cinema_hall = models.ForeignKey(CinemaHall, on_delete=models.CASCADE, related_name='sales')
+    date = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'cinema_hall'], name='unique_hall_sales_date_hall'),
+        ]
+
+
+class DaySales(SalesSummary):
+    date = models.DateField(unique=True)
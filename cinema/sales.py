@@ -0,0 +1,54 @@
+from django.db import connection
+from cinema.models import ShowSales, HallSales, DaySales
+
+SUMMARY_FIELDS = ('tickets_sold', 'revenue', 'number_of_seats')
+
+
+def _add_totals(model, key_fields, totals, added_fields=SUMMARY_FIELDS):
+    """
+    Add `totals`, {key: (tickets_sold, revenue, number_of_seats)}, to the `model` rows of those keys in one
+    INSERT ... ON CONFLICT DO UPDATE, and return the keys of the inserted rows.
+
+    Rows are written in key order, so concurrent purchases lock them in the same order and cannot deadlock,
+    and a racing first sale of a key waits for the other to commit instead of inserting it twice.
+    """
+    quote_name = connection.ops.quote_name
+    table = quote_name(model._meta.db_table)
+    key_columns = [quote_name(model._meta.get_field(field).column) for field in key_fields]
+    columns = key_columns + [quote_name(field) for field in SUMMARY_FIELDS]
+    row = f'({", ".join(["%s"] * len(columns))})'
+    updates = ', '.join(f'{quote_name(field)} = {table}.{quote_name(field)} + EXCLUDED.{quote_name(field)}'
+                        for field in added_fields)
+    # xmax is 0 on a row version this statement inserted, not on one it updated.
+    sql = f'INSERT INTO {table} ({", ".join(columns)}) VALUES {", ".join([row] * len(totals))} ' \
+          f'ON CONFLICT ({", ".join(key_columns)}) DO UPDATE SET {updates} ' \
+          f'RETURNING {", ".join(key_columns)}, xmax = 0'
+    keys = sorted(totals)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [value for key in keys for value in (*key, *totals[key])])
+        return {tuple(inserted_row[:-1]) for inserted_row in cursor.fetchall() if inserted_row[-1]}
+
+
+def record_sales(tickets):
+    """
+    Add confirmed tickets to the (show, date), (hall, date) and (date) sales summaries, in the purchase
+    transaction, with one statement per summary whatever the number of tickets.
+    """
+    date_field = ShowSales._meta.get_field('date')
+    shows, halls = {}, {}
+    for ticket in tickets:
+        key = (ticket.movie_show_id, date_field.to_python(ticket.date))
+        tickets_sold, revenue, number_of_seats = shows.get(key, (0, 0, 0))
+        shows[key] = (tickets_sold + ticket.number_of_ticket, revenue + ticket.get_purchase_amount(),
+                      ticket.movie_show.cinema_hall.number_of_seats)
+        halls[key] = ticket.movie_show.cinema_hall_id
+
+    # The seats of a show count once, when its first ticket of the day is sold.
+    inserted = _add_totals(ShowSales, ('movie_show', 'date'), shows, added_fields=('tickets_sold', 'revenue'))
+    hall_totals, day_totals = {}, {}
+    for key, (tickets_sold, revenue, number_of_seats) in shows.items():
+        values = (tickets_sold, revenue, number_of_seats if key in inserted else 0)
+        for totals, total_key in ((hall_totals, (halls[key], key[1])), (day_totals, (key[1], ))):
+            totals[total_key] = tuple(map(sum, zip(totals.get(total_key, (0, 0, 0)), values)))
+    _add_totals(HallSales, ('cinema_hall', 'date'), hall_totals)
+    _add_totals(DaySales, ('date', ), day_totals)
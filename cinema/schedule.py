@@ -0,0 +1,124 @@
+from contextlib import contextmanager
+from datetime import timedelta
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from cinema.models import MovieShow
+
+MINUTES_IN_DAY = 24 * 60
+
+
+def get_minute(value):
+    return value.hour * 60 + value.minute
+
+
+def get_show_intervals(start_date, finish_date, start_time, finish_time):
+    """
+    Return the (first_day, last_day, first_minute, last_minute) intervals a show occupies, bounds included.
+
+    A show that runs past midnight is split in two, the part after midnight falls on the days after
+    the ones the show starts on.
+    """
+    first_day, last_day = start_date.toordinal(), finish_date.toordinal()
+    start_minute, finish_minute = get_minute(start_time), get_minute(finish_time)
+    if start_minute <= finish_minute:
+        return [(first_day, last_day, start_minute, finish_minute)]
+    return [(first_day, last_day, start_minute, MINUTES_IN_DAY - 1),
+            (first_day + 1, last_day + 1, 0, finish_minute)]
+
+
+class IntervalTree:
+    """
+    Static interval tree: intervals are kept sorted by their low bound as an implicit balanced binary tree,
+    each node also knows the highest bound in its subtree, so a search skips every subtree that ends too early.
+    """
+
+    def __init__(self, intervals):
+        self._nodes = sorted(intervals, key=lambda interval: interval[0])
+        self._max_high = [None] * len(self._nodes)
+        self._build(0, len(self._nodes) - 1)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def _build(self, left, right):
+        if left > right:
+            return None
+        middle = (left + right) // 2
+        highs = [self._nodes[middle][1], self._build(left, middle - 1), self._build(middle + 1, right)]
+        self._max_high[middle] = max(high for high in highs if high is not None)
+        return self._max_high[middle]
+
+    def search(self, low, high):
+        """
+        Return the values of all intervals intersecting [low, high].
+        """
+        found = []
+        self._search(0, len(self._nodes) - 1, low, high, found)
+        return found
+
+    def _search(self, left, right, low, high, found):
+        if left > right:
+            return
+        middle = (left + right) // 2
+        if self._max_high[middle] < low:
+            return
+        self._search(left, middle - 1, low, high, found)
+        node_low, node_high, value = self._nodes[middle]
+        if node_low > high:
+            return
+        if node_high >= low:
+            found.append(value)
+        self._search(middle + 1, right, low, high, found)
+
+
+class HallSchedule:
+
+    def __init__(self, movie_shows):
+        self.tree = IntervalTree([
+            (first_day, last_day, (first_minute, last_minute, movie_show))
+            for movie_show in movie_shows
+            for first_day, last_day, first_minute, last_minute in get_show_intervals(
+                movie_show.start_date, movie_show.finish_date, movie_show.start_time, movie_show.finish_time)])
+
+    @staticmethod
+    def get_hall_shows(cinema_hall, since=None, exclude=None):
+        movie_shows = MovieShow.objects.filter(cinema_hall=cinema_hall)
+        if since:
+            # An overnight show reaches one day past its finish_date.
+            movie_shows = movie_shows.filter(finish_date__gte=since - timedelta(days=1))
+        if exclude:
+            movie_shows = movie_shows.exclude(id=exclude)
+        return movie_shows.only('id', 'start_date', 'finish_date', 'start_time', 'finish_time')
+
+    @classmethod
+    def for_hall(cls, cinema_hall, since=None, exclude=None):
+        return cls(cls.get_hall_shows(cinema_hall, since, exclude))
+
+    def get_conflicts(self, start_date, finish_date, start_time, finish_time):
+        conflicts = {}
+        for first_day, last_day, first_minute, last_minute in get_show_intervals(start_date, finish_date,
+                                                                                 start_time, finish_time):
+            for show_first_minute, show_last_minute, movie_show in self.tree.search(first_day, last_day):
+                if show_first_minute <= last_minute and first_minute <= show_last_minute:
+                    conflicts[movie_show.id] = movie_show
+        return list(conflicts.values())
+
+
+def get_conflicts(cinema_hall, start_date, finish_date, start_time, finish_time, exclude=None):
+    schedule = HallSchedule.for_hall(cinema_hall, since=start_date, exclude=exclude)
+    return schedule.get_conflicts(start_date, finish_date, start_time, finish_time)
+
+
+@contextmanager
+def schedule_conflict_as_validation_error():
+    """
+    Turn a violation of the `exclude_overlapping_movie_shows` constraint into the overlap ValidationError,
+    for the show that was saved concurrently with ours after both passed `get_conflicts`.
+    """
+    try:
+        with transaction.atomic():
+            yield
+    except IntegrityError as error:
+        if 'exclude_overlapping_movie_shows' not in str(error):
+            raise
+        raise ValidationError('Сеансы в одном зале не могут накладываться друг на друга')
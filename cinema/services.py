@@ -0,0 +1,158 @@
+import datetime
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from cinema.cache import invalidate_session_list, invalidate_purchases
+from cinema.models import MyUser, PurchasedTicket, SeatInventory
+from cinema.sales import record_sales
+from stanhjr_project.settings import SEAT_HOLD_TTL
+
+
+def _reserve_seats(user, movie_show, date_purchase, number_of_ticket, seats, hold_expires_at=None):
+    cinema_hall = movie_show.cinema_hall
+    if seats:
+        indexes = [cinema_hall.get_seat_index(row, seat) for row, seat in seats]
+        if len(set(indexes)) != len(indexes) or len(indexes) != number_of_ticket:
+            raise ValidationError({'seats': 'Количество выбранных мест не совпадает с количеством билетов'})
+
+    # The (show, date) inventory row is the lock every buyer of this session queues on,
+    # so the capacity check below sees all tickets committed before us.
+    inventory, created = SeatInventory.objects.select_for_update()\
+        .get_or_create(movie_show=movie_show, date=date_purchase)
+    if inventory.tickets_held:
+        expired = PurchasedTicket.objects.held().expired().filter(movie_show=movie_show, date=date_purchase)
+        inventory.release_holds(expired, cinema_hall)
+    if inventory.tickets_sold + inventory.tickets_held + number_of_ticket > cinema_hall.number_of_seats:
+        raise ValidationError('Такого количества свободных мест нет')
+
+    if not seats:
+        indexes = inventory.find_free_seats(number_of_ticket, cinema_hall.number_of_seats)
+    inventory.take_seats(indexes, cinema_hall.number_of_seats)
+
+    ticket = PurchasedTicket.objects.create(user=user, movie_show=movie_show, date=date_purchase,
+                                            number_of_ticket=number_of_ticket, hold_expires_at=hold_expires_at,
+                                            seats=[cinema_hall.get_seat(index) for index in indexes])
+    if hold_expires_at:
+        inventory.tickets_held += number_of_ticket
+    else:
+        inventory.tickets_sold += number_of_ticket
+    inventory.save(update_fields=['tickets_sold', 'tickets_held', 'seat_map'])
+    inventory.publish_availability(cinema_hall.number_of_seats)
+    return ticket
+
+
+def _charge(ticket):
+    MyUser.objects.filter(pk=ticket.user_id).update(money_spent=F('money_spent') + ticket.get_purchase_amount())
+
+
+def _lock_hold(ticket):
+    inventory = SeatInventory.objects.select_for_update().get(movie_show=ticket.movie_show_id, date=ticket.date)
+    try:
+        ticket = PurchasedTicket.objects.held().select_for_update().get(pk=ticket.pk)
+    except PurchasedTicket.DoesNotExist:
+        raise ValidationError('Бронь не найдена')
+    return inventory, ticket
+
+
+def purchase_tickets(user, movie_show, date_purchase, number_of_ticket, seats=None):
+    with transaction.atomic():
+        ticket = _reserve_seats(user, movie_show, date_purchase, number_of_ticket, seats)
+        _charge(ticket)
+        record_sales([ticket])
+    return ticket
+
+
+def hold_tickets(user, movie_show, date_purchase, number_of_ticket, seats=None):
+    hold_expires_at = timezone.now() + datetime.timedelta(seconds=SEAT_HOLD_TTL)
+    with transaction.atomic():
+        return _reserve_seats(user, movie_show, date_purchase, number_of_ticket, seats, hold_expires_at)
+
+
+def confirm_hold(ticket):
+    with transaction.atomic():
+        inventory, ticket = _lock_hold(ticket)
+        if ticket.hold_expires_at <= timezone.now():
+            inventory.release_holds([ticket], ticket.movie_show.cinema_hall)
+            expired = True
+        else:
+            expired = False
+            ticket.hold_expires_at = None
+            ticket.save(update_fields=['hold_expires_at'])
+            inventory.tickets_held -= ticket.number_of_ticket
+            inventory.tickets_sold += ticket.number_of_ticket
+            inventory.save(update_fields=['tickets_sold', 'tickets_held'])
+            _charge(ticket)
+            record_sales([ticket])
+    if expired:
+        raise ValidationError('Время брони истекло')
+    return ticket
+
+
+def release_hold(ticket):
+    with transaction.atomic():
+        inventory, ticket = _lock_hold(ticket)
+        inventory.release_holds([ticket], ticket.movie_show.cinema_hall)
+
+
+def purchase_tickets_bulk(user, items):
+    """
+    Buy tickets for several (movie_show, date, number_of_ticket) items in one transaction, all or nothing.
+    """
+    wanted = {}
+    for movie_show, date_purchase, number_of_ticket in items:
+        key = (movie_show.id, date_purchase)
+        wanted[key] = wanted.get(key, 0) + number_of_ticket
+
+    with transaction.atomic():
+        # Every buyer inserts and locks inventory rows in (movie_show, date) order, so overlapping baskets
+        # cannot deadlock, on the locks or on the unique index entries of rows inserted and not committed yet.
+        SeatInventory.objects.bulk_create([SeatInventory(movie_show_id=movie_show_id, date=date_purchase)
+                                           for movie_show_id, date_purchase in sorted(wanted)],
+                                          ignore_conflicts=True)
+        condition = Q()
+        for movie_show_id, date_purchase in wanted:
+            condition |= Q(movie_show_id=movie_show_id, date=date_purchase)
+        inventories = {(inventory.movie_show_id, inventory.date): inventory for inventory in
+                       SeatInventory.objects.select_for_update(of=('self',)).select_related('movie_show__cinema_hall')
+                       .filter(condition).order_by('movie_show_id', 'date')}
+
+        for key, number_of_ticket in wanted.items():
+            inventory = inventories[key]
+            cinema_hall = inventory.movie_show.cinema_hall
+            if inventory.tickets_held:
+                expired = PurchasedTicket.objects.held().expired().filter(movie_show=key[0], date=key[1])
+                inventory.release_holds(expired, cinema_hall)
+            if inventory.tickets_sold + inventory.tickets_held + number_of_ticket > cinema_hall.number_of_seats:
+                raise ValidationError({'items': f'Такого количества свободных мест нет: '
+                                                f'{inventory.movie_show.movie_name}, {key[1]}'})
+
+        tickets = []
+        for movie_show, date_purchase, number_of_ticket in items:
+            inventory = inventories[(movie_show.id, date_purchase)]
+            cinema_hall = inventory.movie_show.cinema_hall
+            indexes = inventory.find_free_seats(number_of_ticket, cinema_hall.number_of_seats)
+            inventory.take_seats(indexes, cinema_hall.number_of_seats)
+            inventory.tickets_sold += number_of_ticket
+            ticket = PurchasedTicket(user=user, movie_show=inventory.movie_show, date=date_purchase,
+                                     number_of_ticket=number_of_ticket,
+                                     seats=[cinema_hall.get_seat(index) for index in indexes])
+            ticket.set_price()
+            tickets.append(ticket)
+
+        PurchasedTicket.objects.bulk_create(tickets)
+        # bulk_create sends no post_save.
+        transaction.on_commit(invalidate_session_list)
+        transaction.on_commit(lambda: invalidate_purchases(user.pk))
+        SeatInventory.objects.bulk_update(inventories.values(), ['tickets_sold', 'seat_map'])
+        for inventory in inventories.values():
+            inventory.publish_availability(inventory.movie_show.cinema_hall.number_of_seats)
+        MyUser.objects.filter(pk=user.pk).update(
+            money_spent=F('money_spent') + sum(ticket.get_purchase_amount() for ticket in tickets))
+        record_sales(tickets)
+    return tickets
+
+
+def release_expired_holds():
+    expired = PurchasedTicket.objects.held().expired().values_list('movie_show', 'date').distinct().order_by()
+    return sum(SeatInventory.release_expired_holds(movie_show_id, date_show) for movie_show_id, date_show in expired)
@@ -0,0 +1,84 @@
+from django.contrib.sessions.backends.cache import SessionStore as CacheStore
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from stanhjr_project.settings import SESSION_DB_WRITE_BEHIND
+
+
+class SessionStore(CacheStore):
+    """
+    Sessions kept in the SESSION_CACHE_ALIAS cache, which expires them, so no `clearsessions` sweep is needed.
+
+    With SESSION_DB_WRITE_BEHIND seconds set, a session is also copied to django_session, at most once per that
+    many seconds, and read from there when the cache has lost it. A save inside that window is marked pending and
+    copied by the first load or save of the session after the window, so the copy misses the saves of the last
+    window at most, and of a session not used since then.
+    """
+    cache_key_prefix = 'cinema.sessions.'
+
+    def get_persisted_key(self, session_key):
+        return f'{self.cache_key_prefix}{session_key}:persisted'
+
+    def get_pending_key(self, session_key):
+        return f'{self.cache_key_prefix}{session_key}:pending'
+
+    def load(self):
+        persisted_key, pending_key = self.get_persisted_key(self.session_key), self.get_pending_key(self.session_key)
+        try:
+            values = self._cache.get_many([self.cache_key, persisted_key, pending_key] if SESSION_DB_WRITE_BEHIND
+                                          else [self.cache_key])
+        except Exception:
+            values = {}
+        data = values.get(self.cache_key)
+        if data is not None and pending_key in values and persisted_key not in values:
+            self.persist_pending(data)
+        if data is None and SESSION_DB_WRITE_BEHIND:
+            session = DBStore(self.session_key)._get_session_from_db()
+            if session:
+                data = self.decode(session.session_data)
+                self._cache.set(self.cache_key, data, self.get_expiry_age(expiry=session.expire_date))
+        if data is None:
+            self._session_key = None
+            return {}
+        return data
+
+    def exists(self, session_key):
+        if super().exists(session_key):
+            return True
+        return bool(SESSION_DB_WRITE_BEHIND) and DBStore().exists(session_key)
+
+    def save(self, must_create=False):
+        super().save(must_create)
+        # Not the empty session `create` saves first, the next save carries its data.
+        if SESSION_DB_WRITE_BEHIND and not must_create and not self.persist_pending(self._get_session(no_load=True)):
+            self._cache.set(self.get_pending_key(self.session_key), True, self.get_expiry_age())
+
+    def persist_pending(self, data):
+        """
+        Copy `data` to django_session unless a copy was made inside the last SESSION_DB_WRITE_BEHIND seconds.
+        """
+        if not self._cache.add(self.get_persisted_key(self.session_key), True, SESSION_DB_WRITE_BEHIND):
+            return False
+        # Cleared before the copy, a save racing with it marks the session pending again.
+        self._cache.delete(self.get_pending_key(self.session_key))
+        self.persist(data)
+        return True
+
+    def persist(self, data):
+        db_store = DBStore(self.session_key)
+        db_store._session_cache = data
+        # Update or insert, the copy may not be there yet.
+        db_store.create_model_instance(data).save()
+
+    def delete(self, session_key=None):
+        session_key = session_key or self.session_key
+        if session_key is None:
+            return
+        super().delete(session_key)
+        if SESSION_DB_WRITE_BEHIND:
+            self._cache.delete_many([self.get_persisted_key(session_key), self.get_pending_key(session_key)])
+            DBStore().delete(session_key)
+
+    @classmethod
+    def clear_expired(cls):
+        # The cache expires its entries itself, only the copies need a sweep.
+        if SESSION_DB_WRITE_BEHIND:
+            DBStore.clear_expired()
@@ -0,0 +1,67 @@
+from datetime import date
+from django.db.backends.postgresql.psycopg_any import DateRange, NumericRange
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from cinema.api.authentication import token_cache
+from cinema.cache import invalidate_session_list, invalidate_purchases
+from cinema.models import CinemaHall, MovieShow, PurchasedTicket, MyUser, TokenExpired, ScheduleSlot
+from cinema.schedule import get_show_intervals
+
+
+@receiver(post_save, sender=MovieShow)
+def sync_schedule_slots(sender, instance, **kwargs):
+    """
+    Keep the slots behind the `exclude_overlapping_movie_shows` constraint in line with the show times.
+    """
+    start_time, finish_time, start_date, finish_date = (
+        sender._meta.get_field(name).to_python(getattr(instance, name))
+        for name in ('start_time', 'finish_time', 'start_date', 'finish_date'))
+    instance.schedule_slots.all().delete()
+    ScheduleSlot.objects.bulk_create([
+        ScheduleSlot(movie_show=instance, cinema_hall_id=instance.cinema_hall_id,
+                     dates=DateRange(date.fromordinal(first_day), date.fromordinal(last_day), '[]'),
+                     minutes=NumericRange(first_minute, last_minute, '[]'))
+        for first_day, last_day, first_minute, last_minute in get_show_intervals(
+            start_date, finish_date, start_time, finish_time)])
+
+
+@receiver(pre_save, sender=PurchasedTicket)
+def set_ticket_price(sender, instance, **kwargs):
+    if instance.ticket_price is None:
+        instance.set_price()
+
+
+@receiver(post_save, sender=MovieShow)
+def sync_screenings(sender, instance, **kwargs):
+    instance.sync_screenings()
+
+
+@receiver(post_save, sender=MovieShow)
+@receiver(post_delete, sender=MovieShow)
+@receiver(post_save, sender=CinemaHall)
+@receiver(post_delete, sender=CinemaHall)
+@receiver(post_save, sender=PurchasedTicket)
+@receiver(post_delete, sender=PurchasedTicket)
+def expire_session_list(sender, **kwargs):
+    # After commit, so a list read meanwhile is cached under the old version only.
+    transaction.on_commit(invalidate_session_list)
+
+
+@receiver(post_save, sender=PurchasedTicket)
+@receiver(post_delete, sender=PurchasedTicket)
+def expire_purchases(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_purchases(instance.user_id))
+
+
+@receiver(post_save, sender=TokenExpired)
+@receiver(post_delete, sender=TokenExpired)
+def expire_cached_token(sender, instance, **kwargs):
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=MyUser)
+@receiver(post_delete, sender=MyUser)
+def expire_cached_user_tokens(sender, instance, **kwargs):
+    # A deactivated or demoted user loses the cached session right away.
+    token_cache.delete_user(instance.pk)
@@ -7,5 +7,7 @@ register = template.Library()
 
 @register.simple_tag
 def call_method_get_tickets_count(obj, method_name, date_today):
+    if hasattr(obj, 'free_seats'):
+        return obj.free_seats
     method = getattr(obj, method_name)
     return method(date_today)
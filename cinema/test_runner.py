@@ -0,0 +1,28 @@
+import tempfile
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TemporaryCacheRunner(DiscoverRunner):
+    """
+    Run the tests with every file or redis cache moved to a file cache in a temporary directory, so a test run
+    neither reads nor clears the caches of the running site, its sessions included.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_dir = tempfile.TemporaryDirectory(prefix='cinema-test-cache-')
+        caches = {}
+        for alias, cache in settings.CACHES.items():
+            if cache['BACKEND'].endswith(('FileBasedCache', 'RedisCache')):
+                cache = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                         'LOCATION': f'{self.cache_dir.name}/{alias}'}
+            caches[alias] = cache
+        self.cache_settings = override_settings(CACHES=caches)
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        self.cache_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
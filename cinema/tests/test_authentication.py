@@ -0,0 +1,186 @@
+from datetime import timedelta
+from unittest import mock
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from freezegun import freeze_time
+from rest_framework import exceptions
+from rest_framework.test import APIRequestFactory
+from cinema.api import authentication
+from cinema.api.authentication import TokenExpiredAuth, TokenTouchBuffer, TokenCache, token_cache
+from cinema.models import MyUser, TokenExpired
+
+
+class TokenTouchTestCase(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = MyUser.objects.create_user(username='alice', password='1')
+        self.token = TokenExpired.objects.create(user=self.user, last_action=timezone.now())
+        self.factory = APIRequestFactory()
+
+    def authenticate(self):
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        request = self.factory.get('/api/purchased/', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        with connection.execute_wrapper(count):
+            TokenExpiredAuth().authenticate(request)
+        return [sql for sql in queries if sql.startswith('UPDATE')]
+
+    def get_last_action(self):
+        return TokenExpired.objects.get(pk=self.token.pk).last_action
+
+    def test_touch_within_granularity(self):
+        last_action = self.get_last_action()
+        with freeze_time(last_action + timedelta(seconds=authentication.TOKEN_TOUCH_GRANULARITY - 1)):
+            self.assertEqual(self.authenticate(), [])
+        self.assertEqual(self.get_last_action(), last_action)
+
+    def test_touch_after_granularity(self):
+        moment = self.get_last_action() + timedelta(seconds=authentication.TOKEN_TOUCH_GRANULARITY)
+        with freeze_time(moment):
+            updates = self.authenticate()
+        self.assertEqual(len(updates), 1)
+        self.assertIn('cinema_tokenexpired', updates[0])
+        self.assertEqual(self.get_last_action(), moment)
+
+    def test_session_expired(self):
+        last_action = self.get_last_action()
+        # Past a day as well, where timedelta.seconds wraps around.
+        for idle in (authentication.SESSION_COOKIE_AGE + 1, 60 * 60 * 24 + 1):
+            with self.subTest(idle=idle), freeze_time(last_action + timedelta(seconds=idle)):
+                with self.assertRaisesMessage(exceptions.AuthenticationFailed, 'User session time to dead!'):
+                    self.authenticate()
+
+    def test_buffered_touch(self):
+        other_token = TokenExpired.objects.create(user=MyUser.objects.create_user(username='bob', password='1'),
+                                                  last_action=self.token.last_action)
+        started = self.get_last_action()
+        with mock.patch.object(authentication, 'TOKEN_TOUCH_BUFFER', True), \
+                mock.patch.object(authentication, 'touch_buffer', TokenTouchBuffer()):
+            with freeze_time(started + timedelta(seconds=30)):
+                self.assertEqual(self.authenticate(), [])
+                self.token, other_token = other_token, self.token
+                self.assertEqual(self.authenticate(), [])
+            self.assertEqual(self.get_last_action(), started)
+            flushed_at = started + timedelta(seconds=authentication.SESSION_COOKIE_AGE + 20)
+            with freeze_time(started + timedelta(seconds=30 + authentication.TOKEN_TOUCH_GRANULARITY - 1)):
+                self.assertEqual(self.authenticate(), [])
+            # The buffered touch keeps the session alive before it reaches the database.
+            with freeze_time(flushed_at):
+                self.token, other_token = other_token, self.token
+                self.assertEqual(len(self.authenticate()), 1)
+        self.assertEqual(TokenExpired.objects.get(pk=self.token.pk).last_action, flushed_at)
+        self.assertEqual(TokenExpired.objects.get(pk=other_token.pk).last_action,
+                         started + timedelta(seconds=30 + authentication.TOKEN_TOUCH_GRANULARITY - 1))
+
+    def test_buffered_touch_never_moves_back(self):
+        touch_buffer = TokenTouchBuffer()
+        started = self.get_last_action()
+        later = started + timedelta(minutes=1)
+        touch_buffer.touch(self.token.key, started)
+        TokenExpired.objects.filter(pk=self.token.pk).update(last_action=later)
+        touches = touch_buffer.touch(self.token.key,
+                                     started + timedelta(seconds=authentication.TOKEN_TOUCH_GRANULARITY))
+        TokenExpired.objects.bulk_update(touches, ['last_action'])
+        self.assertEqual(self.get_last_action(), later)
+
+    async def test_async_touch(self):
+        token = await TokenExpired.objects.aget(pk=self.token.pk)
+        request = self.factory.get('/api/async/purchased/', HTTP_AUTHORIZATION=f'Token {token.key}')
+        with freeze_time(token.last_action + timedelta(seconds=1)):
+            await TokenExpiredAuth().aauthenticate(request)
+        self.assertEqual((await TokenExpired.objects.aget(pk=token.pk)).last_action, token.last_action)
+        moment = token.last_action + timedelta(seconds=authentication.TOKEN_TOUCH_GRANULARITY)
+        with freeze_time(moment):
+            await TokenExpiredAuth().aauthenticate(request)
+        self.assertEqual((await TokenExpired.objects.aget(pk=token.pk)).last_action, moment)
+
+
+class TokenCacheTestCase(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = MyUser.objects.create_user(username='alice', password='1')
+        self.token = TokenExpired.objects.create(user=self.user, last_action=timezone.now())
+        self.factory = APIRequestFactory()
+
+    def authenticate(self, token=None):
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        request = self.factory.get('/api/purchased/', HTTP_AUTHORIZATION=f'Token {(token or self.token).key}')
+        with connection.execute_wrapper(count):
+            user, token = TokenExpiredAuth().authenticate(request)
+        return user, queries
+
+    def test_cached(self):
+        user, queries = self.authenticate()
+        self.assertEqual(len(queries), 1)
+        cached_user, queries = self.authenticate()
+        self.assertEqual(queries, [])
+        self.assertEqual(cached_user, user)
+        self.assertIsNot(cached_user, user)
+
+    def test_ttl(self):
+        self.authenticate()
+        with freeze_time(timezone.now() + timedelta(seconds=authentication.TOKEN_CACHE_TTL)):
+            TokenExpired.objects.filter(pk=self.token.pk).update(last_action=timezone.now())
+            user, queries = self.authenticate()
+        self.assertEqual(len(queries), 1)
+
+    def test_logout(self):
+        self.authenticate()
+        response = self.client.delete('/api/logout/', headers={'authorization': f'Token {self.token.key}'})
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(TokenExpired.objects.exists())
+        with self.assertRaisesMessage(exceptions.AuthenticationFailed, 'Invalid token.'):
+            self.authenticate()
+
+    def test_deactivated(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaisesMessage(exceptions.AuthenticationFailed, 'User inactive or deleted.'):
+            self.authenticate()
+
+    def test_expired_in_cache_checked_in_database(self):
+        self.authenticate()
+        moment = self.token.last_action + timedelta(seconds=authentication.SESSION_COOKIE_AGE + 1)
+        # Touched by another process, which leaves this cache alone.
+        TokenExpired.objects.filter(pk=self.token.pk).update(last_action=moment)
+        with freeze_time(moment):
+            user, queries = self.authenticate()
+        self.assertEqual(len(queries), 1)
+        with freeze_time(moment + timedelta(seconds=authentication.SESSION_COOKIE_AGE + 1)):
+            with self.assertRaisesMessage(exceptions.AuthenticationFailed, 'User session time to dead!'):
+                self.authenticate()
+
+    def test_lru(self):
+        cache = TokenCache(maxsize=2, ttl=60)
+        tokens = [self.token] + [
+            TokenExpired.objects.create(user=MyUser.objects.create_user(username=f'user{number}', password='1'),
+                                        last_action=timezone.now()) for number in range(2)]
+        cache.set(tokens[0].key, tokens[0].user, tokens[0])
+        cache.set(tokens[1].key, tokens[1].user, tokens[1])
+        cache.get(tokens[0].key)
+        cache.set(tokens[2].key, tokens[2].user, tokens[2])
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(tokens[1].key))
+        self.assertIsNotNone(cache.get(tokens[0].key))
+
+    async def test_async_cached(self):
+        token = await TokenExpired.objects.aget(pk=self.token.pk)
+        request = self.factory.get('/api/async/purchased/', HTTP_AUTHORIZATION=f'Token {token.key}')
+        user, token = await TokenExpiredAuth().aauthenticate(request)
+        with mock.patch.object(TokenExpired.objects, 'select_related') as select_related:
+            cached_user, cached_token = await TokenExpiredAuth().aauthenticate(request)
+        select_related.assert_not_called()
+        self.assertEqual(cached_user, user)
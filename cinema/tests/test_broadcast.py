@@ -0,0 +1,36 @@
+import asyncio
+from django.test import SimpleTestCase
+from cinema.broadcast import Broadcaster
+
+
+class BroadcasterTestCase(SimpleTestCase):
+
+    async def test_publish_fan_out(self):
+        broadcaster = Broadcaster()
+        queues = [broadcaster.subscribe() for _ in range(3)]
+        broadcaster.publish({'movie_show': 1})
+        for queue in queues:
+            self.assertEqual(await asyncio.wait_for(queue.get(), 1), {'movie_show': 1})
+
+    async def test_unsubscribe(self):
+        broadcaster = Broadcaster()
+        queue = broadcaster.subscribe()
+        broadcaster.unsubscribe(queue)
+        broadcaster.publish({'movie_show': 1})
+        await asyncio.sleep(0)
+        self.assertEqual(len(broadcaster), 0)
+        self.assertTrue(queue.empty())
+
+    async def test_slow_subscriber_drops_oldest(self):
+        broadcaster = Broadcaster(maxsize=2)
+        queue = broadcaster.subscribe()
+        for free_seats in range(3):
+            broadcaster.publish({'free_seats': free_seats})
+        await asyncio.sleep(0)
+        self.assertEqual([queue.get_nowait(), queue.get_nowait()], [{'free_seats': 1}, {'free_seats': 2}])
+
+    async def test_publish_from_thread(self):
+        broadcaster = Broadcaster()
+        queue = broadcaster.subscribe()
+        await asyncio.to_thread(broadcaster.publish, {'movie_show': 1})
+        self.assertEqual(await asyncio.wait_for(queue.get(), 1), {'movie_show': 1})
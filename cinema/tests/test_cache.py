@@ -0,0 +1,179 @@
+from datetime import date
+from django.conf import settings
+from unittest.mock import patch
+from django.test import TestCase, override_settings
+from freezegun import freeze_time
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, APITestCase, force_authenticate
+from cinema.api.resources import MovieShowViewSet, SessionCacheStats
+from cinema.api.serializers import ValuesSerializer
+from cinema.cache import get_api_cache, get_session_list_key, get_session_list_stats, reset_session_list_stats
+from cinema.models import CinemaHall, MovieShow, MyUser
+from cinema.services import purchase_tickets, purchase_tickets_bulk
+
+
+@freeze_time('2022-01-23')
+class SessionListCacheTestCase(TestCase):
+    fixtures = ['initial_data.json', ]
+
+    def setUp(self):
+        get_api_cache().clear()
+        reset_session_list_stats()
+        self.factory = APIRequestFactory()
+        self.user = MyUser.objects.create_user(username='alice', password='1')
+
+    def get_list(self, data=None):
+        response = MovieShowViewSet.as_view({'get': 'list'})(self.factory.get('/api/session/', data))
+        response.render()
+        return response
+
+    def get_free_seats(self, data=None):
+        return {row['id']: row['free_seats'] for row in self.get_list(data).data['results']}
+
+    def test_hit(self):
+        first = self.get_list()
+        with self.assertNumQueries(0):
+            second = self.get_list()
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(get_session_list_stats()['hits'], 1)
+        self.assertEqual(get_session_list_stats()['misses'], 1)
+
+    def test_key_normalized(self):
+        self.assertEqual(get_session_list_key({}), get_session_list_key({'start_time': '00:00:00', 'page': '2'}))
+        self.assertEqual(get_session_list_key({'show_day': 'today'}),
+                         get_session_list_key({'show_day': 'today', 'hall_id': '1', 'start_time': '08:00'}))
+        self.assertEqual(get_session_list_key({'show_day': 'yesterday'}), get_session_list_key({}))
+        self.assertNotEqual(get_session_list_key({}), get_session_list_key({'show_day': 'today'}))
+        self.assertNotEqual(get_session_list_key({}), get_session_list_key({'hall_id': '1'}))
+        with freeze_time('2022-01-24'):
+            self.assertNotEqual(get_session_list_key({}), get_session_list_key({'show_day': 'tomorrow'}))
+
+    def test_invalid_params_not_cached(self):
+        data = {'start_time': '11:00', 'finish_time': '08:00'}
+        self.assertEqual(self.get_list(data).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIsNone(get_api_cache().get(get_session_list_key(data)))
+
+    def test_purchase_invalidates(self):
+        self.assertEqual(self.get_free_seats({'show_day': 'tomorrow'}), {1: 100, 2: 100})
+        with self.captureOnCommitCallbacks(execute=True):
+            purchase_tickets(self.user, MovieShow.objects.get(id=2), '2022-01-24', 3)
+        self.assertEqual(self.get_free_seats({'show_day': 'tomorrow'}), {1: 100, 2: 97})
+
+    def test_bulk_purchase_invalidates(self):
+        self.get_list({'show_day': 'tomorrow'})
+        with self.captureOnCommitCallbacks(execute=True):
+            purchase_tickets_bulk(self.user, [(MovieShow.objects.get(id=1), date(2022, 1, 24), 2)])
+        self.assertEqual(self.get_free_seats({'show_day': 'tomorrow'}), {1: 98, 2: 100})
+
+    def test_hall_update_invalidates(self):
+        self.assertEqual(self.get_free_seats({'show_day': 'tomorrow'})[2], 100)
+        with self.captureOnCommitCallbacks(execute=True):
+            cinema_hall = CinemaHall.objects.get(movie_show=2)
+            cinema_hall.number_of_seats = 150
+            cinema_hall.save()
+        self.assertEqual(self.get_free_seats({'show_day': 'tomorrow'})[2], 150)
+
+    def test_movie_show_update_invalidates(self):
+        self.get_list()
+        with self.captureOnCommitCallbacks(execute=True):
+            movie_show = MovieShow.objects.get(id=1)
+            movie_show.movie_name = 'Renamed'
+            movie_show.save()
+        self.assertIn('Renamed', [row['movie_name'] for row in self.get_list().data['results']])
+
+    def test_no_invalidation_before_commit(self):
+        self.get_list({'show_day': 'tomorrow'})
+        with self.captureOnCommitCallbacks() as callbacks:
+            purchase_tickets(self.user, MovieShow.objects.get(id=2), '2022-01-24', 3)
+            self.assertEqual(self.get_free_seats({'show_day': 'tomorrow'}), {1: 100, 2: 100})
+        self.assertTrue(callbacks)
+
+    def test_stats_admin_only(self):
+        request = self.factory.get('/api/session_cache_stats/')
+        force_authenticate(request, user=self.user)
+        self.assertEqual(SessionCacheStats.as_view()(request).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.get_list()
+        self.get_list()
+        request = self.factory.get('/api/session_cache_stats/')
+        force_authenticate(request, user=MyUser.objects.get(username='stan'))
+        response = SessionCacheStats.as_view()(request)
+        self.assertEqual((response.data['hits'], response.data['misses']), (1, 1))
+
+        request = self.factory.delete('/api/session_cache_stats/')
+        force_authenticate(request, user=MyUser.objects.get(username='stan'))
+        SessionCacheStats.as_view()(request)
+        self.assertEqual(get_session_list_stats()['hits'], 0)
+
+
+@freeze_time('2022-01-23')
+class ConditionalGetTestCase(APITestCase):
+    fixtures = ['initial_data.json', ]
+
+    def setUp(self):
+        get_api_cache().clear()
+        self.superuser = MyUser.objects.get(username='stan')
+        self.user = MyUser.objects.create_user(username='alice', password='1')
+
+    def test_session_list_not_modified(self):
+        response = self.client.get('/api/session/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0), patch.object(ValuesSerializer, 'serialize') as serialize:
+            response = self.client.get('/api/session/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        serialize.assert_not_called()
+
+    def test_session_list_if_modified_since(self):
+        response = self.client.get('/api/session/')
+        response = self.client.get('/api/session/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_session_list_etag_per_params(self):
+        etag = self.client.get('/api/session/')['ETag']
+        response = self.client.get('/api/session/', {'show_day': 'tomorrow'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_session_list_modified_by_purchase(self):
+        etag = self.client.get('/api/session/', {'show_day': 'tomorrow'})['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            purchase_tickets(self.user, MovieShow.objects.get(id=2), '2022-01-24', 3)
+        response = self.client.get('/api/session/', {'show_day': 'tomorrow'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_purchases_not_modified(self):
+        self.client.force_authenticate(self.superuser)
+        etag = self.client.get('/api/purchased/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            purchase_tickets(self.user, MovieShow.objects.get(id=2), '2022-01-24', 3)
+        with patch.object(ValuesSerializer, 'serialize') as serialize:
+            response = self.client.get('/api/purchased/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        serialize.assert_not_called()
+
+    def test_purchases_modified_by_own_purchase(self):
+        self.client.force_authenticate(self.superuser)
+        etag = self.client.get('/api/purchased/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            purchase_tickets(self.superuser, MovieShow.objects.get(id=2), '2022-01-24', 3)
+        response = self.client.get('/api/purchased/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(CACHES={**settings.CACHES,
+                               'api': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_no_validators_without_shared_cache(self):
+        self.client.force_authenticate(self.superuser)
+        for path in ['/api/session/', '/api/purchased/']:
+            response = self.client.get(path)
+            self.assertFalse(response.has_header('ETag'))
+            self.assertFalse(response.has_header('Last-Modified'))
+            response = self.client.get(path, HTTP_IF_NONE_MATCH='*',
+                                       HTTP_IF_MODIFIED_SINCE='Sun, 23 Jan 2022 00:00:00 GMT')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_purchases_etag_per_user(self):
+        self.client.force_authenticate(self.superuser)
+        etag = self.client.get('/api/purchased/')['ETag']
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/purchased/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -0,0 +1,199 @@
+from datetime import date
+from io import StringIO
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from freezegun import freeze_time
+from cinema.models import SeatInventory, PurchasedTicket, MovieShow, MyUser, IdempotencyKey, ShowSales, HallSales, \
+    DaySales
+from cinema.services import hold_tickets, purchase_tickets
+
+
+class RebuildSeatInventoryTestCase(TestCase):
+    fixtures = ['initial_data.json', ]
+
+    def test_check_consistent(self):
+        out = StringIO()
+        call_command('rebuild_seat_inventory', '--check', stdout=out)
+        self.assertIn('Seat inventory is consistent', out.getvalue())
+
+    def test_check_drift(self):
+        SeatInventory.objects.filter(movie_show=1, date='2022-01-22').update(tickets_sold=1)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_seat_inventory', '--check', stdout=StringIO())
+        self.assertEqual(SeatInventory.objects.get(movie_show=1, date='2022-01-22').tickets_sold, 1)
+
+    def test_check_seat_map_drift(self):
+        SeatInventory.objects.filter(movie_show=1, date='2022-01-22').update(seat_map=b'\x0f')
+        with self.assertRaises(CommandError):
+            call_command('rebuild_seat_inventory', '--check', stdout=StringIO())
+        call_command('rebuild_seat_inventory', stdout=StringIO())
+        self.assertEqual(SeatInventory.objects.get(movie_show=1, date='2022-01-22').get_taken_seats(), 0x1f)
+
+    def test_rebuild(self):
+        SeatInventory.objects.filter(movie_show=1, date='2022-01-22').update(tickets_sold=1)
+        PurchasedTicket.objects.create(date='2022-01-23', number_of_ticket=4,
+                                       movie_show=MovieShow.objects.get(id=2), user=MyUser.objects.get(id=1))
+        call_command('rebuild_seat_inventory', stdout=StringIO())
+        self.assertEqual(SeatInventory.objects.get(movie_show=1, date='2022-01-22').tickets_sold, 5)
+        self.assertEqual(SeatInventory.objects.get(movie_show=2, date='2022-01-23').tickets_sold, 4)
+        call_command('rebuild_seat_inventory', '--check', stdout=StringIO())
+
+    def test_check_locks_nothing(self):
+        SeatInventory.objects.filter(movie_show=1, date='2022-01-22').update(tickets_sold=1)
+        with CaptureQueriesContext(connection) as queries, self.assertRaises(CommandError):
+            call_command('rebuild_seat_inventory', '--check', stdout=StringIO())
+        self.assertFalse([query for query in queries if 'FOR UPDATE' in query['sql']])
+
+    def test_rebuild_locks_drifted_rows(self):
+        SeatInventory.objects.filter(movie_show=1, date='2022-01-22').update(tickets_sold=1)
+        PurchasedTicket.objects.create(date='2022-01-23', number_of_ticket=4,
+                                       movie_show=MovieShow.objects.get(id=2), user=MyUser.objects.get(id=1))
+        with CaptureQueriesContext(connection) as queries:
+            call_command('rebuild_seat_inventory', stdout=StringIO())
+        locks = [query['sql'] for query in queries if 'FOR UPDATE' in query['sql']]
+        self.assertEqual(len(locks), 2)
+        self.assertIn("'2022-01-22'", locks[0])
+        self.assertIn("'2022-01-23'", locks[1])
+
+
+@freeze_time('2022-01-22 07:00')
+class RebuildSalesTestCase(TestCase):
+    fixtures = ['initial_data.json', ]
+
+    def test_check_drift(self):
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_sales', '--check', stdout=out)
+        self.assertIn('ShowSales 1, 2022-01-22: summary (0, 0, 0), purchased (5, 250, 100)', out.getvalue())
+        self.assertFalse(ShowSales.objects.exists())
+
+    def test_rebuild(self):
+        movie_show = MovieShow.objects.select_related('cinema_hall').get(id=2)
+        user = MyUser.objects.get(id=1)
+        purchase_tickets(user, movie_show, date(2022, 1, 24), 2)
+        hold_tickets(user, movie_show, date(2022, 1, 24), 1)
+        DaySales.objects.filter(date='2022-01-24').update(revenue=1)
+        out = StringIO()
+        call_command('rebuild_sales', '--chunk-days', '1', stdout=out)
+        self.assertIn('Sales summaries rebuilt, 4 row(s) fixed', out.getvalue())
+        self.assertEqual(HallSales.objects.get(cinema_hall=1, date='2022-01-22').tickets_sold, 5)
+        self.assertEqual(DaySales.objects.get(date='2022-01-24').revenue, 200)
+        # Purchases keep adding to the rebuilt summaries.
+        purchase_tickets(user, movie_show, date(2022, 1, 24), 1)
+        call_command('rebuild_sales', '--check', stdout=StringIO())
+
+    def test_price_change(self):
+        call_command('rebuild_sales', stdout=StringIO())
+        MovieShow.objects.filter(id=1).update(ticket_price=1000)
+        call_command('rebuild_sales', '--check', stdout=StringIO())
+        self.assertEqual(DaySales.objects.get(date='2022-01-22').revenue, 250)
+
+    def test_stale_summary(self):
+        PurchasedTicket.objects.all().delete()
+        DaySales.objects.create(date='2022-01-20', tickets_sold=1, revenue=50, number_of_seats=100)
+        call_command('rebuild_sales', stdout=StringIO())
+        self.assertFalse(DaySales.objects.exists())
+
+
+class ExportPurchasesTestCase(TestCase):
+    fixtures = ['initial_data.json', ]
+
+    def test_export(self):
+        out = StringIO()
+        call_command('export_purchases', '--date-from', '2022-01-22', '--date-to', '2022-01-22', '--hall', '1',
+                     '--chunk-size', '1', stdout=out)
+        self.assertEqual(out.getvalue().splitlines()[1], '1,2022-01-22,1,Batman,1,StanHall,1,stan,5,50,250,'
+                                                         '1-1 1-2 1-3 1-4 1-5')
+
+    def test_invalid_range(self):
+        with self.assertRaises(CommandError):
+            call_command('export_purchases', '--date-from', '2022-01-23', '--date-to', '2022-01-22',
+                         stdout=StringIO())
+
+
+class ReconcileMoneySpentTestCase(TestCase):
+    fixtures = ['initial_data.json', ]
+
+    def setUp(self):
+        self.user = MyUser.objects.create_user(username='alice', password='1')
+        PurchasedTicket.objects.create(date='2022-01-23', number_of_ticket=2,
+                                       movie_show=MovieShow.objects.get(id=2), user=self.user)
+
+    def test_report_mismatch(self):
+        out = StringIO()
+        call_command('reconcile_money_spent', '--batch-size', '1', stdout=out)
+        self.assertIn(f'user={self.user.id}: money_spent 0, purchased 200', out.getvalue())
+        self.assertIn('1 mismatch(es) found', out.getvalue())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.money_spent, 0)
+
+    def test_fix_mismatch(self):
+        MyUser.objects.filter(username='stan').update(money_spent=1)
+        out = StringIO()
+        call_command('reconcile_money_spent', '--fix', stdout=out)
+        self.assertIn('2 mismatch(es) fixed', out.getvalue())
+        self.assertEqual(MyUser.objects.get(username='stan').money_spent, 250)
+        self.assertEqual(MyUser.objects.get(username='alice').money_spent, 200)
+
+    def test_price_change(self):
+        MyUser.objects.filter(username='alice').update(money_spent=200)
+        MovieShow.objects.filter(id=2).update(ticket_price=1000)
+        out = StringIO()
+        call_command('reconcile_money_spent', stdout=out)
+        self.assertNotIn(f'user={self.user.id}', out.getvalue())
+
+
+class ReleaseExpiredHoldsTestCase(TestCase):
+    fixtures = ['initial_data.json', ]
+
+    def test_release_expired_holds(self):
+        with freeze_time('2022-01-22 07:00'):
+            hold_tickets(MyUser.objects.get(id=1), MovieShow.objects.get(id=1), '2022-01-22', 4)
+        out = StringIO()
+        with freeze_time('2022-01-22 08:00'):
+            call_command('release_expired_holds', stdout=out)
+        self.assertIn('4 held ticket(s) released', out.getvalue())
+        call_command('rebuild_seat_inventory', '--check', stdout=StringIO())
+
+
+class PurgeIdempotencyKeysTestCase(TestCase):
+    fixtures = ['initial_data.json', ]
+
+    @freeze_time('2022-01-22 10:00')
+    def test_purge(self):
+        user = MyUser.objects.get(username='stan')
+        IdempotencyKey.objects.create(user=user, key='old', request_hash='', expires_at='2022-01-22T09:00Z')
+        IdempotencyKey.objects.create(user=user, key='new', request_hash='', expires_at='2022-01-23T09:00Z')
+        out = StringIO()
+        call_command('purge_idempotency_keys', '--batch-size', '1', stdout=out)
+        self.assertIn('1 expired idempotency key(s) deleted', out.getvalue())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+
+
+class SseLoadTestTestCase(TestCase):
+
+    def test_load_test(self):
+        out = StringIO()
+        call_command('sse_load_test', '--connections', '20', stdout=out)
+        self.assertRegex(out.getvalue(), r'^20 connection\(s\): [\d.]+ KiB per idle connection, fan-out to all in')
+
+
+class BenchmarkReadEndpointsTestCase(TestCase):
+
+    def test_benchmark(self):
+        out = StringIO()
+        call_command('benchmark_read_endpoints', '--requests', '4', '--concurrency', '2', stdout=out)
+        self.assertRegex(out.getvalue(), r'^sessions: WSGI \d+ req/s, ASGI \d+ req/s\nrealtime: WSGI')
+
+
+class BenchmarkSerializersTestCase(TestCase):
+
+    def test_benchmark(self):
+        out, err = StringIO(), StringIO()
+        call_command('benchmark_serializers', '--rows', '30', '--shows', '3', stdout=out, stderr=err)
+        self.assertIn('serializer: ', out.getvalue())
+        self.assertRegex(out.getvalue(), r'values: \d+ ms, 1 quer\(ies\)')
+        self.assertEqual(err.getvalue(), '')
+        self.assertFalse(PurchasedTicket.objects.filter(user__username='benchmark-serializers').exists())
@@ -3,7 +3,6 @@ from django.test import RequestFactory
 from freezegun import freeze_time
 from django.test import TestCase
 from cinema.forms import CinemaHallCreateForm, MovieShowCreateForm, MovieShowUpdateForm, ProductBuyForm, SignUpForm
-from cinema.models import MovieShow
 
 
 class CinemaHallCreateFormTest(TestCase):
@@ -19,6 +18,12 @@ class CinemaHallCreateFormTest(TestCase):
         form = CinemaHallCreateForm(data=form_data)
         self.assertTrue(form.is_valid())
 
+    def test_create_hall_empty_rows(self):
+        form_data = {'hall_name': 'NewHall', 'number_of_seats': 10, 'number_of_rows': 6}
+        form = CinemaHallCreateForm(data=form_data)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['__all__'], ['10 мест нельзя рассадить в 6 рядов без пустых рядов'])
+
 
 @freeze_time('2022-01-22 07:30')
 class MovieShowCreateFormTest(TestCase):
@@ -232,9 +237,8 @@ class ProductBuyFormTest(TestCase):
 
     @patch('cinema.forms.messages.warning', return_value=None)
     def test_ticket_not_enough(self, warning):
-        movie_obj = MovieShow.objects.get(id=1)
-        request = self.factory.post('ticket-buy/', {'tickets_left': 1, 'movie-id': 1})
-        form = ProductBuyForm(data={"number_of_ticket": 4, "tickets_left": 1}, request=request)
+        request = self.factory.post('ticket-buy/', {'tickets_left': 100, 'movie-id': 1, 'date-buy': '2022-01-22'})
+        form = ProductBuyForm(data={"number_of_ticket": 96, "tickets_left": 100}, request=request)
         form.is_valid()
         self.assertEqual(form.errors, {'__all__': ['Такого количества свободных мест нет']})
 
@@ -1,6 +1,10 @@
-from datetime import date, time, datetime
+from datetime import date, time, datetime, timedelta
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+from django.db.backends.postgresql.psycopg_any import DateRange, NumericRange
 from django.test import TestCase
-from cinema.models import CinemaHall, MovieShow, PurchasedTicket, MyUser, TokenExpired
+from django.utils import timezone
+from cinema.models import CinemaHall, MovieShow, PurchasedTicket, MyUser, TokenExpired, SeatInventory, Screening
 from freezegun import freeze_time
 
 
@@ -47,6 +51,16 @@ class CinemaHallTestCase(TestCase):
         self.assertEqual(stan_hall.get_tickets(), purchase_obj)
         self.assertEqual(alice_hall.get_tickets(), None)
 
+    def test_cinema_hall_seat_layout(self):
+        cinema_hall = CinemaHall(hall_name='Layout', number_of_seats=10, number_of_rows=3)
+        self.assertEqual(cinema_hall.seats_in_row, 4)
+        self.assertEqual(cinema_hall.get_seat_index(1, 1), 0)
+        self.assertEqual(cinema_hall.get_seat_index(3, 2), 9)
+        self.assertEqual(cinema_hall.get_seat(9), [3, 2])
+        for row, seat in [(0, 1), (4, 1), (1, 5), (3, 3)]:
+            with self.assertRaises(ValidationError):
+                cinema_hall.get_seat_index(row, seat)
+
     def test_str_cinema_hall(self):
         stan_hall = CinemaHall.objects.get(id=1)
         hall_name = str(stan_hall)
@@ -64,11 +78,11 @@ class MovieShowTestCase(TestCase):
                                  finish_time='10:00',
                                  start_date='2022-01-22',
                                  finish_date='2022-01-30',
-                                 cinema_hall=CinemaHall.objects.get(id=1),
+                                 cinema_hall=CinemaHall.objects.get(id=2),
                                  id=6)
 
     def test_create_movie_show(self):
-        stan_hall = CinemaHall.objects.get(id=1)
+        alice_hall = CinemaHall.objects.get(id=2)
         test_movie = MovieShow.objects.get(id=6)
         self.assertEqual(test_movie.movie_name, 'TestMovie')
         self.assertEqual(test_movie.ticket_price, 50)
@@ -76,7 +90,49 @@ class MovieShowTestCase(TestCase):
         self.assertEqual(test_movie.finish_time, time.fromisoformat('10:00'))
         self.assertEqual(test_movie.start_date, date.fromisoformat('2022-01-22'))
         self.assertEqual(test_movie.finish_date, date.fromisoformat('2022-01-30'))
-        self.assertEqual(test_movie.cinema_hall, stan_hall)
+        self.assertEqual(test_movie.cinema_hall, alice_hall)
+        self.assertEqual(list(test_movie.schedule_slots.values_list('cinema_hall', 'dates', 'minutes')),
+                         [(2, DateRange(date(2022, 1, 22), date(2022, 1, 31)), NumericRange(480, 601))])
+
+    def test_create_movie_show_overlap(self):
+        with self.assertRaises(IntegrityError):
+            MovieShow.objects.create(movie_name='Overlap', start_time='09:30', finish_time='11:00',
+                                     start_date='2022-01-30', finish_date='2022-02-02',
+                                     cinema_hall=CinemaHall.objects.get(id=2))
+
+    def test_create_movie_show_overnight_overlap(self):
+        overnight = MovieShow.objects.create(movie_name='Night', start_time='23:00', finish_time='01:00',
+                                             start_date='2022-02-01', finish_date='2022-02-03',
+                                             cinema_hall=CinemaHall.objects.get(id=2))
+        self.assertEqual(list(overnight.schedule_slots.order_by('dates').values_list('dates', 'minutes')),
+                         [(DateRange(date(2022, 2, 1), date(2022, 2, 4)), NumericRange(1380, 1440)),
+                          (DateRange(date(2022, 2, 2), date(2022, 2, 5)), NumericRange(0, 61))])
+        with self.assertRaises(IntegrityError):
+            MovieShow.objects.create(movie_name='Morning', start_time='00:30', finish_time='02:00',
+                                     start_date='2022-02-04', finish_date='2022-02-04',
+                                     cinema_hall=CinemaHall.objects.get(id=2))
+
+    def test_create_movie_show_overnight_runs(self):
+        cinema_hall = CinemaHall.objects.get(id=2)
+        for movie_show_id, start_date, finish_date, start_time, finish_time in [
+                (7, '2022-02-01', '2022-02-15', '22:00', '00:30'), (8, '2022-02-16', '2022-02-28', '22:00', '00:30'),
+                (9, '2022-02-01', '2022-02-01', '00:00', '00:20'), (10, '2022-03-01', '2022-03-01', '23:30', '23:50')]:
+            MovieShow.objects.create(movie_name='Night', start_time=start_time, finish_time=finish_time,
+                                     start_date=start_date, finish_date=finish_date, cinema_hall=cinema_hall,
+                                     id=movie_show_id)
+        with self.assertRaises(IntegrityError):
+            MovieShow.objects.create(movie_name='Morning', start_time='00:00', finish_time='00:20',
+                                     start_date='2022-03-01', finish_date='2022-03-01', cinema_hall=cinema_hall,
+                                     id=11)
+
+    def test_update_movie_show_slots(self):
+        movie_show = MovieShow.objects.get(id=6)
+        movie_show.start_time, movie_show.finish_time = time(23), time(9)
+        movie_show.save()
+        self.assertEqual(movie_show.schedule_slots.count(), 2)
+        movie_show.start_time, movie_show.finish_time = time(8), time(10)
+        movie_show.save()
+        self.assertEqual(list(movie_show.schedule_slots.values_list('minutes', flat=True)), [NumericRange(480, 601)])
 
     @freeze_time('2022-01-22')
     def test_movie_get_purchased_methods(self):
@@ -92,6 +148,29 @@ class MovieShowTestCase(TestCase):
         self.assertEqual(batman_movie.get_tickets_count("2022-01-23"), 100)
 
 
+class ScreeningTestCase(TestCase):
+    fixtures = ['initial_data.json', ]
+
+    def test_screenings_created(self):
+        self.assertEqual(Screening.objects.filter(movie_show=1).count(), 9)
+        screening = Screening.objects.get(movie_show=1, date='2022-01-22')
+        self.assertEqual(screening.starts_at, timezone.make_aware(datetime(2022, 1, 22, 8)))
+        self.assertEqual(screening.ends_at, timezone.make_aware(datetime(2022, 1, 22, 10)))
+
+    def test_screenings_follow_update(self):
+        movie_show = MovieShow.objects.get(id=1)
+        movie_show.start_date = date(2022, 1, 25)
+        movie_show.finish_date = date(2022, 2, 1)
+        movie_show.start_time = time(23)
+        movie_show.finish_time = time(1)
+        movie_show.save()
+        self.assertEqual(list(movie_show.screenings.order_by('date').values_list('date', flat=True)),
+                         [date(2022, 1, 25) + timedelta(days=day) for day in range(8)])
+        screening = movie_show.screenings.get(date='2022-02-01')
+        self.assertEqual(screening.starts_at, timezone.make_aware(datetime(2022, 2, 1, 23)))
+        self.assertEqual(screening.ends_at, timezone.make_aware(datetime(2022, 2, 2, 1)))
+
+
 class PurchasedTicketTestCase(TestCase):
     fixtures = ['initial_data.json', ]
 
@@ -115,3 +194,40 @@ class PurchasedTicketTestCase(TestCase):
     def test_method_purchase_ticket(self):
         purchase_obj = PurchasedTicket.objects.get(id=1)
         self.assertEqual(purchase_obj.get_purchase_amount(), 250)
+
+    def test_price_snapshot(self):
+        purchase_obj = PurchasedTicket.objects.create(date='2022-01-23', number_of_ticket=2,
+                                                      movie_show=MovieShow.objects.get(id=2),
+                                                      user=MyUser.objects.get(id=1))
+        self.assertEqual((purchase_obj.ticket_price, purchase_obj.purchase_amount), (100, 200))
+        MovieShow.objects.filter(id=2).update(ticket_price=300)
+        purchase_obj = PurchasedTicket.objects.get(id=purchase_obj.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(purchase_obj.get_purchase_amount(), 200)
+
+
+
+class SeatInventoryTestCase(TestCase):
+    fixtures = ['initial_data.json', ]
+
+    def test_get_tickets_count_single_query(self):
+        batman_movie = MovieShow.objects.select_related('cinema_hall').get(id=1)
+        with self.assertNumQueries(1):
+            self.assertEqual(batman_movie.get_tickets_count('2022-01-22'), 95)
+
+    def test_get_tickets_count_without_inventory(self):
+        SeatInventory.objects.all().delete()
+        batman_movie = MovieShow.objects.get(id=1)
+        self.assertEqual(batman_movie.get_tickets_count('2022-01-22'), 100)
+
+    def test_seat_map(self):
+        inventory = SeatInventory(seat_map=b'')
+        inventory.take_seats([0, 2, 9], 10)
+        self.assertEqual(len(inventory.seat_map), 2)
+        self.assertTrue(inventory.is_seat_taken(9))
+        self.assertFalse(inventory.is_seat_taken(1))
+        self.assertEqual(inventory.find_free_seats(3, 10), [1, 3, 4])
+        self.assertEqual(inventory.find_free_seats(20, 10), [1, 3, 4, 5, 6, 7, 8])
+        with self.assertRaises(ValidationError):
+            inventory.take_seats([1, 2], 10)
+        self.assertFalse(inventory.is_seat_taken(1))
@@ -0,0 +1,89 @@
+from datetime import date, time
+from freezegun import freeze_time
+from rest_framework import status
+from rest_framework.test import APITestCase
+from cinema.cache import get_api_cache
+from cinema.models import CinemaHall, MovieShow, MyUser, PurchasedTicket
+
+
+@freeze_time('2022-01-23 08:00')
+class KeysetPaginationTestCase(APITestCase):
+    fixtures = ['initial_data.json', ]
+
+    def setUp(self):
+        get_api_cache().clear()
+        self.user = MyUser.objects.create_user(username='alice', password='1')
+        for number in range(7):
+            cinema_hall = CinemaHall.objects.create(hall_name=f'Hall{number}', number_of_seats=10)
+            # Two shows start at 10:00, the id breaks the tie.
+            MovieShow.objects.create(movie_name=f'Movie{number}', start_time=time(9 + number // 2 * 2),
+                                     finish_time=time(20), start_date=date(2022, 1, 23),
+                                     finish_date=date(2022, 1, 23), cinema_hall=cinema_hall)
+        self.movie_show = MovieShow.objects.get(id=1)
+        PurchasedTicket.objects.bulk_create(
+            PurchasedTicket(user=self.user, movie_show=self.movie_show, date=date(2022, 1, 23 + number % 3),
+                            ticket_price=50, purchase_amount=50)
+            for number in range(8))
+
+    def walk(self, url, link='next'):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.data['results'])
+            url = response.data[link]
+        return pages
+
+    def test_session_pages(self):
+        expected = list(MovieShow.objects.filter(screenings__date=date(2022, 1, 23))
+                        .order_by('start_time', 'id').values_list('id', flat=True))
+        pages = self.walk('/api/session/?page_size=3')
+        self.assertEqual([len(page) for page in pages], [3, 3, 3])
+        self.assertEqual([row['id'] for page in pages for row in page], expected)
+
+    def test_session_previous(self):
+        pages = self.walk('/api/session/?page_size=3')
+        response = self.client.get('/api/session/?page_size=3')
+        response = self.client.get(self.client.get(response.data['next']).data['next'])
+        self.assertIsNone(response.data['next'])
+        backwards = self.walk(response.data['previous'], link='previous')
+        self.assertEqual(backwards, pages[-2::-1])
+
+    def test_purchase_pages(self):
+        self.client.force_authenticate(self.user)
+        expected = [str(ticket_date) for ticket_date in PurchasedTicket.objects.filter(user=self.user)
+                    .order_by('-date', '-id').values_list('date', flat=True)]
+        pages = self.walk('/api/purchased/?page_size=3')
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+        self.assertEqual([row['date'] for page in pages for row in page], expected)
+
+    def test_purchase_pages_stable_on_insert(self):
+        self.client.force_authenticate(self.user)
+        expected = [str(ticket_date) for ticket_date in PurchasedTicket.objects.filter(user=self.user)
+                    .order_by('-date', '-id').values_list('date', flat=True)]
+        first = self.client.get('/api/purchased/?page_size=3')
+        # Both sort before the cursor, neither shifts the pages that follow.
+        PurchasedTicket.objects.create(user=self.user, movie_show=self.movie_show, date=date(2022, 1, 30))
+        PurchasedTicket.objects.create(user=self.user, movie_show=self.movie_show, date=date(2022, 1, 24))
+        rest = self.walk(first.data['next'])
+        self.assertEqual([row['date'] for page in rest for row in page], expected[3:])
+
+    def test_page_size_capped(self):
+        response = self.client.get('/api/session/?page_size=1000')
+        self.assertEqual(len(response.data['results']), 9)
+        response = self.client.get('/api/session/?page_size=abc')
+        self.assertEqual(len(response.data['results']), 9)
+
+    def test_invalid_cursor(self):
+        for cursor in ('abc', 'W1siYSJdLCBmYWxzZV0=', 'W1siMTA6MDA6MDAiLCAiYSJdLCBmYWxzZV0='):
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/session/', {'cursor': cursor})
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_async_pages(self):
+        response = await self.async_client.get('/api/async/session/?page_size=4')
+        sync_response = await self.async_client.get('/api/async/session/?page_size=4')
+        self.assertEqual(response.json(), sync_response.json())
+        next_page = await self.async_client.get(response.json()['next'])
+        self.assertEqual(len(next_page.json()['results']), 4)
+        self.assertTrue(next_page.json()['next'].startswith('/api/async/session/?'))
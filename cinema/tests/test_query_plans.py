@@ -0,0 +1,106 @@
+from datetime import date, time, timedelta
+from django.db import connection
+from django.test import TestCase, RequestFactory
+from django.utils import timezone
+from freezegun import freeze_time
+from rest_framework.test import APIRequestFactory
+from cinema.api.pagination import SessionPagination, PurchasePagination
+from cinema.api.resources import MovieShowViewSet, get_purchase_queryset, get_session_queryset
+from cinema.models import CinemaHall, MovieShow, MyUser, PurchasedTicket, Screening, SeatInventory
+from cinema.schedule import HallSchedule
+from cinema.views import MovieListView, PurchasedListView
+
+
+@freeze_time('2022-06-15 12:00')
+class QueryPlanTestCase(TestCase):
+    """
+    Seeds a few years of schedule and checks with EXPLAIN that the hot queries are served by indexes.
+    """
+    halls = 40
+    weeks = 80
+    users = 1000
+    first_day = date(2021, 1, 4)
+
+    @classmethod
+    def setUpTestData(cls):
+        halls = CinemaHall.objects.bulk_create(CinemaHall(hall_name=f'PlanHall{number}', number_of_seats=100)
+                                               for number in range(cls.halls))
+        users = MyUser.objects.bulk_create(MyUser(username=f'planuser{number}') for number in range(cls.users))
+        movie_shows = [
+            MovieShow(movie_name=f'Movie{week}', start_time=time(10 + number % 10), finish_time=time(12 + number % 10),
+                      start_date=cls.first_day + timedelta(weeks=week),
+                      finish_date=cls.first_day + timedelta(weeks=week, days=6), cinema_hall=hall)
+            for number, hall in enumerate(halls) for week in range(cls.weeks)]
+        MovieShow.objects.bulk_create(movie_shows)
+        Screening.objects.bulk_create(screening for movie_show in movie_shows
+                                      for screening in movie_show.get_screenings())
+        SeatInventory.objects.bulk_create(SeatInventory(movie_show=movie_show, date=movie_show.start_date + timedelta(days=day))
+                                          for movie_show in movie_shows for day in range(7))
+        hold_expires_at = timezone.now() + timedelta(minutes=5)
+        PurchasedTicket.objects.bulk_create(
+            PurchasedTicket(user=users[(number * 7 + day) % cls.users], movie_show=movie_show,
+                            date=movie_show.start_date + timedelta(days=day), number_of_ticket=1,
+                            ticket_price=movie_show.ticket_price, purchase_amount=movie_show.ticket_price,
+                            hold_expires_at=hold_expires_at if day == 6 and number % 50 == 0 else None)
+            for number, movie_show in enumerate(movie_shows) for day in range(7))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.movie_show = movie_shows[len(movie_shows) // 2]
+        cls.user = users[0]
+
+    def assertIndexScan(self, queryset, *tables):
+        plan = queryset.explain()
+        for table in tables:
+            self.assertNotIn(f'Seq Scan on {table}', plan)
+            self.assertRegex(plan, rf'(Index Scan using \w+|Index Only Scan using \w+|Bitmap Heap Scan) on {table}\b')
+
+    def test_movie_list(self):
+        view = MovieListView()
+        view.setup(RequestFactory().get('/', {'show_date': 'Tomorrow'}))
+        self.assertIndexScan(view.get_queryset(), 'cinema_screening', 'cinema_seatinventory')
+
+    def test_session_list(self):
+        view = MovieShowViewSet(action_map={'get': 'list'})
+        view.request = view.initialize_request(APIRequestFactory().get('/api/session/', {'hall_id': 3}))
+        self.assertIndexScan(view.get_queryset(), 'cinema_screening', 'cinema_seatinventory')
+
+    def test_purchased_list(self):
+        view = PurchasedListView()
+        request = RequestFactory().get('/purchased/')
+        request.user = self.user
+        view.setup(request)
+        self.assertIndexScan(view.get_queryset(), 'cinema_purchasedticket')
+
+    def get_page_queryset(self, paginator, queryset, position):
+        paginator.prepare(APIRequestFactory().get('/'))
+        paginator.position = position
+        return paginator.get_page_queryset(queryset)
+
+    def test_purchase_page(self):
+        tickets = self.get_page_queryset(PurchasePagination(), get_purchase_queryset(self.user.id),
+                                         [date(2022, 6, 1), 10 ** 6])
+        self.assertIndexScan(tickets, 'cinema_purchasedticket')
+        self.assertIn('purchased_user_date_id_idx', tickets.explain())
+
+    def test_session_page(self):
+        movie_shows = self.get_page_queryset(SessionPagination(), get_session_queryset({}), [time(12), 10 ** 6])
+        self.assertIndexScan(movie_shows, 'cinema_screening', 'cinema_seatinventory')
+
+    def test_session_tickets(self):
+        tickets = PurchasedTicket.objects.held().expired().filter(movie_show=self.movie_show, date=date(2022, 6, 15))
+        self.assertIndexScan(tickets, 'cinema_purchasedticket')
+
+    def test_expired_holds(self):
+        expired = PurchasedTicket.objects.held().expired().values_list('movie_show', 'date').distinct().order_by()
+        self.assertIndexScan(expired, 'cinema_purchasedticket')
+
+    def test_seat_inventory(self):
+        inventory = SeatInventory.objects.filter(movie_show=self.movie_show, date=date(2022, 6, 15))
+        self.assertIndexScan(inventory, 'cinema_seatinventory')
+
+    def test_hall_schedule(self):
+        movie_shows = HallSchedule.get_hall_shows(self.movie_show.cinema_hall, since=date(2022, 6, 15))
+        self.assertIndexScan(movie_shows, 'cinema_movieshow')
+
+    def test_active_screenings(self):
+        self.assertIndexScan(Screening.objects.active(timezone.now()), 'cinema_screening')
@@ -1,13 +1,21 @@
+import datetime
 import json
 import os
+from unittest import mock
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIRequestFactory, force_authenticate, APITestCase
 from freezegun import freeze_time
 from cinema.api.resources import PurchaseList, CinemaHallUpdate, MovieShowPost, MovieShowUpdate, MovieShowViewSet, \
-    GetToken, RegisterAPI
+    GetToken, RegisterAPI, SeatMap, HoldList, HoldConfirm, HoldRelease, PurchaseBulk, ShowSalesReport, \
+    HallSalesReport, DaySalesReport, PurchaseExport
 from cinema.api.serializers import PurchaseSerializer
-from cinema.models import MyUser, PurchasedTicket
+from cinema.cache import get_api_cache
+from cinema.models import MyUser, PurchasedTicket, SeatInventory, MovieShow, CinemaHall, IdempotencyKey, TokenExpired
+from cinema.services import purchase_tickets, hold_tickets
 
 
 @freeze_time('2022-01-23')
@@ -15,6 +23,7 @@ class MovieShowViewSetTestCase(APITestCase):
     fixtures = ['initial_data.json', ]
 
     def setUp(self):
+        get_api_cache().clear()
         self.factory = APIRequestFactory()
         self.superuser = MyUser.objects.get(username='stan')
         self.user = MyUser.objects.create_user(username='alice', password='1')
@@ -67,7 +76,28 @@ class MovieShowViewSetTestCase(APITestCase):
         with open(os.path.join('cinema', 'tests', 'data', 'test_movie_list_answer.json')) as json_file:
             data = json.load(json_file)
         response.render()
-        self.assertEqual(json.loads(response.content), data)
+        self.assertEqual(json.loads(response.content), {'next': None, 'previous': None, 'results': data})
+
+    def test_movie_list_free_seats_tomorrow(self):
+        purchase_tickets(self.user, MovieShow.objects.get(id=2), '2022-01-24', 3)
+        request = self.factory.get('/api/session/', {'show_day': 'tomorrow'})
+        force_authenticate(request, user=AnonymousUser())
+        with self.assertNumQueries(1):
+            response = MovieShowViewSet.as_view({'get': 'list'})(request)
+            response.render()
+        self.assertEqual({row['id']: row['free_seats'] for row in response.data['results']}, {1: 100, 2: 97})
+
+    @freeze_time('2022-01-30')
+    def test_movie_list_show_day_finish_date(self):
+        request = self.factory.get('/api/session/', {'show_day': 'today'})
+        force_authenticate(request, user=AnonymousUser())
+        response = MovieShowViewSet.as_view({'get': 'list'})(request)
+        self.assertEqual(sorted(row['id'] for row in response.data['results']), [1, 2])
+
+        request = self.factory.get('/api/session/', {'show_day': 'tomorrow'})
+        force_authenticate(request, user=AnonymousUser())
+        response = MovieShowViewSet.as_view({'get': 'list'})(request)
+        self.assertEqual(response.data['results'], [])
 
 
 @freeze_time('2022-01-22')
@@ -228,10 +258,10 @@ class PurchaseListViewTestCase(APITestCase):
         request = self.factory.get('/api/purchased/')
         force_authenticate(request, user=self.superuser)
         response = PurchaseList.as_view()(request)
-        purchasets = PurchasedTicket.objects.filter(user=request.user)
+        purchasets = PurchasedTicket.objects.filter(user=request.user).order_by('-date', '-id')
         serializer = PurchaseSerializer(purchasets, many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
 
     def test_list_purchase_anonimousmuser(self):
         request = self.factory.get('/api/purchased/')
@@ -245,7 +275,31 @@ class PurchaseListViewTestCase(APITestCase):
         force_authenticate(request, user=self.superuser)
         response = PurchaseList.as_view()(request)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        self.assertEqual(response.data, {'movie_show': 1, 'number_of_ticket': 2, 'date': '2022-01-22'})
+        self.assertEqual(response.data, {'movie_show': 1, 'number_of_ticket': 2, 'date': '2022-01-22',
+                                         'seats': [[1, 6], [1, 7]]})
+
+    @freeze_time('2022-01-22')
+    def test_create_purchase_sold_out(self):
+        request = self.factory.post('/api/purchased/', {'movie_show': 1, 'number_of_ticket': 96, 'date': '2022-01-22'})
+        force_authenticate(request, user=self.user)
+        response = PurchaseList.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'number_of_ticket': ['Такого количества свободных мест нет']})
+
+    @freeze_time('2022-01-22')
+    def test_create_purchase_seats(self):
+        data = {'movie_show': 1, 'number_of_ticket': 2, 'date': '2022-01-22', 'seats': [[1, 10], [1, 11]]}
+        request = self.factory.post('/api/purchased/', data, format='json')
+        force_authenticate(request, user=self.user)
+        response = PurchaseList.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['seats'], [[1, 10], [1, 11]])
+
+        request = self.factory.post('/api/purchased/', data, format='json')
+        force_authenticate(request, user=self.user)
+        response = PurchaseList.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'seats': ['Выбранные места уже заняты']})
 
     @freeze_time('2022-01-22')
     def test_create_purchase_user(self):
@@ -253,7 +307,88 @@ class PurchaseListViewTestCase(APITestCase):
         force_authenticate(request, user=self.user)
         response = PurchaseList.as_view()(request)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        self.assertEqual(response.data, {'movie_show': 1, 'number_of_ticket': 2, 'date': '2022-01-22'})
+        self.assertEqual(response.data, {'movie_show': 1, 'number_of_ticket': 2, 'date': '2022-01-22',
+                                         'seats': [[1, 6], [1, 7]]})
+        self.assertEqual(SeatInventory.objects.get(movie_show=1, date='2022-01-22').tickets_sold, 7)
+
+    def post_with_key(self, data, key='retry-1'):
+        request = self.factory.post('/api/purchased/', data, HTTP_IDEMPOTENCY_KEY=key)
+        force_authenticate(request, user=self.user)
+        return PurchaseList.as_view()(request)
+
+    @freeze_time('2022-01-22')
+    def test_create_purchase_idempotent_replay(self):
+        data = {'movie_show': 1, 'number_of_ticket': 2, 'date': '2022-01-22'}
+        response = self.post_with_key(data)
+        replay = self.post_with_key(data)
+        self.assertEqual(replay.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(replay.data, response.data)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(PurchasedTicket.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(SeatInventory.objects.get(movie_show=1, date='2022-01-22').tickets_sold, 7)
+        self.assertEqual(MyUser.objects.get(pk=self.user.pk).money_spent, 2 * MovieShow.objects.get(pk=1).ticket_price)
+
+    @freeze_time('2022-01-22')
+    def test_create_purchase_idempotent_key_reused(self):
+        self.post_with_key({'movie_show': 1, 'number_of_ticket': 2, 'date': '2022-01-22'})
+        response = self.post_with_key({'movie_show': 1, 'number_of_ticket': 3, 'date': '2022-01-22'})
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(PurchasedTicket.objects.filter(user=self.user).count(), 1)
+
+    @freeze_time('2022-01-22')
+    def test_create_purchase_idempotent_failed_not_stored(self):
+        response = self.post_with_key({'movie_show': 1, 'number_of_ticket': 96, 'date': '2022-01-22'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_create_purchase_idempotent_key_expired(self):
+        data = {'movie_show': 1, 'number_of_ticket': 2, 'date': '2022-01-23'}
+        with freeze_time('2022-01-22 00:00'):
+            self.post_with_key(data)
+        with freeze_time('2022-01-23 01:00'):
+            response = self.post_with_key(data)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(PurchasedTicket.objects.filter(user=self.user).count(), 2)
+
+
+@freeze_time('2022-01-22')
+class PurchaseBulkTestCase(APITestCase):
+    fixtures = ['initial_data.json', ]
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = MyUser.objects.create_user(username='alice', password='1')
+
+    def post(self, items):
+        request = self.factory.post('/api/purchased/bulk/', {'items': items}, format='json')
+        force_authenticate(request, user=self.user)
+        return PurchaseBulk.as_view()(request)
+
+    def test_purchase_bulk(self):
+        response = self.post([{'movie_show': 1, 'date': '2022-01-22', 'number_of_ticket': 2},
+                              {'movie_show': 2, 'date': '2022-01-23', 'number_of_ticket': 1}])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, [
+            {'date': '2022-01-22', 'movie_show': 1, 'number_of_ticket': 2, 'seats': [[1, 6], [1, 7]]},
+            {'date': '2022-01-23', 'movie_show': 2, 'number_of_ticket': 1, 'seats': [[1, 1]]}])
+
+    def test_purchase_bulk_sold_out(self):
+        response = self.post([{'movie_show': 2, 'date': '2022-01-23', 'number_of_ticket': 1},
+                              {'movie_show': 1, 'date': '2022-01-22', 'number_of_ticket': 96}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'items': ['Такого количества свободных мест нет: Batman, 2022-01-22']})
+        self.assertFalse(PurchasedTicket.objects.filter(user=self.user).exists())
+
+    def test_purchase_bulk_invalid(self):
+        response = self.post([{'movie_show': 99, 'date': '2022-01-22', 'number_of_ticket': 1}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'movie_show': ['Сеанс 99 не найден']})
+
+        response = self.post([{'movie_show': 1, 'date': '2022-01-21', 'number_of_ticket': 1}])
+        self.assertEqual(response.data, {'date': ['Вчера уже прошло, надо смотрет в будущее']})
+
+        response = self.post([])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
 @freeze_time('2022-01-22')
@@ -270,7 +405,7 @@ class CinemaHallUpdateTestCase(APITestCase):
         force_authenticate(request, user=self.superuser)
         response = CinemaHallUpdate.as_view()(request, pk=2)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, {'hall_name': 'StanHallNew', 'number_of_seats': 222, 'id': 2})
+        self.assertEqual(response.data, {'hall_name': 'StanHallNew', 'number_of_seats': 222, 'number_of_rows': 1, 'id': 2})
 
     def test_update_cinema_invalid(self):
         request = self.factory.put('/api/update_hall/', {'hall_name': 'StanHallNew', 'number_of_seats': 222})
@@ -278,6 +413,14 @@ class CinemaHallUpdateTestCase(APITestCase):
         response = CinemaHallUpdate.as_view()(request, pk=1)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_update_cinema_empty_rows(self):
+        request = self.factory.put('/api/update_hall/', {'hall_name': 'StanHallNew', 'number_of_seats': 10,
+                                                         'number_of_rows': 6})
+        force_authenticate(request, user=self.superuser)
+        response = CinemaHallUpdate.as_view()(request, pk=2)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'number_of_rows': ['10 мест нельзя рассадить в 6 рядов без пустых рядов']})
+
 
 @freeze_time('2022-01-22')
 class GetTokenTestCase(APITestCase):
@@ -332,3 +475,229 @@ class RegisterApiTestCase(APITestCase):
 
 
 
+
+
+class SeatMapTestCase(APITestCase):
+    fixtures = ['initial_data.json', ]
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+
+    def test_seat_map(self):
+        CinemaHall.objects.filter(id=1).update(number_of_seats=10, number_of_rows=3)
+        request = self.factory.get('/api/session/1/seats/', {'date': '2022-01-22'})
+        response = SeatMap.as_view()(request, pk=1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'movie_show': 1, 'date': '2022-01-22', 'number_of_rows': 3, 'seats_in_row': 4,
+                                         'free_seats': 5,
+                                         'seat_map': [[1, 1, 1, 1], [1, 0, 0, 0], [0, 0]]})
+
+    def test_seat_map_empty_date(self):
+        request = self.factory.get('/api/session/1/seats/', {'date': '2022-01-23'})
+        response = SeatMap.as_view()(request, pk=1)
+        self.assertEqual(response.data['free_seats'], 100)
+        self.assertEqual(response.data['seat_map'], [[0] * 100])
+
+    def test_seat_map_invalid_date(self):
+        request = self.factory.get('/api/session/1/seats/', {'date': 'tomorrow'})
+        response = SeatMap.as_view()(request, pk=1)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_seat_map_unknown_show(self):
+        request = self.factory.get('/api/session/100/seats/', {'date': '2022-01-22'})
+        response = SeatMap.as_view()(request, pk=100)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@freeze_time('2022-01-22 07:00')
+class HoldTestCase(APITestCase):
+    fixtures = ['initial_data.json', ]
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = MyUser.objects.create_user(username='alice', password='1')
+        self.superuser = MyUser.objects.get(username='stan')
+
+    def hold(self):
+        request = self.factory.post('/api/hold/', {'movie_show': 1, 'number_of_ticket': 2, 'date': '2022-01-22'})
+        force_authenticate(request, user=self.user)
+        return HoldList.as_view()(request)
+
+    def test_hold(self):
+        response = self.hold()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['seats'], [[1, 6], [1, 7]])
+        self.assertEqual(response.data['hold_expires_at'], '2022-01-22T09:05:00+02:00')
+
+    def test_confirm(self):
+        pk = self.hold().data['id']
+        request = self.factory.post(f'/api/hold/{pk}/confirm/')
+        force_authenticate(request, user=self.user)
+        response = HoldConfirm.as_view()(request, pk=pk)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'movie_show': 1, 'number_of_ticket': 2, 'date': '2022-01-22',
+                                         'seats': [[1, 6], [1, 7]]})
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.money_spent, 100)
+
+    def test_confirm_other_user(self):
+        pk = self.hold().data['id']
+        request = self.factory.post(f'/api/hold/{pk}/confirm/')
+        force_authenticate(request, user=self.superuser)
+        response = HoldConfirm.as_view()(request, pk=pk)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_release(self):
+        pk = self.hold().data['id']
+        request = self.factory.delete(f'/api/hold/{pk}/')
+        force_authenticate(request, user=self.user)
+        response = HoldRelease.as_view()(request, pk=pk)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(SeatInventory.objects.get(movie_show=1, date='2022-01-22').tickets_held, 0)
+
+    def test_held_tickets_not_in_history(self):
+        self.hold()
+        request = self.factory.get('/api/purchased/')
+        force_authenticate(request, user=self.user)
+        response = PurchaseList.as_view()(request)
+        self.assertEqual(response.data['results'], [])
+
+
+@freeze_time('2022-01-22 07:00')
+class SalesReportTestCase(APITestCase):
+    fixtures = ['initial_data.json', ]
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.superuser = MyUser.objects.get(username='stan')
+        movie_show = MovieShow.objects.select_related('cinema_hall').get(id=1)
+        purchase_tickets(self.superuser, movie_show, datetime.date(2022, 1, 22), 20)
+        purchase_tickets(self.superuser, movie_show, datetime.date(2022, 1, 25), 1)
+
+    def get(self, view, data=None, user=None):
+        request = self.factory.get('/api/reports/', data)
+        force_authenticate(request, user=user or self.superuser)
+        return view.as_view()(request)
+
+    def test_reports(self):
+        response = self.get(ShowSalesReport)
+        self.assertEqual(response.data, [{'date': '2022-01-22', 'movie_show': 1, 'tickets_sold': 20, 'revenue': 1000,
+                                          'number_of_seats': 100, 'occupancy': 20.0}])
+        response = self.get(HallSalesReport, {'date_to': '2022-01-25'})
+        self.assertEqual([row['date'] for row in response.data], ['2022-01-22', '2022-01-25'])
+        self.assertEqual(response.data[0]['cinema_hall'], 1)
+        response = self.get(DaySalesReport, {'date_from': '2022-01-23', 'date_to': '2022-01-25'})
+        self.assertEqual([(row['date'], row['revenue']) for row in response.data], [('2022-01-25', 50)])
+
+    def test_reports_read_summaries_only(self):
+        with self.assertNumQueries(1):
+            self.get(DaySalesReport, {'date_to': '2022-01-25'})
+
+    def test_invalid_range(self):
+        response = self.get(DaySalesReport, {'date_from': '2022-01-25', 'date_to': '2022-01-22'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.get(DaySalesReport, {'date_from': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_admin_only(self):
+        response = self.get(DaySalesReport, user=MyUser.objects.create_user(username='alice', password='1'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@freeze_time('2022-01-22 07:00')
+class PurchaseExportTestCase(APITestCase):
+    fixtures = ['initial_data.json', ]
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.superuser = MyUser.objects.get(username='stan')
+        hall = CinemaHall.objects.create(hall_name='Зал, "большой"', number_of_seats=10)
+        movie_show = MovieShow.objects.create(movie_name='Matrix', ticket_price=70, start_time='14:00',
+                                              finish_time='16:00', start_date='2022-01-22',
+                                              finish_date='2022-01-30', cinema_hall=hall)
+        self.ticket = purchase_tickets(self.superuser, movie_show, datetime.date(2022, 1, 23), 2)
+
+    def export(self, data=None, user=None):
+        request = self.factory.get('/api/purchased/export/', data)
+        force_authenticate(request, user=user or self.superuser)
+        return PurchaseExport.as_view()(request)
+
+    def test_export(self):
+        with mock.patch.object(connection, 'chunked_cursor', wraps=connection.chunked_cursor) as chunked_cursor:
+            response = self.export({'date_to': '2022-01-25'})
+            self.assertTrue(response.streaming)
+            content = b''.join(response.streaming_content).decode()
+        # Rows come from a server-side cursor.
+        chunked_cursor.assert_called_once()
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename="purchases_2021-12-27_2022-01-25.csv"')
+        self.assertEqual(content.splitlines(), [
+            'id,date,movie_show,movie_name,cinema_hall,hall_name,user,username,number_of_ticket,ticket_price,'
+            'purchase_amount,seats',
+            f'1,2022-01-22,1,Batman,1,StanHall,{self.superuser.id},stan,5,50,250,1-1 1-2 1-3 1-4 1-5',
+            f'{self.ticket.id},2022-01-23,{self.ticket.movie_show_id},Matrix,{self.ticket.movie_show.cinema_hall_id},'
+            f'"Зал, ""большой""",{self.superuser.id},stan,2,70,140,1-1 1-2',
+        ])
+
+    def test_filters(self):
+        hold_tickets(self.superuser, self.ticket.movie_show, datetime.date(2022, 1, 23), 1)
+        response = self.export({'date_to': '2022-01-25', 'hall_id': self.ticket.movie_show.cinema_hall_id})
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 2)
+        response = self.export({'date_from': '2022-01-23', 'date_to': '2022-01-23'})
+        self.assertIn(b'Matrix', b''.join(response.streaming_content))
+        response = self.export({'date_from': '2022-01-24', 'date_to': '2022-01-25'})
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 1)
+
+    def test_invalid_params(self):
+        response = self.export({'hall_id': 'big'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_admin_only(self):
+        response = self.export(user=MyUser.objects.create_user(username='alice', password='1'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@freeze_time('2022-01-23 08:00')
+class AsyncReadEndpointsTestCase(APITestCase):
+    fixtures = ['initial_data.json', ]
+
+    def setUp(self):
+        get_api_cache().clear()
+        self.superuser = MyUser.objects.get(username='stan')
+        self.token = TokenExpired.objects.create(user=self.superuser, last_action=timezone.now())
+
+    async def assertSameAsSync(self, sync_path, async_path, data=None, **headers):
+        sync_response = await sync_to_async(self.client.get)(sync_path, data, headers=headers)
+        async_response = await self.async_client.get(async_path, data, headers=headers)
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(async_response.json(), sync_response.json())
+        return async_response
+
+    async def test_session_list(self):
+        response = await self.assertSameAsSync('/api/session/', '/api/async/session/')
+        self.assertEqual(len(response.json()['results']), 2)
+
+    async def test_session_list_params(self):
+        for data in ({'show_day': 'tomorrow'}, {'hall_id': 1, 'start_time': '08:00', 'finish_time': '12:00'},
+                     {'start_time': '11:00', 'finish_time': '08:00'}):
+            with self.subTest(data=data):
+                await self.assertSameAsSync('/api/session/', '/api/async/session/', data)
+
+    async def test_purchase_list(self):
+        response = await self.assertSameAsSync('/api/purchased/', '/api/async/purchased/',
+                                               authorization=f'Token {self.token.key}')
+        self.assertTrue(response.json())
+
+    async def test_purchase_list_unauthorized(self):
+        response = await self.async_client.get('/api/async/purchased/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
+        response = await self.async_client.get('/api/async/purchased/', headers={'authorization': 'Token 1'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.json(), {'detail': 'Invalid token.'})
+
+    async def test_real_time(self):
+        sync_response = await sync_to_async(self.client.get)('/realtime/')
+        async_response = await self.async_client.get('/realtime/async/')
+        self.assertEqual(async_response.content, sync_response.content)
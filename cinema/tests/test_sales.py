@@ -0,0 +1,54 @@
+from datetime import date
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+from freezegun import freeze_time
+from cinema.models import MovieShow, MyUser, ShowSales, HallSales, DaySales
+from cinema.services import purchase_tickets, purchase_tickets_bulk, hold_tickets, confirm_hold
+
+
+@freeze_time('2022-01-22 07:00')
+class RecordSalesTestCase(TestCase):
+    fixtures = ['initial_data.json', ]
+
+    def setUp(self):
+        self.user = MyUser.objects.create_user(username='alice', password='1')
+        self.batman = MovieShow.objects.select_related('cinema_hall').get(id=1)
+        self.superman = MovieShow.objects.select_related('cinema_hall').get(id=2)
+
+    def get_totals(self, model, **lookup):
+        summary = model.objects.get(**lookup)
+        return summary.tickets_sold, summary.revenue, summary.number_of_seats, summary.occupancy
+
+    def test_purchase(self):
+        purchase_tickets(self.user, self.batman, date(2022, 1, 23), 2)
+        purchase_tickets(self.user, self.batman, date(2022, 1, 23), 3)
+        self.assertEqual(self.get_totals(ShowSales, movie_show=self.batman, date=date(2022, 1, 23)),
+                         (5, 250, 100, 5.0))
+        self.assertEqual(self.get_totals(HallSales, cinema_hall=1, date=date(2022, 1, 23)), (5, 250, 100, 5.0))
+        self.assertEqual(self.get_totals(DaySales, date=date(2022, 1, 23)), (5, 250, 100, 5.0))
+
+    def test_shows_of_a_hall(self):
+        purchase_tickets(self.user, self.batman, date(2022, 1, 23), 2)
+        purchase_tickets(self.user, self.superman, date(2022, 1, 23), 1)
+        self.assertEqual(self.get_totals(HallSales, cinema_hall=1, date=date(2022, 1, 23)), (3, 200, 200, 1.5))
+        self.assertEqual(self.get_totals(DaySales, date=date(2022, 1, 23)), (3, 200, 200, 1.5))
+
+    def test_hold_counted_when_confirmed(self):
+        ticket = hold_tickets(self.user, self.batman, date(2022, 1, 23), 2)
+        self.assertFalse(ShowSales.objects.exists())
+        confirm_hold(ticket)
+        self.assertEqual(self.get_totals(ShowSales, movie_show=self.batman, date=date(2022, 1, 23)),
+                         (2, 100, 100, 2.0))
+
+    def test_purchase_bulk(self):
+        purchase_tickets_bulk(self.user, [(self.batman, date(2022, 1, 23), 1), (self.superman, date(2022, 1, 23), 2),
+                                          (self.batman, date(2022, 1, 23), 1), (self.batman, date(2022, 1, 24), 4)])
+        self.assertEqual(self.get_totals(ShowSales, movie_show=self.batman, date=date(2022, 1, 23)),
+                         (2, 100, 100, 2.0))
+        self.assertEqual(self.get_totals(HallSales, cinema_hall=1, date=date(2022, 1, 23)), (4, 300, 200, 2.0))
+        self.assertEqual(self.get_totals(DaySales, date=date(2022, 1, 24)), (4, 200, 100, 4.0))
+
+    def test_failed_purchase(self):
+        with self.assertRaises(ValidationError):
+            purchase_tickets(self.user, self.batman, date(2022, 1, 23), 101)
+        self.assertFalse(DaySales.objects.exists())
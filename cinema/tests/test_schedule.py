@@ -0,0 +1,153 @@
+import random
+from datetime import date, time, timedelta
+from django.db.models import Q
+from django.test import TestCase
+from cinema.models import CinemaHall, MovieShow
+from cinema.schedule import IntervalTree, HallSchedule, get_conflicts, get_show_intervals
+
+
+def get_legacy_conflicts(movie_shows, start_date, finish_date, start_time, finish_time):
+    # The Q based check the forms, views and serializers used before the schedule engine.
+    enter_start_date = Q(start_date__range=(start_date, finish_date))
+    enter_finish_date = Q(finish_date__range=(start_date, finish_date))
+    middle_date_start = Q(start_date__lte=start_date, finish_date__gte=finish_date)
+    enter_start_time = Q(start_time__range=(start_time, finish_time))
+    enter_finish_time = Q(finish_time__range=(start_time, finish_time))
+    movie_obj = movie_shows.filter(
+        enter_start_date | enter_finish_date | middle_date_start).filter(enter_start_time | enter_finish_time)
+    if start_time > finish_time:
+        movie_obj = movie_shows.filter(
+            enter_start_date | enter_finish_date | middle_date_start).filter(
+            Q(start_time__range=(start_time, '23:59:59')) | Q(start_time__range=('00:00:00', finish_time)) |
+            Q(finish_time__range=(start_time, '23:59:59')) | Q(finish_time__range=('00:00:00', finish_time)))
+    return set(movie_obj.values_list('id', flat=True))
+
+
+def get_show_minutes(start_date, finish_date, start_time, finish_time):
+    # Every screening of the show as its first and last minute counted from the first day, day by day.
+    start_minute, finish_minute = start_time.hour * 60 + start_time.minute, finish_time.hour * 60 + finish_time.minute
+    if finish_minute < start_minute:
+        finish_minute += 24 * 60
+    return [(day * 24 * 60 + start_minute, day * 24 * 60 + finish_minute)
+            for day in range(start_date.toordinal(), finish_date.toordinal() + 1)]
+
+
+def get_brute_force_conflicts(movie_shows, start_date, finish_date, start_time, finish_time):
+    screenings = get_show_minutes(start_date, finish_date, start_time, finish_time)
+    conflicts = set()
+    for movie_show in movie_shows:
+        for first_minute, last_minute in get_show_minutes(movie_show.start_date, movie_show.finish_date,
+                                                          movie_show.start_time, movie_show.finish_time):
+            if any(first_minute <= other_last_minute and other_first_minute <= last_minute
+                   for other_first_minute, other_last_minute in screenings):
+                conflicts.add(movie_show.id)
+    return conflicts
+
+
+def get_random_show(generator):
+    start_date = date(2022, 1, 1) + timedelta(days=generator.randrange(60))
+    finish_date = start_date + timedelta(days=generator.randrange(10))
+    start_time = time(generator.randrange(24), generator.choice([0, 15, 30, 45]))
+    finish_time = time(generator.randrange(24), generator.choice([0, 15, 30, 45]))
+    if start_date == finish_date and start_time == finish_time:
+        finish_time = time((start_time.hour + 1) % 24, start_time.minute)
+    return start_date, finish_date, start_time, finish_time
+
+
+class IntervalTreeTestCase(TestCase):
+
+    def test_search_matches_brute_force(self):
+        generator = random.Random(9)
+        intervals = []
+        for value in range(300):
+            low = generator.randrange(1000)
+            intervals.append((low, low + generator.randrange(50), value))
+        tree = IntervalTree(intervals)
+        for _ in range(300):
+            low = generator.randrange(1000)
+            high = low + generator.randrange(30)
+            expected = {value for interval_low, interval_high, value in intervals
+                        if interval_low <= high and low <= interval_high}
+            self.assertEqual(set(tree.search(low, high)), expected)
+
+    def test_search_empty(self):
+        self.assertEqual(IntervalTree([]).search(1, 2), [])
+
+
+class ShowIntervalsTestCase(TestCase):
+
+    def test_show_intervals(self):
+        self.assertEqual(get_show_intervals(date(2022, 1, 22), date(2022, 1, 23), time(10), time(12, 30)),
+                         [(738177, 738178, 600, 750)])
+
+    def test_show_intervals_overnight(self):
+        self.assertEqual(get_show_intervals(date(2022, 1, 22), date(2022, 1, 23), time(23), time(1)),
+                         [(738177, 738178, 1380, 1439), (738178, 738179, 0, 60)])
+
+
+class HallScheduleTestCase(TestCase):
+
+    def setUp(self):
+        self.cinema_hall = CinemaHall.objects.create(hall_name='ScheduleHall', number_of_seats=10)
+
+    def create_show(self, start_date, finish_date, start_time, finish_time):
+        return MovieShow.objects.create(movie_name='Movie', start_date=start_date, finish_date=finish_date,
+                                        start_time=start_time, finish_time=finish_time,
+                                        cinema_hall=self.cinema_hall)
+
+    def test_inner_show_conflict(self):
+        # The legacy check only looked for the other show's bounds inside the new one.
+        movie_show = self.create_show(date(2022, 1, 22), date(2022, 1, 25), time(10), time(14))
+        args = (date(2022, 1, 23), date(2022, 1, 23), time(11), time(12))
+        self.assertEqual(get_legacy_conflicts(MovieShow.objects.filter(cinema_hall=self.cinema_hall), *args), set())
+        self.assertEqual(get_conflicts(self.cinema_hall, *args), [movie_show])
+
+    def test_overnight_conflict(self):
+        movie_show = self.create_show(date(2022, 1, 22), date(2022, 1, 22), time(23), time(1, 30))
+        self.assertEqual(get_conflicts(self.cinema_hall, date(2022, 1, 23), date(2022, 1, 24), time(1), time(3)),
+                         [movie_show])
+        self.assertEqual(get_conflicts(self.cinema_hall, date(2022, 1, 24), date(2022, 1, 24), time(1), time(3)),
+                         [])
+
+    def test_overnight_edges(self):
+        movie_show = self.create_show(date(2022, 1, 1), date(2022, 1, 15), time(22), time(0, 30))
+        for args in [(date(2022, 1, 16), date(2022, 1, 31), time(22), time(0, 30)),
+                     (date(2022, 1, 1), date(2022, 1, 1), time(0), time(0, 20)),
+                     (date(2022, 1, 16), date(2022, 1, 16), time(23, 30), time(23, 50)),
+                     (date(2021, 12, 31), date(2021, 12, 31), time(22), time(0, 30))]:
+            with self.subTest(args=args):
+                self.assertEqual(get_conflicts(self.cinema_hall, *args), [])
+        for args in [(date(2022, 1, 2), date(2022, 1, 2), time(0), time(0, 20)),
+                     (date(2022, 1, 16), date(2022, 1, 16), time(0, 30), time(1)),
+                     (date(2022, 1, 15), date(2022, 1, 15), time(23, 30), time(23, 50)),
+                     (date(2021, 12, 31), date(2021, 12, 31), time(23), time(22))]:
+            with self.subTest(args=args):
+                self.assertEqual(get_conflicts(self.cinema_hall, *args), [movie_show])
+
+    def test_exclude(self):
+        movie_show = self.create_show(date(2022, 1, 22), date(2022, 1, 25), time(10), time(14))
+        self.assertEqual(get_conflicts(self.cinema_hall, date(2022, 1, 22), date(2022, 1, 22), time(10), time(12),
+                                       exclude=movie_show.id), [])
+
+    def test_cross_check_with_legacy(self):
+        # The database no longer accepts overlapping shows in one hall, so each show gets a hall of its own
+        # and the schedule is built from all of them.
+        generator = random.Random(2022)
+        movie_shows = []
+        for number in range(150):
+            cinema_hall = CinemaHall.objects.create(hall_name=f'RandomHall{number}', number_of_seats=10)
+            start_date, finish_date, start_time, finish_time = get_random_show(generator)
+            movie_shows.append(MovieShow.objects.create(
+                movie_name='Movie', start_date=start_date, finish_date=finish_date, start_time=start_time,
+                finish_time=finish_time, cinema_hall=cinema_hall))
+        schedule = HallSchedule(movie_shows)
+        # The legacy check also flags the morning before the first night of an overnight show, which is free,
+        # so the screenings compared minute by minute are the reference.
+        found_more = 0
+        for _ in range(300):
+            show = get_random_show(generator)
+            conflicts = {movie_show.id for movie_show in schedule.get_conflicts(*show)}
+            legacy_conflicts = get_legacy_conflicts(MovieShow.objects.exclude(cinema_hall=self.cinema_hall), *show)
+            self.assertEqual(conflicts, get_brute_force_conflicts(movie_shows, *show), show)
+            found_more += bool(conflicts - legacy_conflicts)
+        self.assertTrue(found_more)
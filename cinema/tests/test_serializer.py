@@ -1,8 +1,12 @@
+from unittest.mock import patch
 from django.test import RequestFactory
+from rest_framework import serializers
 from rest_framework.test import APITestCase
+from rest_framework.renderers import JSONRenderer
 from cinema.api.serializers import CinemaHallSerializer, RegisterSerializer, PurchaseSerializerCreate,\
-    MovieShowSerializerPost
-from cinema.models import CinemaHall, MovieShow, MyUser
+    MovieShowSerializerPost, MovieShowListSerializer, PurchaseSerializer, SeatMapSerializer, ValuesSerializer, \
+    movie_show_list_values, purchase_values
+from cinema.models import CinemaHall, MovieShow, MyUser, PurchasedTicket
 from freezegun import freeze_time
 
 
@@ -22,7 +26,7 @@ class CinemaHallSerializerTestCase(APITestCase):
     def test_create_cinema_valid(self):
         new_cinema = CinemaHall.objects.create(hall_name='StanHallNew', number_of_seats=111, id=5)
         data = CinemaHallSerializer(new_cinema).data
-        expected_data = {'hall_name': 'StanHallNew', 'number_of_seats': 111, 'id': 5}
+        expected_data = {'hall_name': 'StanHallNew', 'number_of_seats': 111, 'number_of_rows': 1, 'id': 5}
         self.assertEqual(data, expected_data)
 
 
@@ -66,6 +70,25 @@ class MovieShowSerializerPostTestCase(APITestCase):
         serializer = MovieShowSerializerPost(data=data)
         self.assertFalse(serializer.is_valid())
 
+    def test_create_movie_show_concurrent_cross_sessions(self):
+        # Another admin saved the overlapping show after our validation, the database constraint catches it.
+        data = {'movie_name': 'TestMovie',
+                'ticket_price': 188,
+                'start_time': '09:00',
+                'finish_time': '10:30',
+                'start_date': '2022-01-23',
+                'finish_date': '2022-01-30',
+                'cinema_hall': 1}
+
+        serializer = MovieShowSerializerPost(data=data)
+        with patch('cinema.api.serializers.get_conflicts', return_value=[]):
+            self.assertTrue(serializer.is_valid())
+        with self.assertRaises(serializers.ValidationError) as context:
+            serializer.save()
+        self.assertEqual(context.exception.detail, {
+            'start_date, finish_date': ['Сеансы в одном зале не могут накладываться друг на друга']})
+        self.assertFalse(MovieShow.objects.filter(movie_name='TestMovie').exists())
+
     def test_create_movie_show_invalid_time(self):
         data = {'movie_name': 'TestMovie',
                       'ticket_price': 188,
@@ -162,19 +185,41 @@ class PurchaseSerializerCreateTest(APITestCase):
         self.assertTrue(serializer.is_valid())
 
 
+@freeze_time('2022-01-22')
+class ValuesSerializerTestCase(APITestCase):
+    fixtures = ['initial_data.json', ]
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+    def setUp(self):
+        user = MyUser.objects.get(username='stan')
+        cinema_hall = CinemaHall.objects.create(hall_name='Зал "Люкс"', number_of_seats=12, number_of_rows=3)
+        movie_show = MovieShow.objects.create(movie_name='Фильм\u2028 "в кавычках"', ticket_price=75,
+                                              start_time='23:30', finish_time='01:15', start_date='2022-01-22',
+                                              finish_date='2022-01-24', cinema_hall=cinema_hall)
+        PurchasedTicket.objects.create(user=user, movie_show=movie_show, date='2022-01-23', number_of_ticket=2,
+                                       seats=[[1, 1], [1, 2]])
+        PurchasedTicket.objects.create(user=user, movie_show=movie_show, date='2022-01-24', seats=[])
+
+    def assertSameJSON(self, values_serializer, serializer_class, queryset):
+        with self.assertNumQueries(1):
+            fast = JSONRenderer().render(values_serializer.serialize(values_serializer.values(queryset)))
+        self.assertEqual(fast, JSONRenderer().render(serializer_class(queryset, many=True).data))
+
+    def test_purchase_contract(self):
+        queryset = PurchasedTicket.objects.select_related('movie_show__cinema_hall').order_by('id')
+        self.assertSameJSON(purchase_values, PurchaseSerializer, queryset)
+
+    def test_movie_show_list_contract(self):
+        queryset = MovieShow.objects.with_free_seats('2022-01-23').order_by('id')
+        self.assertSameJSON(movie_show_list_values, MovieShowListSerializer, queryset)
+
+    def test_lookups(self):
+        self.assertEqual(purchase_values.lookups, [
+            'date', 'movie_show__id', 'movie_show__movie_name', 'movie_show__ticket_price', 'movie_show__start_time',
+            'movie_show__finish_time', 'movie_show__start_date', 'movie_show__finish_date',
+            'movie_show__cinema_hall__id', 'movie_show__cinema_hall__hall_name',
+            'movie_show__cinema_hall__number_of_seats', 'movie_show__cinema_hall__number_of_rows',
+            'number_of_ticket', 'seats'])
+
+    def test_method_fields_rejected(self):
+        with self.assertRaises(TypeError):
+            ValuesSerializer(SeatMapSerializer)
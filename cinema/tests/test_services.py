@@ -0,0 +1,292 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from unittest.mock import patch
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from freezegun import freeze_time
+from cinema.models import CinemaHall, MovieShow, MyUser, PurchasedTicket, SeatInventory
+from cinema.services import purchase_tickets, purchase_tickets_bulk, hold_tickets, confirm_hold, release_hold, release_expired_holds
+from stanhjr_project.settings import SEAT_HOLD_TTL
+
+
+class PurchaseTicketsTestCase(TestCase):
+    fixtures = ['initial_data.json', ]
+
+    def setUp(self):
+        self.user = MyUser.objects.create_user(username='alice', password='1')
+        self.batman_movie = MovieShow.objects.get(id=1)
+
+    def test_purchase_existing_inventory(self):
+        ticket = purchase_tickets(self.user, self.batman_movie, '2022-01-22', 3)
+        self.assertEqual(ticket.number_of_ticket, 3)
+        self.assertEqual(SeatInventory.objects.get(movie_show=self.batman_movie, date='2022-01-22').tickets_sold, 8)
+        self.assertEqual(self.batman_movie.get_tickets_count('2022-01-22'), 92)
+
+    def test_purchase_money_spent(self):
+        purchase_tickets(self.user, self.batman_movie, '2022-01-22', 3)
+        purchase_tickets(self.user, self.batman_movie, '2022-01-23', 2)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.money_spent, 250)
+
+    def test_purchase_publishes_availability(self):
+        with patch('cinema.models.broadcaster.publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                purchase_tickets(self.user, self.batman_movie, '2022-01-22', 3)
+        publish.assert_called_once_with({'movie_show': 1, 'date': '2022-01-22', 'free_seats': 92})
+
+    def test_purchase_auto_assigns_seats(self):
+        ticket = purchase_tickets(self.user, self.batman_movie, '2022-01-22', 2)
+        self.assertEqual(ticket.seats, [[1, 6], [1, 7]])
+
+    def test_purchase_selected_seats(self):
+        CinemaHall.objects.filter(id=1).update(number_of_rows=10)
+        batman_movie = MovieShow.objects.select_related('cinema_hall').get(id=1)
+        ticket = purchase_tickets(self.user, batman_movie, '2022-01-22', 2, seats=[[2, 1], [10, 10]])
+        self.assertEqual(ticket.seats, [[2, 1], [10, 10]])
+        inventory = SeatInventory.objects.get(movie_show=batman_movie, date='2022-01-22')
+        self.assertTrue(inventory.is_seat_taken(10))
+        self.assertTrue(inventory.is_seat_taken(99))
+        self.assertEqual(inventory.tickets_sold, 7)
+
+    def test_purchase_taken_seats(self):
+        with self.assertRaises(ValidationError) as error:
+            purchase_tickets(self.user, self.batman_movie, '2022-01-22', 2, seats=[[1, 5], [1, 6]])
+        self.assertEqual(error.exception.message_dict, {'seats': ['Выбранные места уже заняты']})
+        self.assertEqual(SeatInventory.objects.get(movie_show=self.batman_movie, date='2022-01-22').tickets_sold, 5)
+
+    def test_purchase_seats_count_mismatch(self):
+        with self.assertRaises(ValidationError):
+            purchase_tickets(self.user, self.batman_movie, '2022-01-22', 3, seats=[[1, 8], [1, 9]])
+        with self.assertRaises(ValidationError):
+            purchase_tickets(self.user, self.batman_movie, '2022-01-22', 2, seats=[[1, 8], [1, 8]])
+
+    def test_purchase_new_inventory(self):
+        purchase_tickets(self.user, self.batman_movie, '2022-01-24', 7)
+        self.assertEqual(SeatInventory.objects.get(movie_show=self.batman_movie, date='2022-01-24').tickets_sold, 7)
+        self.assertEqual(self.batman_movie.get_tickets_count('2022-01-24'), 93)
+
+    def test_purchase_all_seats(self):
+        purchase_tickets(self.user, self.batman_movie, '2022-01-22', 95)
+        self.assertEqual(self.batman_movie.get_tickets_count('2022-01-22'), 0)
+
+    def test_purchase_not_enough_seats(self):
+        with self.assertRaisesMessage(ValidationError, 'Такого количества свободных мест нет'):
+            purchase_tickets(self.user, self.batman_movie, '2022-01-22', 96)
+        self.assertEqual(SeatInventory.objects.get(movie_show=self.batman_movie, date='2022-01-22').tickets_sold, 5)
+        self.assertFalse(PurchasedTicket.objects.filter(user=self.user).exists())
+
+
+class SeatHoldTestCase(TestCase):
+    fixtures = ['initial_data.json', ]
+
+    def setUp(self):
+        self.user = MyUser.objects.create_user(username='alice', password='1')
+        self.batman_movie = MovieShow.objects.get(id=1)
+
+    def get_inventory(self):
+        return SeatInventory.objects.get(movie_show=self.batman_movie, date='2022-01-22')
+
+    @freeze_time('2022-01-22 07:00')
+    def test_hold_counts_against_availability(self):
+        ticket = hold_tickets(self.user, self.batman_movie, '2022-01-22', 3)
+        self.assertEqual(ticket.seats, [[1, 6], [1, 7], [1, 8]])
+        self.assertEqual(ticket.hold_expires_at, timezone.now() + timedelta(seconds=SEAT_HOLD_TTL))
+        self.assertEqual(self.get_inventory().tickets_held, 3)
+        self.assertEqual(self.batman_movie.get_tickets_count('2022-01-22'), 92)
+        self.assertEqual(MovieShow.objects.with_free_seats('2022-01-22').get(id=1).free_seats, 92)
+        with self.assertRaises(ValidationError):
+            purchase_tickets(self.user, self.batman_movie, '2022-01-22', 93)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.money_spent, 0)
+
+    def test_confirm_hold(self):
+        with freeze_time('2022-01-22 07:00'):
+            ticket = hold_tickets(self.user, self.batman_movie, '2022-01-22', 2)
+        with freeze_time('2022-01-22 07:04'):
+            confirm_hold(ticket)
+        ticket.refresh_from_db()
+        self.assertIsNone(ticket.hold_expires_at)
+        inventory = self.get_inventory()
+        self.assertEqual((inventory.tickets_sold, inventory.tickets_held), (7, 0))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.money_spent, 100)
+
+    def test_confirm_expired_hold(self):
+        with freeze_time('2022-01-22 07:00'):
+            ticket = hold_tickets(self.user, self.batman_movie, '2022-01-22', 2)
+        with freeze_time('2022-01-22 07:06'):
+            with self.assertRaisesMessage(ValidationError, 'Время брони истекло'):
+                confirm_hold(ticket)
+        self.assertFalse(PurchasedTicket.objects.filter(id=ticket.id).exists())
+        inventory = self.get_inventory()
+        self.assertEqual((inventory.tickets_sold, inventory.tickets_held, inventory.get_taken_seats()), (5, 0, 0x1f))
+
+    def test_release_hold(self):
+        ticket = hold_tickets(self.user, self.batman_movie, '2022-01-22', 2)
+        release_hold(ticket)
+        self.assertFalse(PurchasedTicket.objects.filter(id=ticket.id).exists())
+        self.assertEqual(self.get_inventory().tickets_held, 0)
+        self.assertEqual(self.get_inventory().get_taken_seats(), 0x1f)
+        with self.assertRaises(ValidationError):
+            release_hold(ticket)
+
+    def test_expired_hold_reclaimed_on_read(self):
+        with freeze_time('2022-01-22 07:00'):
+            hold_tickets(self.user, self.batman_movie, '2022-01-22', 10)
+            self.assertEqual(self.batman_movie.get_tickets_count('2022-01-22'), 85)
+        with freeze_time('2022-01-22 07:06'):
+            self.assertEqual(self.batman_movie.get_tickets_count('2022-01-22'), 95)
+        self.assertEqual(self.get_inventory().tickets_held, 0)
+        self.assertFalse(PurchasedTicket.objects.held().exists())
+
+    def test_expired_hold_reclaimed_on_purchase(self):
+        with freeze_time('2022-01-22 07:00'):
+            hold_tickets(self.user, self.batman_movie, '2022-01-22', 95)
+        with freeze_time('2022-01-22 07:06'):
+            ticket = purchase_tickets(self.user, self.batman_movie, '2022-01-22', 95)
+        self.assertEqual(ticket.seats[0], [1, 6])
+        inventory = self.get_inventory()
+        self.assertEqual((inventory.tickets_sold, inventory.tickets_held), (100, 0))
+
+    def test_release_expired_holds(self):
+        superman_movie = MovieShow.objects.get(id=2)
+        with freeze_time('2022-01-22 07:00'):
+            hold_tickets(self.user, self.batman_movie, '2022-01-22', 1)
+            hold_tickets(self.user, superman_movie, '2022-01-23', 2)
+        with freeze_time('2022-01-22 07:03'):
+            live = hold_tickets(self.user, superman_movie, '2022-01-23', 3)
+        with freeze_time('2022-01-22 07:06'):
+            self.assertEqual(release_expired_holds(), 3)
+        self.assertEqual(list(PurchasedTicket.objects.held()), [live])
+        self.assertEqual(SeatInventory.objects.get(movie_show=superman_movie, date='2022-01-23').tickets_held, 3)
+
+
+@freeze_time('2022-01-22')
+class PurchaseTicketsBulkTestCase(TestCase):
+    fixtures = ['initial_data.json', ]
+
+    def setUp(self):
+        self.user = MyUser.objects.create(username='group')
+        self.batman = MovieShow.objects.get(pk=1)
+        self.superman = MovieShow.objects.get(pk=2)
+
+    def test_purchase_bulk(self):
+        tickets = purchase_tickets_bulk(self.user, [(self.batman, date(2022, 1, 22), 2),
+                                                    (self.superman, date(2022, 1, 23), 3),
+                                                    (self.batman, date(2022, 1, 22), 1)])
+        self.assertEqual([ticket.seats for ticket in tickets], [[[1, 6], [1, 7]], [[1, 1], [1, 2], [1, 3]], [[1, 8]]])
+        self.assertEqual(SeatInventory.objects.get(movie_show=self.batman, date='2022-01-22').tickets_sold, 8)
+        self.assertEqual(SeatInventory.objects.get(movie_show=self.superman, date='2022-01-23').tickets_sold, 3)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.money_spent, 3 * 50 + 3 * 100)
+
+    def test_purchase_bulk_all_or_nothing(self):
+        with self.assertRaises(ValidationError):
+            purchase_tickets_bulk(self.user, [(self.superman, date(2022, 1, 23), 3),
+                                              (self.batman, date(2022, 1, 22), 90),
+                                              (self.batman, date(2022, 1, 22), 6)])
+        self.assertFalse(PurchasedTicket.objects.filter(user=self.user).exists())
+        self.assertEqual(SeatInventory.objects.get(movie_show=self.batman, date='2022-01-22').tickets_sold, 5)
+        self.assertFalse(SeatInventory.objects.filter(movie_show=self.superman, tickets_sold__gt=0).exists())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.money_spent, 0)
+
+    def test_purchase_bulk_query_count(self):
+        items = [(self.batman, date(2022, 1, 22 + day), 1) for day in range(5)]
+        with self.assertNumQueries(10):
+            purchase_tickets_bulk(self.user, items)
+
+
+class PurchaseTicketsConcurrencyTestCase(TransactionTestCase):
+    buyers = 300
+    workers = 40
+    number_of_seats = 50
+
+    def setUp(self):
+        hall = CinemaHall.objects.create(hall_name='RushHall', number_of_seats=self.number_of_seats)
+        self.movie_show = MovieShow.objects.create(movie_name='Premiere', ticket_price=10, start_time='20:00',
+                                                   finish_time='22:00', start_date='2022-01-22',
+                                                   finish_date='2022-01-30', cinema_hall=hall)
+        MyUser.objects.bulk_create(MyUser(username=f'buyer{number}') for number in range(self.buyers))
+        self.users = list(MyUser.objects.filter(username__startswith='buyer'))
+
+    def buy(self, user):
+        try:
+            movie_show = MovieShow.objects.select_related('cinema_hall').get(id=self.movie_show.id)
+            purchase_tickets(user, movie_show, '2022-01-22', 1)
+            return True
+        except ValidationError:
+            return False
+        finally:
+            connection.close()
+
+    def test_no_oversell(self):
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(self.buy, self.users))
+
+        self.assertEqual(results.count(True), self.number_of_seats)
+        sold = PurchasedTicket.objects.filter(movie_show=self.movie_show).aggregate(Sum('number_of_ticket'))
+        self.assertEqual(sold['number_of_ticket__sum'], self.number_of_seats)
+        self.assertEqual(SeatInventory.objects.get(movie_show=self.movie_show).tickets_sold, self.number_of_seats)
+        self.assertEqual(self.movie_show.get_tickets_count('2022-01-22'), 0)
+
+    def test_money_spent_no_lost_updates(self):
+        user = MyUser.objects.create(username='regular')
+
+        def buy(number):
+            try:
+                movie_show = MovieShow.objects.select_related('cinema_hall').get(id=self.movie_show.id)
+                purchase_tickets(user, movie_show, f'2022-01-{22 + number % 5}', 1)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            list(executor.map(buy, range(100)))
+
+        user.refresh_from_db()
+        self.assertEqual(user.money_spent, 100 * self.movie_show.ticket_price)
+
+    def test_bulk_no_deadlock(self):
+        other = MovieShow.objects.create(movie_name='Sequel', ticket_price=10, start_time='10:00',
+                                         finish_time='12:00', start_date='2022-01-22',
+                                         finish_date='2022-01-30', cinema_hall=self.movie_show.cinema_hall)
+
+        def buy(user):
+            movie_shows = list(MovieShow.objects.select_related('cinema_hall').filter(id__in=[self.movie_show.id,
+                                                                                             other.id]))
+            if user.id % 2:
+                movie_shows.reverse()
+            try:
+                purchase_tickets_bulk(user, [(movie_show, date(2022, 1, 22), 1) for movie_show in movie_shows])
+                return True
+            except ValidationError:
+                return False
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(buy, self.users[:100]))
+
+        self.assertEqual(results.count(True), self.number_of_seats)
+        self.assertEqual(SeatInventory.objects.get(movie_show=other).tickets_sold, self.number_of_seats)
+
+    def test_bulk_new_rows_no_deadlock(self):
+        # Baskets of many sessions without inventory rows yet, one in date order and the other reversed.
+        dates = [date(2022, 2, 1) + timedelta(days=day) for day in range(50)]
+
+        def buy(user):
+            movie_show = MovieShow.objects.select_related('cinema_hall').get(id=self.movie_show.id)
+            try:
+                purchase_tickets_bulk(user, [(movie_show, date_purchase, 1) for date_purchase in
+                                             (dates if user.id % 2 else dates[::-1])])
+            finally:
+                connection.close()
+
+        for attempt in range(20):
+            SeatInventory.objects.all().delete()
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                list(executor.map(buy, self.users[attempt * 2:attempt * 2 + 2]))
+        self.assertEqual(set(SeatInventory.objects.values_list('tickets_sold', flat=True)), {2})
@@ -0,0 +1,94 @@
+from datetime import timedelta
+from unittest import mock
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.test import TestCase
+from django.utils import timezone
+from freezegun import freeze_time
+from cinema import sessions
+from cinema.models import MyUser
+from cinema.sessions import SessionStore
+from stanhjr_project.settings import SESSION_COOKIE_AGE
+
+
+@freeze_time('2022-01-23 08:00')
+@mock.patch.object(sessions, 'SESSION_DB_WRITE_BEHIND', 0)
+class CacheSessionTestCase(TestCase):
+    fixtures = ['initial_data.json', ]
+
+    def setUp(self):
+        caches['sessions'].clear()
+        MyUser.objects.create_user(username='alice', password='1')
+
+    def login(self):
+        response = self.client.post('/login/', {'username': 'alice', 'password': '1'})
+        self.assertEqual(response.status_code, 302)
+
+    def is_authenticated(self):
+        return self.client.get('/').wsgi_request.user.is_authenticated
+
+    def test_login(self):
+        self.login()
+        self.assertTrue(self.is_authenticated())
+        self.assertFalse(Session.objects.exists())
+
+    def test_expired_by_cache(self):
+        self.login()
+        with freeze_time(timezone.now() + timedelta(seconds=SESSION_COOKIE_AGE + 1)):
+            self.assertFalse(self.is_authenticated())
+
+    def test_logout(self):
+        self.login()
+        session_key = self.client.session.session_key
+        self.client.get('/logout/')
+        self.assertFalse(SessionStore().exists(session_key))
+        self.assertFalse(self.is_authenticated())
+
+
+@freeze_time('2022-01-23 08:00')
+@mock.patch.object(sessions, 'SESSION_DB_WRITE_BEHIND', 30)
+class WriteBehindSessionTestCase(TestCase):
+    fixtures = ['initial_data.json', ]
+
+    def setUp(self):
+        caches['sessions'].clear()
+        MyUser.objects.create_user(username='alice', password='1')
+
+    def login(self):
+        self.client.post('/login/', {'username': 'alice', 'password': '1'})
+        return SessionStore(self.client.session.session_key)
+
+    def test_copied_to_database(self):
+        session = self.login()
+        self.assertEqual(Session.objects.get().session_key, session.session_key)
+        # The cache has lost the session, it comes back from the copy.
+        caches['sessions'].delete(session.cache_key)
+        self.assertTrue(self.client.get('/').wsgi_request.user.is_authenticated)
+
+    def test_copies_coalesced(self):
+        session = self.login()
+        session['seen'] = 1
+        with self.assertNumQueries(0):
+            session.save()
+        with freeze_time(timezone.now() + timedelta(seconds=31)):
+            session['seen'] = 2
+            session.save()
+        self.assertEqual(SessionStore().decode(Session.objects.get().session_data)['seen'], 2)
+
+    def test_pending_copied_on_load(self):
+        session = self.login()
+        session['seen'] = 1
+        session.save()
+        with self.assertNumQueries(0):
+            SessionStore(session.session_key).load()
+        # No save after the window, the next load copies the pending data.
+        with freeze_time(timezone.now() + timedelta(seconds=31)):
+            self.assertEqual(SessionStore(session.session_key).load()['seen'], 1)
+            self.assertEqual(SessionStore().decode(Session.objects.get().session_data)['seen'], 1)
+            with self.assertNumQueries(0):
+                SessionStore(session.session_key).load()
+
+    def test_logout(self):
+        self.login()
+        self.client.get('/logout/')
+        self.assertFalse(Session.objects.exists())
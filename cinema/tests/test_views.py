@@ -1,12 +1,20 @@
+import json
 from datetime import time, date
 from unittest.mock import patch
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import AnonymousUser
-from django.test import TestCase, RequestFactory
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, RequestFactory, AsyncRequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from freezegun import freeze_time
+from cinema.broadcast import broadcaster
 from cinema.forms import CinemaHallCreateForm
 from cinema.models import MyUser, CinemaHall, MovieShow
 from cinema.views import CinemaHallListView, CinemaHallCreateView, MovieShowCreateView, CinemaHallUpdateView, \
-    MovieShowUpdateView, PurchasedListView, real_time_movie, MovieListView
+    MovieShowUpdateView, PurchasedListView, real_time_movie, MovieListView, get_active_sessions_count, \
+    seat_availability_stream
 
 
 class CinemaHallListViewTest(TestCase):
@@ -269,20 +277,123 @@ class MovieListViewTest(TestCase):
         response = MovieListView.as_view()(request)
         self.assertEqual(response.status_code, 200)
 
+    def test_movie_list_without_seat_stream(self):
+        # Off under WSGI, where every open stream would hold a worker until it ends.
+        response = self.client.get('/')
+        self.assertFalse(response.context['seat_stream'])
+        self.assertNotContains(response, 'EventSource')
+        self.assertEqual(self.client.get('/realtime/seats/').status_code, 404)
+
+    @freeze_time('2022-01-23')
+    def test_movie_list_free_seats(self):
+        request = self.request
+        request.user = self.user
+        response = MovieListView.as_view()(request)
+        self.assertEqual({obj.id: obj.free_seats for obj in response.context_data['object_list']}, {1: 100, 2: 100})
+
+    @freeze_time('2022-01-22')
+    def test_movie_list_constant_queries(self):
+        request = self.request
+        request.user = self.user
+        with CaptureQueriesContext(connection) as one_show:
+            MovieListView.as_view()(request).render()
+
+        hall = CinemaHall.objects.get(id=2)
+        for hour in range(12, 17):
+            MovieShow.objects.create(movie_name='Movie', ticket_price=10, start_time=time(hour), finish_time=time(hour, 30),
+                                     start_date='2022-01-22', finish_date='2022-01-30', cinema_hall=hall)
+        with CaptureQueriesContext(connection) as six_shows:
+            response = MovieListView.as_view()(request).render()
+        self.assertEqual(len(response.context_data['object_list']), 6)
+        self.assertEqual(len(six_shows), len(one_show))
+
 
 @freeze_time('2022-01-22 11:29:16.852740')
 class RealTimeMovieTest(TestCase):
     fixtures = ['initial_data.json', ]
 
     def setUp(self):
+        cache.clear()
         self.factory = RequestFactory()
         self.user = MyUser.objects.create_user(username='alice', password='1')
         self.superuser = MyUser.objects.get(id=1)
         self.request = self.factory.get('/')
 
+    # Frozen times are UTC, the shows run on Europe/Kiev time, two hours ahead in January.
+    @freeze_time('2022-01-23 07:00')
     def test_movie_list_user(self):
         request = self.request
         request.user = AnonymousUser
         response = real_time_movie(request)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.content.decode('utf-8'), 'Количество активных сеансов 1')
\ No newline at end of file
+        self.assertEqual(response.content.decode('utf-8'), 'Количество активных сеансов 1')
+
+    @freeze_time('2022-01-31 07:00')
+    def test_movie_list_finished_shows(self):
+        response = real_time_movie(self.request)
+        self.assertEqual(response.content.decode('utf-8'), 'Количество активных сеансов 0')
+
+    def test_movie_list_overnight(self):
+        MovieShow.objects.create(movie_name='Night', start_time='23:00', finish_time='01:00', start_date='2022-01-23',
+                                 finish_date='2022-01-23', cinema_hall=CinemaHall.objects.get(id=2))
+        with freeze_time('2022-01-23 21:30'):
+            self.assertEqual(get_active_sessions_count(), 1)
+        with freeze_time('2022-01-23 22:30'):
+            self.assertEqual(get_active_sessions_count(), 1)
+        with freeze_time('2022-01-23 23:30'):
+            self.assertEqual(get_active_sessions_count(), 0)
+
+    def test_movie_list_cached_per_minute(self):
+        with freeze_time('2022-01-23 07:00:05'):
+            with self.assertNumQueries(1):
+                get_active_sessions_count()
+        with freeze_time('2022-01-23 07:00:50'):
+            with self.assertNumQueries(0):
+                self.assertEqual(get_active_sessions_count(), 1)
+        with freeze_time('2022-01-23 07:01:01'):
+            cache.add('real_time_movie:2022-01-23 09:01', True)
+            with self.assertNumQueries(0):
+                self.assertEqual(get_active_sessions_count(), 1)
+        with freeze_time('2022-01-23 08:01:01'):
+            with self.assertNumQueries(1):
+                self.assertEqual(get_active_sessions_count(), 0)
+
+
+class SeatAvailabilityStreamTest(TestCase):
+    fixtures = ['initial_data.json', ]
+
+    def event(self, message):
+        return f'event: availability\ndata: {json.dumps(message)}\n\n'.encode()
+
+    async def test_snapshot_then_updates(self):
+        today = str(timezone.localdate())
+        movie_show = await sync_to_async(MovieShow.objects.create)(
+            movie_name='Today', start_time='10:00', finish_time='12:00', start_date=today, finish_date=today,
+            cinema_hall_id=2)
+        response = await seat_availability_stream(AsyncRequestFactory().get('/realtime/seats/'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        self.assertEqual(await anext(stream),
+                         self.event({'movie_show': movie_show.id, 'date': today, 'free_seats': 200}))
+
+        broadcaster.publish({'movie_show': movie_show.id, 'date': '2022-01-22', 'free_seats': 1})
+        broadcaster.publish({'movie_show': movie_show.id, 'date': today, 'free_seats': 197})
+        self.assertEqual(await anext(stream),
+                         self.event({'movie_show': movie_show.id, 'date': today, 'free_seats': 197}))
+        await stream.aclose()
+
+    async def test_stream_ends_and_unsubscribes(self):
+        subscribers = len(broadcaster)
+        response = await seat_availability_stream(AsyncRequestFactory().get('/realtime/seats/'))
+        with patch('cinema.views.SSE_STREAM_TTL', 0):
+            self.assertEqual([chunk async for chunk in response.streaming_content], [b'retry: 3000\n\n'])
+        self.assertEqual(len(broadcaster), subscribers)
+
+    async def test_keepalive(self):
+        response = await seat_availability_stream(AsyncRequestFactory().get('/realtime/seats/'))
+        stream = response.streaming_content
+        with patch('cinema.views.SSE_KEEPALIVE', 0):
+            self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+            self.assertEqual(await anext(stream), b': keepalive\n\n')
+        await stream.aclose()
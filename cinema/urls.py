@@ -1,11 +1,14 @@
 from django.conf.urls.static import static
 from django.urls import path
+from cinema.api.async_resources import session_list, purchase_list
 from cinema.api.resources import MovieShowViewSet, LogoutAPI, RegisterAPI, GetToken, \
-    CinemaHallList, CinemaHallUpdate, PurchaseList, MovieShowPost, MovieShowUpdate
+    CinemaHallList, CinemaHallUpdate, PurchaseList, MovieShowPost, MovieShowUpdate, SeatMap, \
+    HoldList, HoldConfirm, HoldRelease, PurchaseBulk, SessionCacheStats, ShowSalesReport, HallSalesReport, \
+    DaySalesReport, PurchaseExport
 from cinema.views import Login, Register, Logout, MovieListView, ProductBuyView, PurchasedListView, \
     CinemaHallCreateView, CinemaHallUpdateView, MovieShowUpdateView, MovieShowCreateView, CinemaHallListView, \
-    real_time_movie
-from stanhjr_project.settings import MEDIA_URL, MEDIA_ROOT
+    real_time_movie, real_time_movie_async, seat_availability_stream
+from stanhjr_project.settings import MEDIA_URL, MEDIA_ROOT, SSE_ENABLED
 from rest_framework import routers
 
 
@@ -26,8 +29,13 @@ urlpatterns = [
     path('register/', Register.as_view(), name='register'),
     path('logout/', Logout.as_view(), name='logout'),
     path('realtime/', real_time_movie, name='real-time'),
+    path('realtime/async/', real_time_movie_async, name='real-time-async'),
 ]
 
+if SSE_ENABLED:
+    urlpatterns += [
+        path('realtime/seats/', seat_availability_stream, name='real-time-seats'),
+    ]
 
 urlpatterns += static(MEDIA_URL, document_root=MEDIA_ROOT)
 urlpatterns += router.urls
@@ -40,7 +48,19 @@ urlpatterns += [
     path('api/session/<str:show_day>/', MovieShowViewSet.as_view({'get': 'list'}), name='show_day'),
     path('api/session/', MovieShowViewSet.as_view({'get': 'list'}), name='show_movie_today'),
     path('api/session/<int:pk>/', MovieShowViewSet.as_view({'get': 'list'}), name='show_movie_in_cinema_hall'),
+    path('api/session/<int:pk>/seats/', SeatMap.as_view(), name='api-seat-map'),
+    path('api/session_cache_stats/', SessionCacheStats.as_view(), name='api-session-cache-stats'),
     path('api/session_create/', MovieShowPost.as_view(), name='api-movie_show_create'),
     path('api/session_update/<int:pk>/', MovieShowUpdate.as_view(), name='api-movie_show_update'),
     path('api/purchased/', PurchaseList.as_view(), name='api-purchased'),
+    path('api/purchased/bulk/', PurchaseBulk.as_view(), name='api-purchased-bulk'),
+    path('api/purchased/export/', PurchaseExport.as_view(), name='api-purchased-export'),
+    path('api/async/session/', session_list, name='api-async-session'),
+    path('api/async/purchased/', purchase_list, name='api-async-purchased'),
+    path('api/hold/', HoldList.as_view(), name='api-hold'),
+    path('api/hold/<int:pk>/', HoldRelease.as_view(), name='api-hold-release'),
+    path('api/hold/<int:pk>/confirm/', HoldConfirm.as_view(), name='api-hold-confirm'),
+    path('api/reports/shows/', ShowSalesReport.as_view(), name='api-report-shows'),
+    path('api/reports/halls/', HallSalesReport.as_view(), name='api-report-halls'),
+    path('api/reports/days/', DaySalesReport.as_view(), name='api-report-days'),
 ]
@@ -1,17 +1,25 @@
+import asyncio
 import datetime
-from django.db import transaction
-from django.db.models import Q, F
+import json
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.contrib import messages, auth
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.views import LoginView, LogoutView
-from django.http import HttpResponseRedirect, HttpResponse
+from django.http import HttpResponseRedirect, HttpResponse, StreamingHttpResponse
 from django.shortcuts import redirect
 from django.urls import reverse_lazy
+from django.utils import timezone
 from django.views.generic import ListView, CreateView, UpdateView
-from stanhjr_project.settings import SESSION_COOKIE_AGE_ADMIN, SESSION_COOKIE_AGE
+from stanhjr_project.settings import SESSION_COOKIE_AGE_ADMIN, SESSION_COOKIE_AGE, SSE_ENABLED, SSE_KEEPALIVE, \
+    SSE_STREAM_TTL
 from .forms import SignUpForm, ChoiceForm, ProductBuyForm, CinemaHallCreateForm, \
     MovieShowCreateForm, MovieShowUpdateForm
-from .models import MovieShow, PurchasedTicket, CinemaHall
+from .broadcast import broadcaster
+from .models import MovieShow, PurchasedTicket, CinemaHall, Screening
+from .schedule import get_conflicts, schedule_conflict_as_validation_error
+from .services import purchase_tickets
 
 
 class CinemaHallCreateView(PermissionRequiredMixin, UserPassesTestMixin, CreateView):
@@ -46,6 +54,14 @@ class MovieShowCreateView(PermissionRequiredMixin, UserPassesTestMixin, CreateVi
         kw['request'] = self.request
         return kw
 
+    def form_valid(self, form):
+        try:
+            with schedule_conflict_as_validation_error():
+                return super().form_valid(form=form)
+        except ValidationError as error:
+            messages.warning(self.request, error.messages[0])
+            return self.form_invalid(form=form)
+
     def form_invalid(self, form):
         return HttpResponseRedirect(reverse_lazy('create-movie'))
 
@@ -101,34 +117,17 @@ class MovieShowUpdateView(PermissionRequiredMixin, UpdateView):
             messages.warning(self.request, 'На этот сеанс уже куплены билеты, изменить нельзя')
             return super().form_invalid(form=form)
 
-        enter_start_date = Q(start_date__range=(obj.start_date, obj.finish_date))
-        middle_date_start = Q(start_date__lte=obj.start_date, finish_date__gte=obj.finish_date)
-        enter_finish_date = Q(finish_date__range=(obj.start_date, obj.finish_date))
-        enter_start_time = Q(start_time__range=(obj.start_time, obj.finish_time))
-        enter_finish_time = Q(finish_time__range=(obj.start_time, obj.finish_time))
-
-        movie_obj = MovieShow.objects.filter(cinema_hall=obj.cinema_hall).exclude(id=obj.id).filter(
-                enter_start_date | enter_finish_date | middle_date_start).filter(enter_start_time | enter_finish_time).all()
-
-        if movie_obj:
+        if get_conflicts(obj.cinema_hall, obj.start_date, obj.finish_date, obj.start_time, obj.finish_time,
+                         exclude=obj.id):
             messages.warning(self.request, 'Сеансы в одном зале не могут накладываться друг на друга')
             return super().form_invalid(form=form)
 
-        if obj.start_time > obj.finish_time:
-            enter_start_time_until_midnight = Q(start_time__range=(obj.start_time, '23:59:59'))
-            enter_start_time_after_midnight = Q(start_time__range=('00:00:00', obj.finish_time))
-            enter_finish_time_until_midnight = Q(finish_time__range=(obj.start_time, '23:59:59'))
-            enter_finish_time_after_midnight = Q(finish_time__range=('00:00:00', obj.finish_time))
-            movie_obj = MovieShow.objects.filter(cinema_hall=obj.cinema_hall).exclude(id=obj.id).filter(
-                    enter_start_date | enter_finish_date | middle_date_start).\
-                    filter(enter_start_time_until_midnight | enter_start_time_after_midnight |
-                           enter_finish_time_until_midnight | enter_finish_time_after_midnight).all()
-
-        if movie_obj:
-            messages.warning(self.request, 'Сеансы в одном зале не могут накладываться друг на друга')
+        try:
+            with schedule_conflict_as_validation_error():
+                obj.save()
+        except ValidationError as error:
+            messages.warning(self.request, error.messages[0])
             return super().form_invalid(form=form)
-
-        obj.save()
         return super().form_valid(form=form)
 
     def get_form_kwargs(self):
@@ -151,7 +150,7 @@ class PurchasedListView(LoginRequiredMixin, ListView):
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return super().get_queryset().filter(user=self.request.user.id)
+            return super().get_queryset().confirmed().filter(user=self.request.user.id)
         return super().get_queryset()
 
     def handle_no_permission(self):
@@ -167,6 +166,7 @@ class MovieListView(ListView):
     def get_context_data(self, **kwargs):
         context = super(MovieListView, self).get_context_data(**kwargs)
         context['sort_form'] = ChoiceForm
+        context['seat_stream'] = SSE_ENABLED
 
         if self.request.GET.get('filter_by'):
             context['filter'] = self.request.GET.get('filter_by')
@@ -192,16 +192,14 @@ class MovieListView(ListView):
             self.ordering = ['-ticket_price']
         return self.ordering
 
-    def get_queryset(self):
+    def get_show_date(self):
         if self.request.GET.get('show_date') == 'Tomorrow':
-            return super().get_queryset().filter(start_date__lte=datetime.date.today() + datetime.timedelta(days=1),
-                                                 finish_date__gt=datetime.date.today())
-        elif self.request.GET.get('show_date') == 'Today':
-            return super().get_queryset().filter(start_date__lte=datetime.date.today(),
-                                                 finish_date__gt=datetime.date.today())
-        else:
-            return super().get_queryset().filter(start_date__lte=datetime.date.today(),
-                                                 finish_date__gt=datetime.date.today())
+            return datetime.date.today() + datetime.timedelta(days=1)
+        return datetime.date.today()
+
+    def get_queryset(self):
+        show_date = self.get_show_date()
+        return super().get_queryset().filter(screenings__date=show_date).with_free_seats(show_date)
 
 
 class ProductBuyView(LoginRequiredMixin, CreateView):
@@ -211,22 +209,14 @@ class ProductBuyView(LoginRequiredMixin, CreateView):
     success_url = '/'
 
     def form_valid(self, form):
-        obj = form.save(commit=False)
-        obj.user = self.request.user
-        number_of_ticket = int(self.request.POST.get('number_of_ticket'))
-        movie_show_id = self.request.POST.get('movie-id')
-        obj.movie_show = MovieShow.objects.get(id=movie_show_id)
-        obj.user.money_spent += obj.movie_show.ticket_price * number_of_ticket
-
-        if self.request.POST.get('date-buy'):
-            obj.date = self.request.POST.get('date-buy')
-        else:
-            obj.date = str(datetime.date.today())
-            obj.purchase_amount = obj.movie_show.ticket_price * number_of_ticket
-        with transaction.atomic():
-            obj.user.save()
-            obj.save()
-        return super().form_valid(form=form)
+        movie_show = MovieShow.objects.select_related('cinema_hall').get(id=self.request.POST.get('movie-id'))
+        date_buy = self.request.POST.get('date-buy') or str(datetime.date.today())
+        try:
+            purchase_tickets(self.request.user, movie_show, date_buy, form.cleaned_data['number_of_ticket'])
+        except ValidationError as error:
+            messages.warning(self.request, error.messages[0])
+            return self.form_invalid(form=form)
+        return HttpResponseRedirect(self.get_success_url())
 
     def get_form_kwargs(self):
         kw = super(ProductBuyView, self).get_form_kwargs()
@@ -263,15 +253,75 @@ class Logout(LoginRequiredMixin, LogoutView):
     login_url = reverse_lazy('login')
 
 
-def real_time_movie(request):
-    current_time = datetime.datetime.now().time()
-    count_day = MovieShow.objects.filter(start_time__lte=current_time, finish_time__gte=current_time).count()
-    count_night_movie_until_midnight = MovieShow.objects.filter(start_time__gt=F('finish_time'),
-                                                                start_time__lte=current_time).count()
-
-    count_night_movie_after_midnight = MovieShow.objects.filter(start_time__gt=F('finish_time'),
-                                                                finish_time__gte=current_time).count()
+def get_active_sessions_count():
+    now = timezone.now()
+    minute = timezone.localtime(now).strftime('%Y-%m-%d %H:%M')
+    cached = cache.get('real_time_movie')
+    if cached and cached[0] == minute:
+        return cached[1]
+    # The first request of a minute recounts, the ones racing it keep serving the previous minute meanwhile.
+    if cached and not cache.add(f'real_time_movie:{minute}', True, 60):
+        return cached[1]
+    count = Screening.objects.active(now).count()
+    cache.set('real_time_movie', (minute, count), 60 * 2)
+    return count
+
+
+async def aget_active_sessions_count():
+    now = timezone.now()
+    minute = timezone.localtime(now).strftime('%Y-%m-%d %H:%M')
+    cached = await cache.aget('real_time_movie')
+    if cached and cached[0] == minute:
+        return cached[1]
+    if cached and not await cache.aadd(f'real_time_movie:{minute}', True, 60):
+        return cached[1]
+    count = await Screening.objects.active(now).acount()
+    await cache.aset('real_time_movie', (minute, count), 60 * 2)
+    return count
 
-    count = count_day + count_night_movie_after_midnight + count_night_movie_until_midnight
 
-    return HttpResponse(f"Количество активных сеансов {count}")
+def real_time_movie(request):
+    return HttpResponse(f"Количество активных сеансов {get_active_sessions_count()}")
+
+
+async def real_time_movie_async(request):
+    return HttpResponse(f"Количество активных сеансов {await aget_active_sessions_count()}")
+
+
+def get_availability(date_show):
+    movie_shows = MovieShow.objects.filter(screenings__date=date_show).with_free_seats(date_show)
+    return [{'movie_show': movie_show_id, 'date': str(date_show), 'free_seats': free_seats}
+            for movie_show_id, free_seats in movie_shows.values_list('id', 'free_seats')]
+
+
+def format_event(message):
+    return f'event: availability\ndata: {json.dumps(message)}\n\n'
+
+
+async def seat_availability_stream(request):
+    date_show = str(timezone.localdate())
+
+    async def events():
+        # Subscribe before the snapshot, so nothing committed in between is lost.
+        queue = broadcaster.subscribe()
+        try:
+            yield 'retry: 3000\n\n'
+            for message in await sync_to_async(get_availability)(date_show):
+                yield format_event(message)
+            # Streams are closed now and then, the browser reconnects and gets a fresh snapshot.
+            deadline = asyncio.get_running_loop().time() + SSE_STREAM_TTL
+            while asyncio.get_running_loop().time() < deadline:
+                try:
+                    message = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                if message['date'] == date_show:
+                    yield format_event(message)
+        finally:
+            broadcaster.unsubscribe(queue)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
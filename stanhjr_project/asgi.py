@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stanhjr_project.settings')
+# Served by an ASGI server, the seat availability streams do not tie up a worker each.
+os.environ.setdefault('CINEMA_SSE_ENABLED', '1')
 
 application = get_asgi_application()
@@ -36,6 +36,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'cinema',
     'rest_framework',
     'rest_framework.authtoken',
@@ -93,6 +94,65 @@ DATABASES = {
     },
 }
 
+# Cache of API responses and their versions, CINEMA_CACHE_BACKEND picks file, redis or locmem. A write bumps
+# the versions in this cache only, so every worker has to share it: file on a single host, redis across hosts.
+# locmem keeps each process to itself, for a single process only.
+
+API_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'api',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CINEMA_CACHE_LOCATION', BASE_DIR / 'cache' / 'api'),
+        # Past the limit a third of the entries is culled at random, versions included.
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CINEMA_CACHE_LOCATION', 'redis://127.0.0.1:6379'),
+    },
+}
+
+# Cache of the HTML site sessions, CINEMA_SESSION_CACHE_BACKEND picks file, redis or locmem. Only file and redis
+# are shared by several worker processes and outlive a restart, locmem is for a single process only.
+
+SESSION_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sessions',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CINEMA_SESSION_CACHE_LOCATION', BASE_DIR / 'cache' / 'sessions'),
+        # Every write lists the directory to cull it, so the limit bounds the cost of a save. Culled sessions
+        # come back from their copies; more live sessions than this call for redis.
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CINEMA_SESSION_CACHE_LOCATION', 'redis://127.0.0.1:6379/1'),
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api': API_CACHE_BACKENDS[os.getenv('CINEMA_CACHE_BACKEND', 'file')],
+    'sessions': SESSION_CACHE_BACKENDS[os.getenv('CINEMA_SESSION_CACHE_BACKEND', 'file')],
+}
+
+# Tests keep file and redis caches in a temporary directory, away from the ones of the running site.
+TEST_RUNNER = 'cinema.test_runner.TemporaryCacheRunner'
+
+SESSION_ENGINE = 'cinema.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
+# Seconds between copies of a session to django_session, which stays the store of record for a lost cache
+# and for hosts that do not share it. 0 keeps sessions in the cache only.
+SESSION_DB_WRITE_BEHIND = int(os.getenv('CINEMA_SESSION_DB_WRITE_BEHIND', 30))
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -147,3 +207,23 @@ APPEND_SLASH = False
 
 SESSION_COOKIE_AGE = 60
 SESSION_COOKIE_AGE_ADMIN = 60 * 60 * 48
+SEAT_HOLD_TTL = 60 * 5
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+BULK_PURCHASE_MAX_ITEMS = 50
+# Seat availability over Server-Sent Events. A stream holds its connection for SSE_STREAM_TTL, which takes an
+# ASGI server (uvicorn, asgi.py turns this on); under WSGI a worker would buffer each stream to its end.
+SSE_ENABLED = os.getenv('CINEMA_SSE_ENABLED') == '1'
+SSE_KEEPALIVE = 15
+SSE_STREAM_TTL = 60 * 10
+SESSION_LIST_CACHE_TTL = 60 * 5
+# Days a sales report covers when no date_from is given.
+SALES_REPORT_DAYS = 30
+# Rows fetched from the server-side cursor and written at a time by the purchase CSV export.
+EXPORT_CHUNK_SIZE = 2000
+# Seconds a token's last_action may lag behind, a session expires at most this much earlier.
+TOKEN_TOUCH_GRANULARITY = 5
+# Buffer token touches in process memory and write them in one bulk UPDATE per granularity.
+TOKEN_TOUCH_BUFFER = os.getenv('CINEMA_TOKEN_TOUCH_BUFFER') == '1'
+# Tokens cached in process memory and for how many seconds, a logout elsewhere is seen within the TTL.
+TOKEN_CACHE_SIZE = 1024
+TOKEN_CACHE_TTL = 10